@@ -0,0 +1,268 @@
+"""
+/ws/transcribe 的准入控制
+
+单进程能同时转发的会话数有限：会话过多时事件循环饱和，所有会话的 token 转发延迟一起上升。
+这里限制并发会话数，超出时排队，过载时尽早拒绝：
+- 活跃会话数低于 ADMISSION_MAX_SESSIONS 且无人排队、事件循环不过载时直接准入；
+- 否则进入等待队列（最多 ADMISSION_MAX_QUEUE 个），排位变化时通过回调通知客户端，
+  有会话结束且事件循环不过载时按先后准入，等待超过 ADMISSION_QUEUE_TIMEOUT 秒则拒绝；
+- 事件循环延迟（后台任务按固定间隔 sleep，实际醒来时间与预期之差的平滑值）超过
+  ADMISSION_MAX_LOOP_LAG_MS 时视为过载，新会话直接拒绝，排队者暂停准入；
+- 拒绝时附带建议的重试秒数：过载时按延迟超出阈值的程度，排队时按平均会话时长与队列长度估算；
+- 停机排空（drain）后不再准入，排队者与新会话均被拒绝。
+"""
+import asyncio
+import logging
+import math
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "200"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "100"))
+# 事件循环延迟的采样间隔（秒）与平滑系数
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+_LAG_ALPHA = 0.3
+# 停机排空期间建议的重试秒数（新实例通常已在启动）
+_DRAIN_RETRY_SECONDS = 5
+# 平均会话时长的初始估计（秒）与平滑系数
+_INITIAL_SESSION_SECONDS = 300.0
+_DURATION_ALPHA = 0.1
+
+
+class AdmissionRejected(Exception):
+    """会话未被准入"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        # overloaded / queue_full / queue_timeout / draining
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("future", "changed")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        # 准入时置为 True，停机排空时置为 AdmissionRejected
+        self.future: asyncio.Future = loop.create_future()
+        # 排位可能变化
+        self.changed = asyncio.Event()
+
+
+class AdmissionController:
+    """并发会话上限 + 等待队列 + 基于事件循环延迟的过载拒绝"""
+
+    def __init__(
+        self,
+        max_sessions: int = ADMISSION_MAX_SESSIONS,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        max_loop_lag_ms: float = ADMISSION_MAX_LOOP_LAG_MS,
+        lag_interval: float = LOOP_LAG_INTERVAL,
+    ):
+        self.max_sessions = max_sessions
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.lag_interval = lag_interval
+        self.active = 0
+        self.loop_lag_ms = 0.0
+        self.draining = False
+        self._queue: Deque[_Waiter] = deque()
+        self._mean_session_seconds = _INITIAL_SESSION_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"admitted": 0, "enqueued": 0, "rejected": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def overloaded(self) -> bool:
+        return self.loop_lag_ms > self.max_loop_lag_ms
+
+    def retry_after(self, reason: str) -> int:
+        """建议客户端重试前等待的秒数"""
+        if reason == "draining":
+            return _DRAIN_RETRY_SECONDS
+        if reason == "overloaded":
+            seconds = 5.0 * self.loop_lag_ms / max(self.max_loop_lag_ms, 1.0)
+            return int(min(60, max(1, math.ceil(seconds))))
+        # 排队：前面的会话按平均时长陆续结束
+        seconds = self._mean_session_seconds * (len(self._queue) + 1) / max(self.max_sessions, 1)
+        return int(min(300, max(1, math.ceil(seconds))))
+
+    async def acquire(self, notify: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """
+        等待准入；成功返回后调用方必须在会话结束时调用 release()
+
+        Args:
+            notify: 排队期间发送排位消息的协程函数（如 websocket.send_json）
+        Raises:
+            AdmissionRejected: 过载、队列已满、排队超时或正在停机排空
+        """
+        if self.draining:
+            self._reject("draining")
+        if self.overloaded():
+            self._reject("overloaded")
+        if self.active < self.max_sessions and not self._queue:
+            self._admit()
+            return
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full")
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop)
+        self._queue.append(waiter)
+        self._stats["enqueued"] += 1
+        metrics.ADMISSION_QUEUE.set(len(self._queue))
+        deadline = loop.time() + self.queue_timeout
+        position = None
+        try:
+            while not waiter.future.done():
+                current = self._queue.index(waiter) + 1
+                if current != position:
+                    position = current
+                    await notify({
+                        "type": "queued",
+                        "position": position,
+                        "queue_length": len(self._queue),
+                        "active_sessions": self.active,
+                    })
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._reject("queue_timeout")
+                waiter.changed.clear()
+                changed = asyncio.ensure_future(waiter.changed.wait())
+                try:
+                    await asyncio.wait(
+                        {waiter.future, changed}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    changed.cancel()
+            # 停机排空时抛出 AdmissionRejected
+            waiter.future.result()
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # 已被准入但调用方不再需要（客户端断开 / 取消）
+                self.release(None)
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            raise
+
+    def release(self, duration_seconds: Optional[float]):
+        """会话结束，让出名额"""
+        self.active = max(0, self.active - 1)
+        if duration_seconds is not None:
+            self._mean_session_seconds += _DURATION_ALPHA * (duration_seconds - self._mean_session_seconds)
+        self._dispatch()
+
+    def drain(self):
+        """停止准入：拒绝所有排队者，之后的新会话也直接拒绝"""
+        self.draining = True
+        while self._queue:
+            waiter = self._queue.popleft()
+            if not waiter.future.done():
+                self._stats["rejected"] += 1
+                metrics.ADMISSION_REJECTED.labels(reason="draining").inc()
+                waiter.future.set_exception(AdmissionRejected("draining", _DRAIN_RETRY_SECONDS))
+        metrics.ADMISSION_QUEUE.set(0)
+
+    def resume(self):
+        """撤销 drain()，恢复准入"""
+        self.draining = False
+        self._dispatch()
+
+    def configure(self, max_sessions: Optional[int] = None, max_queue: Optional[int] = None,
+                  max_loop_lag_ms: Optional[float] = None):
+        """运行中调整上限（调高后立即按新上限放行排队者）"""
+        if max_sessions is not None:
+            self.max_sessions = max_sessions
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if max_loop_lag_ms is not None:
+            self.max_loop_lag_ms = max_loop_lag_ms
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": len(self._queue),
+            "max_sessions": self.max_sessions,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "loop_lag_ms": round(self.loop_lag_ms, 2),
+            "max_loop_lag_ms": self.max_loop_lag_ms,
+            "overloaded": self.overloaded(),
+            "draining": self.draining,
+            "mean_session_seconds": round(self._mean_session_seconds, 1),
+            "retry_after": self.retry_after("overloaded" if self.overloaded() else "queue_full"),
+            **self._stats,
+        }
+
+    def _admit(self):
+        self.active += 1
+        self._stats["admitted"] += 1
+
+    def _reject(self, reason: str):
+        self._stats["rejected"] += 1
+        metrics.ADMISSION_REJECTED.labels(reason=reason).inc()
+        raise AdmissionRejected(reason, self.retry_after(reason))
+
+    def _remove(self, waiter: _Waiter):
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            return
+        self._notify_queue()
+
+    def _notify_queue(self):
+        metrics.ADMISSION_QUEUE.set(len(self._queue))
+        for waiter in self._queue:
+            waiter.changed.set()
+
+    def _dispatch(self):
+        """有空余名额且不过载时按先后准入排队者"""
+        admitted = False
+        while self._queue and self.active < self.max_sessions and not self.overloaded():
+            waiter = self._queue.popleft()
+            if waiter.future.done():
+                continue
+            self._admit()
+            waiter.future.set_result(True)
+            admitted = True
+        if admitted:
+            self._notify_queue()
+
+    async def _monitor(self):
+        """采样事件循环延迟；延迟回落后放行排队者"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            sample = max(0.0, (loop.time() - started - self.lag_interval) * 1000)
+            self.loop_lag_ms += _LAG_ALPHA * (sample - self.loop_lag_ms)
+            metrics.LOOP_LAG_SECONDS.set(self.loop_lag_ms / 1000)
+            if self._queue:
+                self._dispatch()
+
+
+# 进程内共用的准入控制
+admission = AdmissionController()
@@ -0,0 +1,313 @@
+"""
+会话结束后的统计分析
+
+会话落库时只写入原始转录；字数、语速、发言人时长、插话次数、低置信度区间、语言与检索词项等由
+AnalyticsPipeline 在后台工作池中计算后回写到带索引的列 / 表，不占用会话关闭路径。
+启动时会补算所有尚未分析的会话（analyzed_at 为空）。
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import crud
+from text_index import CJK_CHARS, CONTROL_TOKENS, session_terms
+from write_queue import WriteQueue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 发言人切换时，若前一段不是以句末标记结束且间隔小于该值（毫秒），视为插话
+INTERRUPTION_GAP_MS = float(os.getenv("INTERRUPTION_GAP_MS", "300"))
+
+# 置信度低于该值的 token 视为低质量；同一片段内间隔不超过 LOW_CONFIDENCE_MERGE_MS 的低置信度 token 合并为一个区间
+LOW_CONFIDENCE_THRESHOLD = float(os.getenv("LOW_CONFIDENCE_THRESHOLD", "0.6"))
+LOW_CONFIDENCE_MERGE_MS = float(os.getenv("LOW_CONFIDENCE_MERGE_MS", "1000"))
+
+# CJK 每个字符计为一个词，其他文字按连续字母 / 数字计词
+_WORD_RE = re.compile(rf"[{CJK_CHARS}]|[^\s{CJK_CHARS}\W]+", re.UNICODE)
+_CONTROL_RE = re.compile("|".join(re.escape(t) for t in CONTROL_TOKENS))
+
+
+def strip_control_tokens(text: str) -> str:
+    return _CONTROL_RE.sub("", text)
+
+
+def count_words(text: str) -> Tuple[int, int]:
+    """
+    CJK 感知的计数
+
+    Returns:
+        (词数, 字符数)：CJK 每个字计一个词，其他文字按连续字母 / 数字计词；
+        字符数不含空白与控制标记
+    """
+    text = strip_control_tokens(text or "")
+    words = len(_WORD_RE.findall(text))
+    chars = sum(1 for ch in text if not ch.isspace())
+    return words, chars
+
+
+def compute_session_stats(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    从 segments 计算会话统计
+
+    发言时长按 token 时间累加（相邻 token 间的停顿不计入）；语速 = 词数 / 发言总时长。
+    """
+    speakers: Dict[str, Dict[str, Any]] = {}
+    total_words = 0
+    total_chars = 0
+    interruptions = 0
+    prev_speaker: Optional[str] = None
+    prev_end = 0.0
+    prev_closed = True
+
+    duration_ms = 0.0
+
+    for seg in segments:
+        speaker = seg.get("speaker") or "Speaker 0"
+        tokens = [t for t in seg.get("tokens") or [] if t.get("text") not in CONTROL_TOKENS]
+        words, chars = count_words(seg.get("text", ""))
+        if not tokens and not chars:
+            # 仅含句末标记的片段（如 finalize 产生的 <fin>）不算发言
+            continue
+        total_words += words
+        total_chars += chars
+
+        talk_ms = 0.0
+        for t in tokens:
+            talk_ms += max(0.0, float(t.get("end_ms", 0.0)) - float(t.get("start_ms", 0.0)))
+        if not tokens:
+            talk_ms = max(0.0, float(seg.get("end_time", 0.0)) - float(seg.get("start_time", 0.0)))
+
+        stat = speakers.setdefault(
+            speaker,
+            {"talk_time_ms": 0.0, "words": 0, "segments": 0, "tokens": 0, "confidence_sum": 0.0},
+        )
+        stat["talk_time_ms"] += talk_ms
+        stat["words"] += words
+        stat["segments"] += 1
+        stat["tokens"] += len(tokens)
+        stat["confidence_sum"] += sum(float(t.get("confidence", 1.0)) for t in tokens)
+
+        start = float(tokens[0].get("start_ms", 0.0)) if tokens else float(seg.get("start_time", 0.0))
+        if prev_speaker is not None and speaker != prev_speaker and not prev_closed:
+            if start - prev_end < INTERRUPTION_GAP_MS:
+                interruptions += 1
+
+        raw_tokens = seg.get("tokens") or []
+        prev_closed = bool(raw_tokens) and raw_tokens[-1].get("text") in CONTROL_TOKENS
+        prev_speaker = speaker
+        prev_end = float(tokens[-1].get("end_ms", 0.0)) if tokens else float(seg.get("end_time", 0.0))
+        duration_ms = max(duration_ms, prev_end)
+
+    total_talk_ms = sum(s["talk_time_ms"] for s in speakers.values())
+    for stat in speakers.values():
+        stat["talk_time_ms"] = round(stat["talk_time_ms"], 1)
+        minutes = stat["talk_time_ms"] / 60000.0
+        stat["words_per_minute"] = round(stat["words"] / minutes, 1) if minutes > 0 else 0.0
+        stat["avg_confidence"] = round(stat["confidence_sum"] / stat["tokens"], 4) if stat["tokens"] else 0.0
+
+    minutes = total_talk_ms / 60000.0
+    return {
+        "word_count": total_words,
+        "char_count": total_chars,
+        "speaker_count": len(speakers),
+        "duration_seconds": round(duration_ms / 1000.0, 3),
+        "talk_time_ms": round(total_talk_ms, 1),
+        "words_per_minute": round(total_words / minutes, 1) if minutes > 0 else 0.0,
+        "interruption_count": interruptions,
+        "speakers": speakers,
+    }
+
+
+def find_low_confidence_spans(
+    segments: List[Dict[str, Any]],
+    threshold: float = LOW_CONFIDENCE_THRESHOLD,
+    merge_gap_ms: float = LOW_CONFIDENCE_MERGE_MS,
+) -> List[Dict[str, Any]]:
+    """
+    找出低置信度区间
+
+    区间不跨片段；区间覆盖首尾低置信度 token 之间的全部 token（text 为其拼接），
+    min / avg_confidence 按区间内全部 token 计算。
+    """
+    spans: List[Dict[str, Any]] = []
+    for seg_index, seg in enumerate(segments):
+        tokens = seg.get("tokens") or []
+        current: Optional[List[int]] = None  # [首 token 下标, 末 token 下标, 低置信度 token 数]
+        for i, t in enumerate(tokens):
+            if t.get("text") in CONTROL_TOKENS or float(t.get("confidence", 1.0)) >= threshold:
+                continue
+            if current is not None and float(t.get("start_ms", 0.0)) - float(tokens[current[1]].get("end_ms", 0.0)) <= merge_gap_ms:
+                current[1] = i
+                current[2] += 1
+                continue
+            if current is not None:
+                spans.append(_build_span(seg_index, seg, *current))
+            current = [i, i, 1]
+        if current is not None:
+            spans.append(_build_span(seg_index, seg, *current))
+    return spans
+
+
+def _build_span(seg_index: int, seg: Dict[str, Any], first: int, last: int, low_count: int) -> Dict[str, Any]:
+    covered = seg["tokens"][first:last + 1]
+    confidences = [float(t.get("confidence", 1.0)) for t in covered]
+    return {
+        "segment_index": seg_index,
+        "token_start": first,
+        "token_end": last,
+        "speaker": seg.get("speaker"),
+        "start_ms": float(covered[0].get("start_ms", 0.0)),
+        "end_ms": float(covered[-1].get("end_ms", 0.0)),
+        "low_token_count": low_count,
+        "min_confidence": round(min(confidences), 4),
+        "avg_confidence": round(sum(confidences) / len(confidences), 4),
+        "text": "".join(t.get("text", "") for t in covered).strip(),
+    }
+
+
+def analyze_segments(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """统计、低置信度区间、语言与检索词项（在线程池中一次完成）"""
+    languages, terms = session_terms(segments)
+    return {
+        "stats": compute_session_stats(segments),
+        "low_confidence": find_low_confidence_spans(segments),
+        "languages": languages,
+        "terms": terms,
+    }
+
+
+class AnalyticsPipeline:
+    """
+    后台统计工作池
+
+    submit() 只把 session_id 放入队列；worker 读取会话、在线程池中计算统计，
+    再经写队列回写。
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, writer: WriteQueue, workers: int = 2):
+        self.session_maker = session_maker
+        self.writer = writer
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, backfill: bool = True):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analytics")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if backfill:
+            self._tasks.append(asyncio.create_task(self._backfill()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def submit(self, session_id: str):
+        """排队分析一个已落库的会话（未启动时忽略，由下次启动的补算处理）"""
+        if self._queue is not None and self.running:
+            self._queue.put_nowait(session_id)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _backfill(self, batch: int = 200):
+        """补算尚未分析的会话（如进程在分析完成前退出）"""
+        try:
+            async with self.session_maker() as db:
+                ids = await crud.get_unanalyzed_session_ids(db, limit=None)
+            if ids:
+                logger.info(f"Backfilling analytics for {len(ids)} sessions")
+            for i, session_id in enumerate(ids):
+                self._queue.put_nowait(session_id)
+                # 分批让出，避免补算淹没新会话
+                if (i + 1) % batch == 0:
+                    await self._queue.join()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Analytics backfill failed: {str(e)}")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            session_id = await self._queue.get()
+            try:
+                async with self.session_maker() as db:
+                    segments = await crud.get_session_segments(db, session_id)
+                if segments is None:
+                    continue
+                result = await loop.run_in_executor(self._executor, analyze_segments, segments)
+                columns = stats_columns(result["stats"])
+                columns["low_confidence_count"] = len(result["low_confidence"])
+                await self.writer.submit(
+                    lambda db, sid=session_id, c=columns, r=result: crud.apply_session_stats(
+                        db,
+                        sid,
+                        c,
+                        speakers=speaker_rows(r["stats"]),
+                        low_confidence=r["low_confidence"],
+                        languages=r["languages"],
+                        terms=r["terms"],
+                    )
+                )
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Analytics failed for session {session_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+
+def stats_columns(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """统计结果中写入独立索引列的部分"""
+    return {
+        "word_count": stats["word_count"],
+        "char_count": stats["char_count"],
+        "speaker_count": stats["speaker_count"],
+        "duration_seconds": stats["duration_seconds"],
+        "words_per_minute": stats["words_per_minute"],
+        "interruption_count": stats["interruption_count"],
+        "stats_json": json.dumps(
+            {"talk_time_ms": stats["talk_time_ms"], "speakers": stats["speakers"]},
+            ensure_ascii=False,
+        ),
+        "analyzed_at": datetime.utcnow(),
+    }
+
+
+def speaker_rows(stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """统计结果中写入 session_speakers 表的部分"""
+    return [
+        {
+            "speaker": speaker,
+            "duration_ms": stat["talk_time_ms"],
+            "token_count": stat["tokens"],
+            "word_count": stat["words"],
+            "segment_count": stat["segments"],
+            "confidence_sum": stat["confidence_sum"],
+            "avg_confidence": stat["avg_confidence"],
+        }
+        for speaker, stat in stats["speakers"].items()
+    ]
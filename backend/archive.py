@@ -0,0 +1,74 @@
+"""
+会话冷存储
+
+超过保留期的会话把 segments 与全文移出数据库，写入 ARCHIVE_DIR 下的压缩文件
+（<年>/<月>/<session_id>.json.gz，内容为列式 segments + 全文）。数据库中保留标题、
+统计列、AI 结果与检索词项索引，列表与搜索照常可用；读取会话时由 crud 透明地从文件还原。
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+import segment_codec
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./data/archive")
+
+# 归档文件的格式版本
+FORMAT_VERSION = 1
+
+
+def archive_path(session_id: str, created_at: datetime) -> str:
+    """归档文件相对 ARCHIVE_DIR 的路径"""
+    return os.path.join(f"{created_at:%Y}", f"{created_at:%m}", f"{session_id}.json.gz")
+
+
+def write_archive(
+    session_id: str,
+    created_at: datetime,
+    segments: List[Dict[str, Any]],
+    full_transcript: str
+) -> str:
+    """
+    写入归档文件（先写临时文件并 fsync，再原子替换）
+
+    Returns:
+        相对 ARCHIVE_DIR 的路径，存入 archive_path 列
+    """
+    relative = archive_path(session_id, created_at)
+    path = os.path.join(ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = json.dumps(
+        {
+            "v": FORMAT_VERSION,
+            "session_id": session_id,
+            "full_transcript": full_transcript,
+            "segments": segment_codec.to_columns(segments),
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(gzip.compress(payload, compresslevel=9))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return relative
+
+
+def read_archive(relative: str) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Returns:
+        (segments, full_transcript)
+    """
+    with open(os.path.join(ARCHIVE_DIR, relative), "rb") as f:
+        data = json.loads(gzip.decompress(f.read()))
+    return segment_codec.from_columns(data["segments"]), data["full_transcript"]
+
+
+def remove_archive(relative: str):
+    try:
+        os.remove(os.path.join(ARCHIVE_DIR, relative))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,138 @@
+"""
+keepalive 调度基准：每个连接一个轮询任务 vs 共用的截止时间堆
+
+模拟 N 个静默（不发送音频）的上游连接，统计一段时间内的定时器唤醒次数、事件循环迭代次数、
+keepalive 发送次数，以及每 1000 个连接的常驻内存。缩放后相近的定时器会落入同一次循环迭代，
+循环迭代数偏低，以定时器数为准。
+时间参数按 --scale 等比缩小（默认 0.01：15 秒静默阈值 -> 0.15 秒），两种方案在同样的
+缩放下比较；唤醒次数按缩放换算回真实时长的每分钟次数。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_keepalive.py --sessions 1000 --seconds 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keepalive import KeepaliveScheduler  # noqa: E402
+
+# 与原 SonioxWebSocketService._keepalive_loop 相同的参数（秒）
+IDLE_SECONDS = 15.0
+POLL_SECONDS = 5.0
+
+
+class FakeConnection:
+    """只记录 keepalive 次数的连接"""
+
+    def __init__(self):
+        self.is_connected = True
+        self.last_audio_ts = time.monotonic()
+        self.keepalives = 0
+
+    async def send_keepalive(self) -> bool:
+        self.keepalives += 1
+        return True
+
+
+async def legacy_loop(conn: FakeConnection, idle: float, poll: float):
+    """原实现：每个连接一个每 poll 秒醒来的任务"""
+    while conn.is_connected:
+        now = time.monotonic()
+        if now - conn.last_audio_ts > idle:
+            await conn.send_keepalive()
+            conn.last_audio_ts = now
+        await asyncio.sleep(poll)
+
+
+def instrument(loop: asyncio.AbstractEventLoop):
+    """统计事件循环的迭代次数（selector.select 调用）与定时器数（call_at，asyncio.sleep 也经由它）"""
+    counter = {"selects": 0, "timers": 0}
+    selector = loop._selector
+    select, call_at = selector.select, loop.call_at
+
+    def counted_select(timeout=None):
+        counter["selects"] += 1
+        return select(timeout)
+
+    def counted_call_at(when, callback, *args, **kwargs):
+        counter["timers"] += 1
+        return call_at(when, callback, *args, **kwargs)
+
+    selector.select = counted_select
+    loop.call_at = counted_call_at
+    return counter
+
+
+async def run(mode: str, sessions: int, seconds: float, scale: float):
+    loop = asyncio.get_running_loop()
+    idle, poll = IDLE_SECONDS * scale, POLL_SECONDS * scale
+    # 连接在一个静默周期内均匀建立，模拟真实会话的相位分布
+    conns = [FakeConnection() for _ in range(sessions)]
+    for i, conn in enumerate(conns):
+        conn.last_audio_ts -= idle * i / sessions
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    if mode == "legacy":
+        handles = [asyncio.create_task(legacy_loop(c, idle, poll)) for c in conns]
+        scheduler = None
+    else:
+        scheduler = KeepaliveScheduler(idle_seconds=idle, slack=1.0 * scale)
+        handles = [
+            scheduler.register(lambda c=c: c.last_audio_ts, c.send_keepalive)
+            for c in conns
+        ]
+    await asyncio.sleep(0)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    memory = sum(s.size_diff for s in after.compare_to(before, "filename"))
+
+    counter = instrument(loop)
+    await asyncio.sleep(seconds)
+    selects, timers = counter["selects"], counter["timers"]
+
+    for conn in conns:
+        conn.is_connected = False
+    if scheduler is None:
+        for task in handles:
+            task.cancel()
+        await asyncio.gather(*handles, return_exceptions=True)
+    else:
+        for token in handles:
+            scheduler.unregister(token)
+        await scheduler.stop()
+
+    real_minutes = seconds / scale / 60
+    return {
+        "timers_per_min": timers / real_minutes,
+        "selects_per_min": selects / real_minutes,
+        "keepalives_per_min": sum(c.keepalives for c in conns) / real_minutes,
+        "bytes_per_1000": memory / sessions * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--scale", type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} idle sessions, {args.seconds / args.scale:.0f} s simulated")
+    print(f"{'mode':<10} {'timers/min':>11} {'loop iters/min':>15} {'keepalives/min':>15} {'KiB per 1000':>13}")
+    for mode in ("legacy", "scheduler"):
+        result = asyncio.run(run(mode, args.sessions, args.seconds, args.scale))
+        print(
+            f"{mode:<10} {result['timers_per_min']:>11,.0f} {result['selects_per_min']:>15,.0f} "
+            f"{result['keepalives_per_min']:>15,.0f} "
+            f"{result['bytes_per_1000'] / 1024:>13,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+多端点 LLM 路由基准：用本地替身服务器模拟慢尾与故障端点
+
+在进程内启动三个 OpenAI 兼容的替身服务器：
+- primary：首块延迟 --fast 秒，但 --stall-rate 比例的请求卡顿 --stall 秒（慢尾）；
+- backup：首块延迟恒为 --backup 秒；
+- broken：总是返回 500。
+分别测量只用 primary，以及 broken + primary + backup 经路由（故障切换、熔断、对冲）时，
+经 OpenAIService 的首块延迟分位数与错误数。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_llm_routing.py --requests 200 --concurrency 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+from llm_router import llm_router, parse_endpoints  # noqa: E402
+from models import OpenAIConfig  # noqa: E402
+from openai_service import OpenAIService, close_http_session  # noqa: E402
+
+
+def stand_in(first_chunk, stall_rate: float = 0.0, stall: float = 0.0, status: int = 200):
+    """替身 chat/completions：首块前等待 first_chunk 秒（按概率卡顿），之后快速流出 10 块"""
+
+    async def chat(request: web.Request):
+        await request.read()
+        if status != 200:
+            return web.Response(status=status, text="stand-in failure")
+        response = web.StreamResponse()
+        response.content_type = "text/event-stream"
+        await response.prepare(request)
+        await asyncio.sleep(stall if random.random() < stall_rate else first_chunk)
+        for i in range(10):
+            data = json.dumps({"choices": [{"delta": {"content": f"块{i} "}}]})
+            await response.write(f"data: {data}\n\n".encode())
+            await asyncio.sleep(0.005)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    return app
+
+
+async def serve(app: web.Application):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1"
+
+
+async def run(endpoints, hedge_after: float, requests: int, concurrency: int):
+    # 各场景从空白统计开始
+    llm_router.configure(endpoints=[])
+    llm_router.configure(endpoints=parse_endpoints(endpoints), hedge_after=hedge_after)
+    llm_router.hedges = llm_router.failovers = llm_router.explorations = 0
+    random.seed(1)
+    service = OpenAIService(OpenAIConfig(api_url=endpoints[0]["api_url"], api_key="k", model="m"))
+    semaphore = asyncio.Semaphore(concurrency)
+    ttfts, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            first = None
+            try:
+                async for _ in service.summarize("转录", "总结"):
+                    if first is None:
+                        first = time.perf_counter() - start
+            except Exception:
+                errors += 1
+                return
+            ttfts.append(first)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    ttfts.sort()
+    return {
+        "p50": statistics.median(ttfts) if ttfts else None,
+        "p95": ttfts[int(len(ttfts) * 0.95) - 1] if ttfts else None,
+        "errors": errors,
+        "stats": llm_router.stats(),
+    }
+
+
+async def main_async(args):
+    # 对冲落败的请求被取消时，替身服务器会记录写入已关闭连接的错误
+    logging.getLogger("aiohttp.server").setLevel(logging.CRITICAL)
+    runners = []
+    urls = {}
+    for name, app in (
+        ("primary", stand_in(args.fast, args.stall_rate, args.stall)),
+        ("backup", stand_in(args.backup)),
+        ("broken", stand_in(0, status=500)),
+    ):
+        runner, urls[name] = await serve(app)
+        runners.append(runner)
+
+    def endpoint(name):
+        return {"name": name, "api_url": urls[name], "model": "m", "api_key": "k"}
+
+    scenarios = [
+        ("primary only", [endpoint("primary")], 0.0),
+        ("routed, no hedging", [endpoint("broken"), endpoint("primary"), endpoint("backup")], 0.0),
+        ("routed + hedging", [endpoint("broken"), endpoint("primary"), endpoint("backup")], args.hedge_after),
+    ]
+    print(f"{args.requests} requests, concurrency {args.concurrency}; primary stalls "
+          f"{args.stall_rate:.0%} of requests for {args.stall}s")
+    print(f"{'scenario':<22} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'hedges':>7} {'failovers':>10}  circuits")
+    try:
+        for name, endpoints, hedge_after in scenarios:
+            result = await run(endpoints, hedge_after, args.requests, args.concurrency)
+            stats = result["stats"]
+            circuits = ", ".join(f"{e['name']}={e['circuit']}/{e['wins']}w" for e in stats["endpoints"])
+            fmt = lambda v: f"{v * 1000:8.0f}" if v is not None else f"{'-':>8}"  # noqa: E731
+            print(f"{name:<22} {fmt(result['p50'])} {fmt(result['p95'])} {result['errors']:>7} "
+                  f"{stats['hedges']:>7} {stats['failovers']:>10}  {circuits}")
+    finally:
+        await close_http_session()
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fast", type=float, default=0.1, help="primary 的正常首块延迟（秒）")
+    parser.add_argument("--stall", type=float, default=2.0, help="primary 卡顿时的首块延迟（秒）")
+    parser.add_argument("--stall-rate", type=float, default=0.1)
+    parser.add_argument("--backup", type=float, default=0.3, help="backup 的首块延迟（秒）")
+    parser.add_argument("--hedge-after", type=float, default=0.4)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+提示词转录压缩基准
+
+对比三种写入提示词的转录文本的估算 token 数：
+- raw：原样的 full_transcript（含 <end> / <fin>，无发言人）；
+- per-segment：按片段逐行“发言人: 文本”（保留发言人信息的直接做法）；
+- compact：prompt_render.render_transcript（合并同一发言人的连续片段、单字母代号、去控制标记）。
+
+默认读取 DATABASE_URL 中最近的 --sessions 个会话；数据库中没有带片段的会话或指定 --synthetic 时，
+生成模拟会话（两到三位发言人轮流发言，每轮若干个以 <end> 结尾的句子）。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_prompt_compaction.py --sessions 50
+    python benchmarks/bench_prompt_compaction.py --synthetic 20 --minutes 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+import crud  # noqa: E402
+from database import DATABASE_URL, create_engine_for  # noqa: E402
+from prompt_render import estimate_tokens, render_transcript  # noqa: E402
+
+_ZH = ["我们今天讨论一下项目进度", "下周需要确认预算", "人员安排还没有定", "这个问题我来跟进",
+       "客户反馈延迟比较高", "先把发布时间往后推一周", "设计评审放在周三", "好的没问题"]
+_EN = ["Let's review the roadmap.", "The latency numbers look better.", "Can you send the metrics?",
+       "We should ship it next quarter.", "Sounds good to me."]
+
+
+def make_session(minutes: float, seed: int):
+    """模拟会话：每句一个以 <end> 结尾的片段，同一发言人连续说 1-4 句"""
+    rng = random.Random(seed)
+    speakers = [f"Speaker {i}" for i in range(1, rng.randint(2, 3) + 1)]
+    segments, t, speaker = [], 0, None
+    while t < minutes * 60 * 1000:
+        speaker = rng.choice([s for s in speakers if s != speaker])
+        for _ in range(rng.randint(1, 4)):
+            text = rng.choice(_EN) if rng.random() < 0.3 else "，".join(rng.sample(_ZH, 2)) + "。"
+            duration = 250 * len(text)
+            segments.append({"speaker": speaker, "text": text + "<end>",
+                             "start_time": t, "end_time": t + duration})
+            t += duration + rng.randint(100, 800)
+    return segments, "".join(seg["text"] for seg in segments)
+
+
+async def load_sessions(url: str, limit: int):
+    engine = create_engine_for(url)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    sessions = []
+    try:
+        async with maker() as db:
+            for row in await crud.get_sessions(db, limit=limit):
+                segments = await crud.get_session_segments(db, row.session_id)
+                db_session = await crud.get_session(db, row.session_id)
+                if segments and db_session.full_transcript:
+                    sessions.append((segments, db_session.full_transcript))
+    finally:
+        await engine.dispose()
+    return sessions
+
+
+def per_segment(segments) -> str:
+    return "\n".join(f"{seg['speaker']}: {seg['text']}" for seg in segments)
+
+
+def measure(sessions, budget: int):
+    rows = []
+    for segments, full_transcript in sessions:
+        start = time.perf_counter()
+        text, stats = render_transcript(segments, token_budget=budget)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "segments": len(segments),
+            "turns": stats["turns"],
+            "raw": estimate_tokens(full_transcript),
+            "per_segment": estimate_tokens(per_segment(segments)),
+            "compact": stats["tokens"],
+            "omitted": stats["omitted_turns"],
+            "ms": elapsed * 1000,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--sessions", type=int, default=50, help="读取最近的会话数")
+    parser.add_argument("--synthetic", type=int, default=0, help="改用 N 个模拟会话")
+    parser.add_argument("--minutes", type=float, default=30.0, help="模拟会话时长")
+    parser.add_argument("--budget", type=int, default=10**9, help="token 预算（默认不截断，只看压缩）")
+    args = parser.parse_args()
+
+    sessions = []
+    if not args.synthetic:
+        try:
+            sessions = asyncio.run(load_sessions(args.url, args.sessions))
+        except Exception as e:
+            print(f"reading {args.url} failed: {str(e).splitlines()[0]}")
+        source = f"{len(sessions)} sessions from {args.url}"
+    if not sessions:
+        count = args.synthetic or 20
+        sessions = [make_session(args.minutes, seed) for seed in range(count)]
+        source = f"{count} synthetic {args.minutes:g}-minute sessions"
+
+    rows = measure(sessions, args.budget)
+    total = {key: sum(r[key] for r in rows) for key in ("segments", "turns", "raw", "per_segment", "compact")}
+    print(f"{source}: {total['segments']} segments -> {total['turns']} turns")
+    print(f"{'rendering':<14} {'tokens':>10} {'vs per-segment':>15} {'vs raw':>8}")
+    for key, label in (("raw", "raw"), ("per_segment", "per-segment"), ("compact", "compact")):
+        print(f"{label:<14} {total[key]:>10} "
+              f"{1 - total[key] / total['per_segment']:>14.1%} {1 - total[key] / total['raw']:>8.1%}")
+    print(f"render time: median {statistics.median(r['ms'] for r in rows):.2f} ms, "
+          f"max {max(r['ms'] for r in rows):.2f} ms per session")
+    omitted = sum(r["omitted"] for r in rows)
+    if omitted:
+        print(f"budget {args.budget}: {omitted} turns omitted in "
+              f"{sum(1 for r in rows if r['omitted'])} sessions")
+
+
+if __name__ == "__main__":
+    main()
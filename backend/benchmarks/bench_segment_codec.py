@@ -0,0 +1,104 @@
+"""
+segments 存储编码基准
+
+生成模拟的中英混合转录（真实 Soniox 的 token 粒度与置信度分布），对比各编码的
+每音频小时字节数、编码耗时与解码耗时。full_transcript 列单独列出，各编码均需保存它。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_segment_codec.py --hours 1 --tokens-per-second 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import segment_codec  # noqa: E402
+
+_ZH = "我们今天讨论一下项目进度和下周的计划需要确认预算以及人员安排"
+_EN = ["the", "project", "deadline", "budget", "review", "meeting", "next", "week", "team", "update"]
+
+
+def make_segments(hours: float, tokens_per_second: float, seed: int = 0):
+    rng = random.Random(seed)
+    total_ms = int(hours * 3600 * 1000)
+    step = int(1000 / tokens_per_second)
+    segments = []
+    t = 0
+    while t < total_ms:
+        speaker = str(rng.randint(1, 4))
+        tokens = []
+        for _ in range(rng.randint(8, 60)):
+            if rng.random() < 0.7:
+                text, language = rng.choice(_ZH), "zh"
+            else:
+                text, language = " " + rng.choice(_EN), "en"
+            tokens.append({
+                "text": text,
+                "start_ms": t,
+                "end_ms": t + step - rng.randint(0, step // 3),
+                "confidence": round(rng.uniform(0.5, 1.0), 4),
+                "is_final": True,
+                "speaker": speaker,
+                "language": language,
+            })
+            t += step
+        tokens.append({"text": "<end>", "start_ms": t, "end_ms": t, "confidence": 1.0,
+                       "is_final": True, "speaker": speaker, "language": None})
+        segments.append({
+            "speaker": speaker,
+            "text": "".join(tok["text"] for tok in tokens),
+            "start_time": tokens[0]["start_ms"],
+            "end_time": tokens[-1]["end_ms"],
+            "tokens": tokens,
+            "language": "zh",
+        })
+        t += rng.randint(200, 1500)
+    return segments
+
+
+def timed(func, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--tokens-per-second", type=float, default=3.0)
+    args = parser.parse_args()
+
+    segments = make_segments(args.hours, args.tokens_per_second)
+    n_tokens = sum(len(s["tokens"]) for s in segments)
+    transcript = "".join(s["text"] for s in segments)
+    print(f"{args.hours} h audio, {len(segments)} segments, {n_tokens} tokens")
+    print(f"full_transcript: {len(transcript.encode('utf-8')) / args.hours:,.0f} bytes/audio-hour (all encodings)")
+    print()
+    print(f"{'encoding':<10} {'bytes/audio-hour':>18} {'ratio':>7} {'encode ms':>10} {'decode ms':>10}")
+
+    raw_json, encode_s = timed(json.dumps, segments)
+    baseline = len(raw_json.encode("utf-8"))
+    _, decode_s = timed(json.loads, raw_json)
+    print(f"{'json':<10} {baseline / args.hours:>18,.0f} {1.0:>7.1f} {encode_s * 1000:>10.1f} {decode_s * 1000:>10.1f}")
+
+    encodings = ["zlib"] + (["zstd"] if segment_codec.zstandard else [])
+    for name in encodings:
+        (tag, blob), encode_s = timed(segment_codec.encode, segments, name)
+        decoded, decode_s = timed(segment_codec.decode, tag, blob, None)
+        assert decoded == segments, f"{name} round-trip mismatch"
+        print(
+            f"{name:<10} {len(blob) / args.hours:>18,.0f} {baseline / len(blob):>7.1f} "
+            f"{encode_s * 1000:>10.1f} {decode_s * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+SQLite 并发会话落库基准
+
+模拟大量会话同时结束时的写入：对比「每个会话独立事务提交」与「经单写者队列合并提交」
+在不同存储档位下的 writes/sec。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_sqlite_writes.py --sessions 500 --segments 40
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+import crud  # noqa: E402
+from database import Base, SQLITE_PROFILES, create_engine_for  # noqa: E402
+from models import TranscriptionSegment, TranscriptionSession  # noqa: E402
+from write_queue import WriteQueue  # noqa: E402
+
+
+def make_session(num_segments: int) -> TranscriptionSession:
+    segments = []
+    for i in range(num_segments):
+        tokens = [
+            {"text": f"word{j} ", "start_ms": i * 1000 + j * 50, "end_ms": i * 1000 + j * 50 + 40,
+             "confidence": 0.9, "is_final": True, "speaker": str(i % 3), "language": None}
+            for j in range(20)
+        ]
+        segments.append(TranscriptionSegment(
+            speaker=str(i % 3),
+            text="".join(t["text"] for t in tokens),
+            start_time=i * 1000,
+            end_time=i * 1000 + 990,
+            tokens=tokens,
+        ))
+    return TranscriptionSession(
+        session_id=str(uuid.uuid4()),
+        title="bench",
+        created_at=datetime.now(),
+        segments=segments,
+        full_transcript="".join(s.text for s in segments),
+        status="completed",
+    )
+
+
+async def run(profile: str, mode: str, sessions, concurrency: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine_for(f"sqlite+aiosqlite:///{path}", profile)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    queue = WriteQueue(maker)
+    if mode == "queued":
+        await queue.start()
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def save(session: TranscriptionSession):
+        async with sem:
+            if mode == "queued":
+                await queue.submit(lambda db: crud.add_session(db, session))
+            else:
+                async with maker() as db:
+                    await crud.create_session(db, session)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(save(s) for s in sessions), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    await queue.stop()
+    await engine.dispose()
+    # 写锁等待超时（database is locked）等失败计入 errors，不计入吞吐
+    errors = sum(1 for r in results if isinstance(r, Exception))
+    return (len(sessions) - errors) / elapsed, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--segments", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'mode':<8} {'writes/sec':>12} {'errors':>8}")
+    for profile in SQLITE_PROFILES:
+        for mode in ("direct", "queued"):
+            # 每轮使用新的 session_id，避免唯一约束冲突
+            sessions = [make_session(args.segments) for _ in range(args.sessions)]
+            rate, errors = await run(profile, mode, sessions, args.concurrency)
+            print(f"{profile:<10} {mode:<8} {rate:>12.1f} {errors:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+进程启动耗时基准
+
+分别测量：
+- 在全新解释器中 import main 的耗时（各子系统的导入开销）；
+- 数据库初始化：新库执行全部迁移、已是最新结构时的版本快速路径，
+  以及对照的“每次启动都 create_all + 扫描迁移表”。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import main; "
+    "print(time.perf_counter() - t); "
+    "import sys; print(','.join(m for m in ('aiohttp', 'openai_service', 'bulk') if m in sys.modules))"
+)
+
+
+def time_import(url: str, repeat: int):
+    samples, loaded = [], ""
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SNIPPET],
+            cwd=BACKEND,
+            env=dict(os.environ, DATABASE_URL=url),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split("\n")
+        samples.append(float(out[0]))
+        loaded = out[1]
+    return statistics.median(samples), loaded
+
+
+async def time_init(url: str, repeat: int):
+    from sqlalchemy import select
+    from database import Base, create_engine_for
+    from migrations import run_migrations, schema_migrations
+
+    def full_check(conn):
+        schema_migrations.create(conn, checkfirst=True)
+        conn.execute(select(schema_migrations.c.version)).scalars().all()
+        Base.metadata.create_all(conn)
+
+    engine = create_engine_for(url)
+
+    async def timed(fn):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            async with engine.begin() as conn:
+                await conn.run_sync(fn)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
+
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.run_sync(run_migrations)
+    fresh = time.perf_counter() - start
+    fast = await timed(run_migrations)
+    full = await timed(full_check)
+    await engine.dispose()
+    return fresh, fast, full
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", default=None, help="数据库 URL（默认临时 SQLite 文件）")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'startup.db')}"
+
+    seconds, loaded = time_import(url, args.repeat)
+    print(f"import main:                     {seconds * 1000:8.1f} ms  (deferred modules loaded: {loaded or 'none'})")
+
+    fresh, fast, full = asyncio.run(time_init(url, args.repeat))
+    print(f"init_db, new database:           {fresh * 1000:8.1f} ms")
+    print(f"init_db, schema up to date:      {fast * 1000:8.1f} ms")
+    print(f"create_all + migration scan:     {full * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
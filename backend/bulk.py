@@ -0,0 +1,260 @@
+"""
+会话批量导出 / 导入
+
+导出经服务端游标（AsyncSession.stream + yield_per）逐批读取会话，逐条编码后立即写出，
+内存占用只与单批大小有关，与导出的会话总数无关。支持两种格式：
+- jsonl：每行一个会话记录；
+- zip：每个会话一个 sessions/<session_id>.json，最后写入 manifest.json。
+
+导入接受同样的两种格式，按批（BULK_IMPORT_BATCH）经写队列插入，已存在的 session_id 跳过。
+每条记录在入批前单独解析与校验，格式错误的记录计为失败并继续导入其余记录；
+每批提交后立即回调已插入的 session_id（供排队统计），之后的错误不影响已提交的批次。
+"""
+import json
+import logging
+import os
+import zipfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, IO, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import crud
+from database import TranscriptionSessionDB
+from segment_codec import encode_columns
+from write_queue import WriteQueue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BULK_EXPORT_BATCH = int(os.getenv("BULK_EXPORT_BATCH", "100"))
+BULK_IMPORT_BATCH = int(os.getenv("BULK_IMPORT_BATCH", "200"))
+# 导入结果中最多列出的失败记录数
+_MAX_REPORTED_ERRORS = 20
+
+# 导出记录的格式版本，写入 zip 的 manifest.json
+FORMAT_VERSION = 1
+
+
+def session_record(row: TranscriptionSessionDB) -> Dict[str, Any]:
+    """数据库行 -> 导出记录（与单会话 JSON 导出的字段一致，另含 updated_at / status / metadata）"""
+    return {
+        "session_id": row.session_id,
+        "title": row.title,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "status": row.status,
+        "duration_seconds": row.duration_seconds,
+        "speaker_count": row.speaker_count,
+        "word_count": row.word_count,
+        "segments": json.loads(row.segments_json) if row.segments_json else [],
+        "full_transcript": row.full_transcript,
+        "ai_summary": row.ai_summary,
+        "ai_action_items": row.ai_action_items,
+        "ai_topics": row.ai_topics,
+        "metadata": json.loads(row.metadata_json) if row.metadata_json else {},
+    }
+
+
+def _expect(record: Dict[str, Any], key: str, types: Tuple[type, ...]):
+    """字段存在且非空时须为给定类型之一"""
+    value = record.get(key)
+    if value is not None and not isinstance(value, types):
+        names = " or ".join(t.__name__ for t in types)
+        raise ValueError(f"'{key}' must be {names}, got {type(value).__name__}")
+
+
+def validate_record(record: Any):
+    """
+    校验一条导入记录的字段类型
+
+    Raises:
+        ValueError: 不是对象、缺少 session_id 或字段类型不符
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"record must be an object, got {type(record).__name__}")
+    if not record.get("session_id") or not isinstance(record["session_id"], (str, int)):
+        raise ValueError("record is missing session_id")
+    for key in ("title", "created_at", "updated_at", "status", "full_transcript",
+                "ai_summary", "ai_action_items", "ai_topics"):
+        _expect(record, key, (str,))
+    for key in ("created_at", "updated_at"):
+        if record.get(key):
+            datetime.fromisoformat(record[key])
+    _expect(record, "duration_seconds", (int, float))
+    _expect(record, "metadata", (dict,))
+    _expect(record, "segments", (list,))
+    for i, segment in enumerate(record.get("segments") or []):
+        if not isinstance(segment, dict):
+            raise ValueError(f"segment {i} must be an object")
+        tokens = segment.get("tokens")
+        if tokens is not None and not (isinstance(tokens, list) and all(isinstance(t, dict) for t in tokens)):
+            raise ValueError(f"segment {i}: 'tokens' must be a list of objects")
+
+
+def record_to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """导入记录 -> 插入用的列值（segments 按当前编码压缩）；字数与发言人数直接计算，其余统计由后台统计任务重新计算"""
+    validate_record(record)
+    created_at = datetime.fromisoformat(record["created_at"]) if record.get("created_at") else datetime.utcnow()
+    updated_at = datetime.fromisoformat(record["updated_at"]) if record.get("updated_at") else created_at
+    segments = record.get("segments") or []
+    metadata = record.get("metadata") or {}
+    full_transcript = record.get("full_transcript") or ""
+    return {
+        "session_id": str(record["session_id"])[:36],
+        "title": (record.get("title") or f"Session {created_at.strftime('%Y-%m-%d %H:%M')}")[:200],
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "status": record.get("status") or "completed",
+        **encode_columns(segments),
+        "full_transcript": full_transcript,
+        "duration_seconds": float(record.get("duration_seconds") or 0.0),
+        "speaker_count": len({seg.get("speaker") for seg in segments}),
+        "word_count": len(full_transcript.split()),
+        "metadata_json": json.dumps(metadata, ensure_ascii=False) if metadata else None,
+        "ai_summary": record.get("ai_summary"),
+        "ai_action_items": record.get("ai_action_items"),
+        "ai_topics": record.get("ai_topics"),
+    }
+
+
+async def iter_records(
+    session_maker: async_sessionmaker,
+    batch_size: int = BULK_EXPORT_BATCH,
+    **filters: Any
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    逐条产出选中会话的导出记录
+
+    使用独立的数据库会话（流式响应在请求依赖关闭之后才开始迭代）。
+    """
+    async with session_maker() as db:
+        async for row in crud.stream_sessions(db, batch_size=batch_size, **filters):
+            yield session_record(row)
+
+
+async def jsonl_stream(records: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """只追加的写入目标：ZipFile 写入后由生成器取走已写出的字节"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def zip_stream(records: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    流式 zip：写入目标不可 seek，ZipFile 以数据描述符方式写出各成员，
+    每个会话压缩完即产出其字节
+    """
+    sink = _ChunkSink()
+    count = 0
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for record in records:
+            archive.writestr(
+                f"sessions/{record['session_id']}.json",
+                json.dumps(record, ensure_ascii=False),
+            )
+            count += 1
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        archive.writestr(
+            "manifest.json",
+            json.dumps({
+                "format_version": FORMAT_VERSION,
+                "exported_at": datetime.utcnow().isoformat(),
+                "session_count": count,
+            }),
+        )
+    yield sink.drain()
+
+
+async def iter_jsonl(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, bytes]]:
+    """按行切分流式请求体中的 JSONL 记录（空行忽略），产出 (位置, 原始行)"""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield f"line {line_no}", line
+    if buffer.strip():
+        yield f"line {line_no + 1}", buffer
+
+
+async def iter_zip(fileobj: IO[bytes]) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    逐个读取 zip 中 sessions/ 下的会话记录，产出 (成员名, 原始内容)
+
+    Raises:
+        zipfile.BadZipFile: 不是 zip 文件或成员损坏
+    """
+    with zipfile.ZipFile(fileobj) as archive:
+        for name in archive.namelist():
+            if name.startswith("sessions/") and name.endswith(".json"):
+                yield name, archive.read(name)
+
+
+async def import_records(
+    records: AsyncIterator[Tuple[str, bytes]],
+    writer: WriteQueue,
+    batch_size: int = BULK_IMPORT_BATCH,
+    on_imported: Optional[Callable[[List[str]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    逐条解析、校验并分批插入导入记录
+
+    Args:
+        records: iter_jsonl / iter_zip 产出的 (位置, 原始内容)
+        on_imported: 每批提交后以该批新插入的 session_id 调用
+    Returns:
+        {"imported": 新插入数, "skipped": 已存在 / 重复跳过数, "failed": 格式错误数,
+         "errors": [{"record": 位置, "error": 原因}, ...]（最多 _MAX_REPORTED_ERRORS 条）}
+    """
+    result: Dict[str, Any] = {"imported": 0, "skipped": 0, "failed": 0, "errors": []}
+    batch: List[Dict[str, Any]] = []
+
+    async def flush():
+        # 同批内重复的 session_id 保留先出现的一条（与跨批次时“已存在即跳过”一致）
+        unique: Dict[str, Dict[str, Any]] = {}
+        for row in batch:
+            unique.setdefault(row["session_id"], row)
+        rows = list(unique.values())
+        result["skipped"] += len(batch) - len(rows)
+        batch.clear()
+        inserted = await writer.submit(lambda db, r=rows: crud.import_sessions(db, r))
+        result["imported"] += len(inserted)
+        result["skipped"] += len(rows) - len(inserted)
+        if on_imported and inserted:
+            on_imported(inserted)
+
+    async for position, raw in records:
+        try:
+            row = record_to_row(json.loads(raw))
+        except (ValueError, TypeError) as e:  # 含 JSONDecodeError / UnicodeDecodeError；TypeError 来自嵌套字段
+            result["failed"] += 1
+            if len(result["errors"]) < _MAX_REPORTED_ERRORS:
+                result["errors"].append({"record": position, "error": str(e)})
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return result
@@ -1,14 +1,52 @@
+import asyncio
 import json
-from typing import List, Optional
-from sqlalchemy import select, desc, or_
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlalchemy import select, desc, or_, and_, update, delete, insert, func, any_, intersect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
-from database import TranscriptionSessionDB
+from database import (
+    TranscriptionSessionDB,
+    SessionSpeakerDB,
+    LowConfidenceSpanDB,
+    SessionLanguageDB,
+    SessionTermDB,
+)
 from models import TranscriptionSession
+from metrics import timed_db
+from profiling import profiled
+import archive
+from segment_codec import decode, encode_columns
+from text_index import query_terms
 
+# 为 true 时全文搜索先经 session_terms 倒排索引预筛，只在命中词项的会话中做子串校验：大库上更快，
+# 但字母词只按词前缀命中（如 "adline" 不再匹配 "deadline"）。默认关闭，子串匹配为准
+SEARCH_TERM_PREFILTER = os.getenv("SEARCH_TERM_PREFILTER", "").lower() in ("1", "true", "yes")
+
+# 由后台统计维护、随会话删除的索引表
+SESSION_INDEX_TABLES = (SessionSpeakerDB, LowConfidenceSpanDB, SessionLanguageDB, SessionTermDB)
+
+
+@profiled("crud.add_session")
+@timed_db
+async def add_session(
+    db: AsyncSession,
+    session: TranscriptionSession,
+    segment_columns: Optional[Dict[str, Any]] = None
+) -> TranscriptionSessionDB:
+    """
+    构建会话记录并加入当前事务（不提交，供写队列批量提交）
+
+    字数与发言人数在此直接计算；语速、插话、发言人明细等较重的统计由
+    analytics.AnalyticsPipeline 在落库后回填（字数按中英文分别计数后覆盖）。
+    segment_columns 为预先编码好的 segments 列（segment_codec.encode_columns），
+    未给定时在此编码。
+    """
+    if segment_columns is None:
+        segment_columns = encode_columns([seg.model_dump() for seg in session.segments])
 
-async def create_session(db: AsyncSession, session: TranscriptionSession) -> TranscriptionSessionDB:
-    """创建新的转录会话"""
     # 计算统计信息
     word_count = len(session.full_transcript.split()) if session.full_transcript else 0
     speaker_count = len(set(seg.speaker for seg in session.segments))
@@ -20,11 +58,12 @@ async def create_session(db: AsyncSession, session: TranscriptionSession) -> Tra
         created_at=session.created_at,
         updated_at=datetime.utcnow(),
         status=session.status,
-        segments_json=json.dumps([seg.model_dump() for seg in session.segments]),
+        **segment_columns,
         full_transcript=session.full_transcript,
         duration_seconds=0.0,  # 可以从最后一个 segment 的时间计算
         speaker_count=speaker_count,
-        word_count=word_count
+        word_count=word_count,
+        metadata_json=json.dumps(session.metadata, ensure_ascii=False) if session.metadata else None
     )
 
     # 计算持续时间
@@ -33,11 +72,20 @@ async def create_session(db: AsyncSession, session: TranscriptionSession) -> Tra
         db_session.duration_seconds = last_segment.end_time / 1000.0
 
     db.add(db_session)
+    return db_session
+
+
+@profiled("crud.create_session")
+@timed_db
+async def create_session(db: AsyncSession, session: TranscriptionSession) -> TranscriptionSessionDB:
+    """创建新的转录会话"""
+    db_session = await add_session(db, session)
     await db.commit()
     await db.refresh(db_session)
     return db_session
 
 
+@timed_db
 async def update_session(
     db: AsyncSession,
     session_id: str,
@@ -52,17 +100,18 @@ async def update_session(
     if not db_session:
         return None
 
-    # 更新数据
-    word_count = len(session.full_transcript.split()) if session.full_transcript else 0
-    speaker_count = len(set(seg.speaker for seg in session.segments))
-
+    # 更新数据（统计信息置为待分析，由后台统计任务重新计算）
     db_session.title = session.title
     db_session.status = session.status
-    db_session.segments_json = json.dumps([seg.model_dump() for seg in session.segments])
+    for name, value in encode_columns([seg.model_dump() for seg in session.segments]).items():
+        setattr(db_session, name, value)
     db_session.full_transcript = session.full_transcript
-    db_session.word_count = word_count
-    db_session.speaker_count = speaker_count
+    db_session.analyzed_at = None
     db_session.updated_at = datetime.utcnow()
+    # 内容已整体替换，旧的归档文件作废
+    old_archive = db_session.archive_path
+    db_session.archived_at = None
+    db_session.archive_path = None
 
     # 更新持续时间
     if session.segments:
@@ -71,37 +120,169 @@ async def update_session(
 
     await db.commit()
     await db.refresh(db_session)
+    if old_archive:
+        await asyncio.to_thread(archive.remove_archive, old_archive)
     return db_session
 
 
+async def _load_segments(db_session: Optional[TranscriptionSessionDB]) -> Optional[TranscriptionSessionDB]:
+    """
+    透明解码：把还原后的 segments 填回 segments_json
+
+    压缩编码的行就地解压；已归档的行从冷存储文件读取 segments 与全文。
+    以 set_committed_value 设置，不标记为已修改，后续提交不会把解码结果写回数据库。
+    """
+    if db_session is None:
+        return None
+    if db_session.archive_path:
+        segments, transcript = await asyncio.to_thread(archive.read_archive, db_session.archive_path)
+        set_committed_value(db_session, "segments_json", json.dumps(segments))
+        set_committed_value(db_session, "full_transcript", transcript)
+    elif db_session.segments_encoding:
+        segments = decode(db_session.segments_encoding, db_session.segments_blob, None)
+        set_committed_value(db_session, "segments_json", json.dumps(segments))
+    return db_session
+
+
+@timed_db
 async def get_session(db: AsyncSession, session_id: str) -> Optional[TranscriptionSessionDB]:
-    """获取单个会话"""
+    """获取单个会话（segments 已解码到 segments_json）"""
     result = await db.execute(
         select(TranscriptionSessionDB).where(TranscriptionSessionDB.session_id == session_id)
     )
-    return result.scalar_one_or_none()
+    return await _load_segments(result.scalar_one_or_none())
+
+
+def _is_postgres(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _term_condition(term: str, prefix: bool, postgres: bool):
+    if not prefix:
+        return SessionTermDB.term == term
+    if postgres:
+        return SessionTermDB.term.startswith(term, autoescape=True)
+    # SQLite 的 LIKE 不区分大小写、无法使用索引，改用范围比较
+    return and_(SessionTermDB.term >= term, SessionTermDB.term < term + "\U0010ffff")
+
+
+def _search_clause(search: str, postgres: bool = False, language: Optional[str] = None):
+    """
+    标题 / 全文子串搜索条件
+
+    SQLite 的 LIKE 对 ASCII 不区分大小写；PostgreSQL 使用 ILIKE 保持一致，
+    并可命中迁移中建立的 pg_trgm GIN 索引。
+
+    子串匹配为准；session_terms 倒排索引只用于补充候选：已归档的会话全文不在库中，
+    按词项索引命中（搜索词中的 CJK 二元组需精确命中、字母词按词前缀命中；
+    指定 language 时词项须属于该语言）。
+
+    SEARCH_TERM_PREFILTER 开启时，SQLite 或指定语言的全文匹配先经索引预筛再做子串校验，
+    尚未建立索引（analyzed_at 为空）的会话直接做子串匹配。
+    """
+    if postgres:
+        pattern = f"%{search}%"
+        title_match = TranscriptionSessionDB.title.ilike(pattern)
+        text_match = TranscriptionSessionDB.full_transcript.ilike(pattern)
+    else:
+        title_match = TranscriptionSessionDB.title.contains(search)
+        text_match = TranscriptionSessionDB.full_transcript.contains(search)
+
+    exact, prefixes = query_terms(search)
+    if not exact and not prefixes:
+        return or_(title_match, text_match)
+
+    subqueries = []
+    for term, prefix in [(t, False) for t in exact] + [(t, True) for t in prefixes]:
+        subquery = select(SessionTermDB.session_id).where(_term_condition(term, prefix, postgres))
+        if language is not None:
+            subquery = subquery.where(SessionTermDB.language == language)
+        subqueries.append(subquery)
+    term_match = and_(*[TranscriptionSessionDB.session_id.in_(subquery) for subquery in subqueries])
+    if postgres:
+        # OR 中的 IN (子查询) 只能逐行过滤，规划器因此放弃三元组索引、整表扫描；
+        # 改为先取出已归档会话的候选 id 数组（只执行一次），三个分支均可走索引并组成 BitmapOr
+        archived = select(TranscriptionSessionDB.session_id).where(TranscriptionSessionDB.archived_at.isnot(None))
+        archived_ids = [subquery.where(SessionTermDB.session_id.in_(archived)) for subquery in subqueries]
+        ids = intersect(*archived_ids) if len(archived_ids) > 1 else archived_ids[0]
+        archived_match = TranscriptionSessionDB.session_id == any_(func.array(ids.scalar_subquery()))
+    else:
+        archived_match = and_(TranscriptionSessionDB.archived_at.isnot(None), term_match)
+
+    if not SEARCH_TERM_PREFILTER or (postgres and language is None):
+        return or_(title_match, text_match, archived_match)
+    indexed = term_match
+    if language is None:
+        indexed = or_(term_match, TranscriptionSessionDB.analyzed_at.is_(None))
+    return or_(title_match, and_(indexed, text_match), archived_match)
+
+
+def _language_clause(language: str):
+    return TranscriptionSessionDB.session_id.in_(
+        select(SessionLanguageDB.session_id).where(SessionLanguageDB.language == language)
+    )
 
 
+# /sessions 的统计过滤条件：参数名 -> (列, 比较方式)
+SESSION_FILTERS = {
+    "min_duration": (TranscriptionSessionDB.duration_seconds, "ge"),
+    "max_duration": (TranscriptionSessionDB.duration_seconds, "le"),
+    "min_words": (TranscriptionSessionDB.word_count, "ge"),
+    "max_words": (TranscriptionSessionDB.word_count, "le"),
+    "min_wpm": (TranscriptionSessionDB.words_per_minute, "ge"),
+    "max_wpm": (TranscriptionSessionDB.words_per_minute, "le"),
+    "min_interruptions": (TranscriptionSessionDB.interruption_count, "ge"),
+    "max_interruptions": (TranscriptionSessionDB.interruption_count, "le"),
+    "min_low_confidence": (TranscriptionSessionDB.low_confidence_count, "ge"),
+}
+
+# /sessions 的可选排序列
+SESSION_ORDERINGS = {
+    "created_at": TranscriptionSessionDB.created_at,
+    "duration": TranscriptionSessionDB.duration_seconds,
+    "words": TranscriptionSessionDB.word_count,
+    "wpm": TranscriptionSessionDB.words_per_minute,
+    "interruptions": TranscriptionSessionDB.interruption_count,
+    "low_confidence": TranscriptionSessionDB.low_confidence_count,
+}
+
+
+def _apply_filters(query, filters: Optional[Dict[str, Any]]):
+    for name, value in (filters or {}).items():
+        if value is None or name not in SESSION_FILTERS:
+            continue
+        column, op = SESSION_FILTERS[name]
+        query = query.where(column >= value if op == "ge" else column <= value)
+    return query
+
+
+@timed_db
 async def get_sessions(
     db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    order_by: str = "created_at",
+    language: Optional[str] = None
 ) -> List[TranscriptionSessionDB]:
-    """获取会话列表"""
-    query = select(TranscriptionSessionDB)
+    """获取会话列表（仅加载元数据列，segments / 全文延迟加载）；language 限定包含该语言的会话"""
+    query = select(TranscriptionSessionDB).options(
+        defer(TranscriptionSessionDB.segments_json),
+        defer(TranscriptionSessionDB.segments_blob),
+        defer(TranscriptionSessionDB.full_transcript),
+    )
 
     # 搜索功能
     if search:
-        query = query.where(
-            or_(
-                TranscriptionSessionDB.title.contains(search),
-                TranscriptionSessionDB.full_transcript.contains(search)
-            )
-        )
+        query = query.where(_search_clause(search, _is_postgres(db), language))
+    if language:
+        query = query.where(_language_clause(language))
+    query = _apply_filters(query, filters)
 
-    # 按创建时间倒序
-    query = query.order_by(desc(TranscriptionSessionDB.created_at))
+    # 默认按创建时间倒序
+    column = SESSION_ORDERINGS.get(order_by, TranscriptionSessionDB.created_at)
+    query = query.order_by(desc(column), desc(TranscriptionSessionDB.created_at))
 
     # 分页
     query = query.offset(skip).limit(limit)
@@ -110,6 +291,7 @@ async def get_sessions(
     return result.scalars().all()
 
 
+@timed_db
 async def delete_session(db: AsyncSession, session_id: str) -> bool:
     """删除会话"""
     result = await db.execute(
@@ -120,11 +302,17 @@ async def delete_session(db: AsyncSession, session_id: str) -> bool:
     if not db_session:
         return False
 
+    archive_path = db_session.archive_path
     await db.delete(db_session)
+    for model in SESSION_INDEX_TABLES:
+        await db.execute(delete(model).where(model.session_id == session_id))
     await db.commit()
+    if archive_path:
+        await asyncio.to_thread(archive.remove_archive, archive_path)
     return True
 
 
+@timed_db
 async def update_ai_summary(
     db: AsyncSession,
     session_id: str,
@@ -147,6 +335,17 @@ async def update_ai_summary(
     return db_session
 
 
+@timed_db
+async def set_ai_results(db: AsyncSession, session_id: str, values: Dict[str, Any]) -> None:
+    """写入 AI 分析结果列（如 ai_summary；不提交，供写队列批量提交）"""
+    await db.execute(
+        update(TranscriptionSessionDB)
+        .where(TranscriptionSessionDB.session_id == session_id)
+        .values(**values, updated_at=datetime.utcnow())
+    )
+
+
+@timed_db
 async def update_ai_action_items(
     db: AsyncSession,
     session_id: str,
@@ -169,19 +368,354 @@ async def update_ai_action_items(
     return db_session
 
 
-async def get_session_count(db: AsyncSession, search: Optional[str] = None) -> int:
+@timed_db
+async def get_session_count(
+    db: AsyncSession,
+    search: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    language: Optional[str] = None
+) -> int:
     """获取会话总数"""
-    from sqlalchemy import func
-
     query = select(func.count(TranscriptionSessionDB.id))
 
     if search:
-        query = query.where(
-            or_(
-                TranscriptionSessionDB.title.contains(search),
-                TranscriptionSessionDB.full_transcript.contains(search)
-            )
-        )
+        query = query.where(_search_clause(search, _is_postgres(db), language))
+    if language:
+        query = query.where(_language_clause(language))
+    query = _apply_filters(query, filters)
 
     result = await db.execute(query)
     return result.scalar() or 0
+
+
+@timed_db
+async def get_session_segments(db: AsyncSession, session_id: str) -> Optional[List[Dict[str, Any]]]:
+    """只读取会话的 segments（供后台统计使用）"""
+    result = await db.execute(
+        select(
+            TranscriptionSessionDB.segments_encoding,
+            TranscriptionSessionDB.segments_blob,
+            TranscriptionSessionDB.segments_json,
+            TranscriptionSessionDB.archive_path,
+        )
+        .where(TranscriptionSessionDB.session_id == session_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+    if row.archive_path:
+        segments, _ = await asyncio.to_thread(archive.read_archive, row.archive_path)
+        return segments
+    return decode(row.segments_encoding, row.segments_blob, row.segments_json)
+
+
+@timed_db
+async def get_unanalyzed_session_ids(db: AsyncSession, limit: Optional[int] = 1000) -> List[str]:
+    """尚未完成后台统计的会话 ID（按创建时间倒序）"""
+    query = (
+        select(TranscriptionSessionDB.session_id)
+        .where(TranscriptionSessionDB.analyzed_at.is_(None))
+        .order_by(desc(TranscriptionSessionDB.created_at))
+    )
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+@timed_db
+async def apply_session_stats(
+    db: AsyncSession,
+    session_id: str,
+    columns: Dict[str, Any],
+    speakers: Optional[List[Dict[str, Any]]] = None,
+    low_confidence: Optional[List[Dict[str, Any]]] = None,
+    languages: Optional[List[Dict[str, Any]]] = None,
+    terms: Optional[List[Dict[str, Any]]] = None
+) -> None:
+    """
+    写入后台统计结果（不提交，供写队列批量提交）
+
+    给定的发言人聚合、低置信度区间、语言与检索词项均整体替换该会话的已有行。
+    """
+    await db.execute(
+        update(TranscriptionSessionDB)
+        .where(TranscriptionSessionDB.session_id == session_id)
+        .values(**columns)
+    )
+    await _replace_rows(db, LowConfidenceSpanDB, session_id, low_confidence)
+    await _replace_rows(db, SessionLanguageDB, session_id, languages)
+    await _replace_rows(db, SessionTermDB, session_id, terms)
+    if speakers is None:
+        return
+
+    await db.execute(delete(SessionSpeakerDB).where(SessionSpeakerDB.session_id == session_id))
+    created_at = (await db.execute(
+        select(TranscriptionSessionDB.created_at)
+        .where(TranscriptionSessionDB.session_id == session_id)
+    )).scalar_one_or_none()
+    if created_at is None or not speakers:
+        return
+    await db.execute(
+        insert(SessionSpeakerDB),
+        [dict(row, session_id=session_id, session_created_at=created_at) for row in speakers]
+    )
+
+
+async def _replace_rows(db: AsyncSession, model, session_id: str, rows: Optional[List[Dict[str, Any]]]):
+    if rows is None:
+        return
+    await db.execute(delete(model).where(model.session_id == session_id))
+    if rows:
+        await db.execute(insert(model), [dict(row, session_id=session_id) for row in rows])
+
+
+@timed_db
+async def get_language_totals(db: AsyncSession) -> List[Dict[str, Any]]:
+    """各语言出现的会话数与片段数"""
+    result = await db.execute(
+        select(
+            SessionLanguageDB.language,
+            func.count(SessionLanguageDB.session_id).label("sessions"),
+            func.sum(SessionLanguageDB.segment_count).label("segment_count"),
+            func.sum(SessionLanguageDB.char_count).label("char_count"),
+        )
+        .group_by(SessionLanguageDB.language)
+        .order_by(desc("sessions"))
+    )
+    return [
+        {
+            "language": row.language,
+            "sessions": row.sessions,
+            "segment_count": row.segment_count or 0,
+            "char_count": row.char_count or 0,
+        }
+        for row in result
+    ]
+
+
+@timed_db
+async def get_session_languages(db: AsyncSession, session_id: str) -> List[SessionLanguageDB]:
+    result = await db.execute(
+        select(SessionLanguageDB)
+        .where(SessionLanguageDB.session_id == session_id)
+        .order_by(desc(SessionLanguageDB.char_count))
+    )
+    return list(result.scalars().all())
+
+
+@timed_db
+async def get_session_speakers(db: AsyncSession, session_id: str) -> List[SessionSpeakerDB]:
+    """单个会话的发言人聚合（按发言时长倒序）"""
+    result = await db.execute(
+        select(SessionSpeakerDB)
+        .where(SessionSpeakerDB.session_id == session_id)
+        .order_by(desc(SessionSpeakerDB.duration_ms))
+    )
+    return list(result.scalars().all())
+
+
+@timed_db
+async def get_low_confidence_spans(
+    db: AsyncSession,
+    session_id: str,
+    max_confidence: Optional[float] = None
+) -> List[LowConfidenceSpanDB]:
+    """会话的低置信度区间（按时间顺序），可再按区间平均置信度收窄"""
+    query = select(LowConfidenceSpanDB).where(LowConfidenceSpanDB.session_id == session_id)
+    if max_confidence is not None:
+        query = query.where(LowConfidenceSpanDB.avg_confidence <= max_confidence)
+    query = query.order_by(LowConfidenceSpanDB.segment_index, LowConfidenceSpanDB.token_start)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+@timed_db
+async def get_speaker_totals(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    speaker: Optional[str] = None,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """跨会话按发言人聚合（基于 session_speakers 预聚合表）"""
+    token_total = func.sum(SessionSpeakerDB.token_count)
+    query = select(
+        SessionSpeakerDB.speaker,
+        func.count(SessionSpeakerDB.session_id).label("sessions"),
+        func.sum(SessionSpeakerDB.duration_ms).label("duration_ms"),
+        token_total.label("token_count"),
+        func.sum(SessionSpeakerDB.word_count).label("word_count"),
+        func.sum(SessionSpeakerDB.segment_count).label("segment_count"),
+        func.sum(SessionSpeakerDB.confidence_sum).label("confidence_sum"),
+    ).group_by(SessionSpeakerDB.speaker)
+
+    if start is not None:
+        query = query.where(SessionSpeakerDB.session_created_at >= start)
+    if end is not None:
+        query = query.where(SessionSpeakerDB.session_created_at < end)
+    if speaker is not None:
+        query = query.where(SessionSpeakerDB.speaker == speaker)
+
+    query = query.order_by(desc("duration_ms")).limit(limit)
+    result = await db.execute(query)
+    return [
+        {
+            "speaker": row.speaker,
+            "sessions": row.sessions,
+            "duration_ms": round(row.duration_ms or 0.0, 1),
+            "token_count": row.token_count or 0,
+            "word_count": row.word_count or 0,
+            "segment_count": row.segment_count or 0,
+            "avg_confidence": round((row.confidence_sum or 0.0) / row.token_count, 4) if row.token_count else 0.0,
+        }
+        for row in result
+    ]
+
+
+async def stream_sessions(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    search: Optional[str] = None,
+    ids: Optional[List[str]] = None,
+    language: Optional[str] = None,
+    batch_size: int = 100
+) -> AsyncIterator[TranscriptionSessionDB]:
+    """
+    按条件流式读取完整会话行（服务端游标，每次只取 batch_size 行）
+
+    按 created_at 升序，便于导出文件按时间顺序排列。
+    """
+    query = select(TranscriptionSessionDB)
+    if start is not None:
+        query = query.where(TranscriptionSessionDB.created_at >= start)
+    if end is not None:
+        query = query.where(TranscriptionSessionDB.created_at < end)
+    if ids:
+        query = query.where(TranscriptionSessionDB.session_id.in_(ids))
+    if search:
+        query = query.where(_search_clause(search, _is_postgres(db), language))
+    if language:
+        query = query.where(_language_clause(language))
+    query = query.order_by(TranscriptionSessionDB.created_at).execution_options(yield_per=batch_size)
+
+    result = await db.stream(query)
+    async for row in result.scalars():
+        yield await _load_segments(row)
+        # 已产出的行不再需要，避免身份映射随导出规模增长
+        db.expunge(row)
+
+
+@timed_db
+async def import_sessions(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[str]:
+    """
+    批量插入会话（不提交，供写队列批量提交）；已存在的 session_id 跳过
+
+    Returns:
+        实际插入的 session_id 列表
+    """
+    if not rows:
+        return []
+    existing = set((await db.execute(
+        select(TranscriptionSessionDB.session_id)
+        .where(TranscriptionSessionDB.session_id.in_([row["session_id"] for row in rows]))
+    )).scalars())
+    new_rows = [row for row in rows if row["session_id"] not in existing]
+    if new_rows:
+        await db.execute(insert(TranscriptionSessionDB), new_rows)
+    return [row["session_id"] for row in new_rows]
+
+
+@timed_db
+async def get_uncompressed_segments(db: AsyncSession, limit: int = 50) -> List[Any]:
+    """尚未压缩编码的会话 (session_id, segments_json)，供后台转换"""
+    result = await db.execute(
+        select(TranscriptionSessionDB.session_id, TranscriptionSessionDB.segments_json)
+        .where(
+            TranscriptionSessionDB.segments_encoding.is_(None),
+            TranscriptionSessionDB.archived_at.is_(None),
+        )
+        .limit(limit)
+    )
+    return list(result.all())
+
+
+@timed_db
+async def set_segment_columns(db: AsyncSession, session_id: str, columns: Dict[str, Any]) -> None:
+    """回写编码后的 segments 列（不提交；保留 updated_at：内容未变，ETag 保持不变）"""
+    await db.execute(
+        update(TranscriptionSessionDB)
+        .where(TranscriptionSessionDB.session_id == session_id)
+        .values(**columns, updated_at=TranscriptionSessionDB.updated_at)
+    )
+
+
+@timed_db
+async def get_archive_candidates(db: AsyncSession, before: datetime, limit: int = 20) -> List[TranscriptionSessionDB]:
+    """
+    待归档的会话（创建早于 before、已完成后台统计且尚未归档），segments 已解码
+
+    要求已完成统计：归档后全文不在库中，搜索依赖词项索引。
+    """
+    result = await db.execute(
+        select(TranscriptionSessionDB)
+        .where(
+            TranscriptionSessionDB.created_at < before,
+            TranscriptionSessionDB.archived_at.is_(None),
+            TranscriptionSessionDB.analyzed_at.isnot(None),
+        )
+        .order_by(TranscriptionSessionDB.created_at)
+        .limit(limit)
+    )
+    return [await _load_segments(row) for row in result.scalars().all()]
+
+
+@timed_db
+async def mark_archived(db: AsyncSession, session_id: str, path: str, updated_at: datetime) -> bool:
+    """
+    归档文件写入后清空库中的 segments 与全文（不提交）
+
+    仅当行在读取后未被修改（updated_at 未变）时生效；返回 False 时调用方应删除刚写入的文件。
+    """
+    result = await db.execute(
+        update(TranscriptionSessionDB)
+        .where(
+            TranscriptionSessionDB.session_id == session_id,
+            TranscriptionSessionDB.updated_at == updated_at,
+            TranscriptionSessionDB.archived_at.is_(None),
+        )
+        .values(
+            segments_json="[]",
+            segments_encoding=None,
+            segments_blob=None,
+            full_transcript="",
+            archived_at=datetime.utcnow(),
+            archive_path=path,
+            updated_at=updated_at,
+        )
+    )
+    return result.rowcount == 1
+
+
+@timed_db
+async def delete_sessions_before(db: AsyncSession, before: datetime, limit: int = 500) -> List[Optional[str]]:
+    """
+    批量删除创建早于 before 的会话及其索引行（不提交）
+
+    Returns:
+        被删除会话的归档文件路径（未归档为 None），提交后由调用方删除文件
+    """
+    rows = (await db.execute(
+        select(TranscriptionSessionDB.session_id, TranscriptionSessionDB.archive_path)
+        .where(TranscriptionSessionDB.created_at < before)
+        .order_by(TranscriptionSessionDB.created_at)
+        .limit(limit)
+    )).all()
+    if not rows:
+        return []
+    ids = [row.session_id for row in rows]
+    await db.execute(delete(TranscriptionSessionDB).where(TranscriptionSessionDB.session_id.in_(ids)))
+    for model in SESSION_INDEX_TABLES:
+        await db.execute(delete(model).where(model.session_id.in_(ids)))
+    return [row.archive_path for row in rows]
@@ -1,19 +1,124 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncEngine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, Index, LargeBinary, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
+from typing import Dict, Optional
+import json
+import logging
 import os
 
+from write_queue import WriteQueue
+
+logger = logging.getLogger(__name__)
+
 # 数据库配置
 # 默认使用容器内相对路径 ./data/transcriptions.db，便于通过目录卷挂载
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/transcriptions.db")
 
+# SQLite 存储档位：连接建立时设置的 PRAGMA 组合
+# - safe:     回滚日志 + FULL 同步，最保守
+# - balanced: WAL + NORMAL 同步（默认），断电最多丢失最后一次提交
+# - fast:     WAL + 关闭同步 + 更大缓存，适合可重建的数据或基准测试
+# 各档位均使用增量 auto_vacuum（新库立即生效，已有库需经 /admin/maintenance/run?full_vacuum=true 完整 VACUUM 一次），
+# 删除 / 归档腾出的页由后台维护任务分批归还给文件系统
+SQLITE_PROFILES: Dict[str, Dict[str, object]] = {
+    "safe": {
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "foreign_keys": "ON",
+    },
+    "balanced": {
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -20000,  # 负数表示 KiB，约 20MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    "fast": {
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 10000,
+        "cache_size": -65536,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "balanced")
+
+
+def sqlite_pragmas(profile: str, overrides: Optional[str] = None) -> Dict[str, object]:
+    """
+    解析存储档位与覆盖项
+
+    Args:
+        profile: 档位名称（safe / balanced / fast）
+        overrides: 形如 "cache_size=-64000,mmap_size=0" 的覆盖项（对应 SQLITE_PRAGMAS 环境变量）
+    """
+    if profile not in SQLITE_PROFILES:
+        logger.warning(f"Unknown SQLITE_PROFILE '{profile}', falling back to 'balanced'")
+        profile = "balanced"
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for item in (overrides or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+def pool_options(url: str) -> Dict[str, object]:
+    """
+    连接池参数
+
+    SQLite 使用 SQLAlchemy 默认池；PostgreSQL 等服务端数据库按环境变量调整池大小：
+    DB_POOL_SIZE（常驻连接数）、DB_MAX_OVERFLOW（突发额外连接数）、
+    DB_POOL_TIMEOUT（等待连接秒数）、DB_POOL_RECYCLE（连接回收秒数）
+    """
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+def create_engine_for(url: str, profile: str = SQLITE_PROFILE) -> AsyncEngine:
+    """按 URL 创建异步引擎；SQLite 会在每个新连接上应用存储档位"""
+    new_engine = create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        **pool_options(url)
+    )
+
+    if new_engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(profile, os.getenv("SQLITE_PRAGMAS"))
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    return new_engine
+
+
 # 创建异步引擎
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True
-)
+engine = create_engine_for(DATABASE_URL)
 
 # 创建会话工厂
 async_session_maker = async_sessionmaker(
@@ -22,9 +127,42 @@ async_session_maker = async_sessionmaker(
     expire_on_commit=False
 )
 
+# 单写者队列：合并并发会话落库 / 配置写入，减少 SQLite 写锁争用与 fsync 次数
+write_queue = WriteQueue(
+    async_session_maker,
+    max_batch=int(os.getenv("DB_WRITE_BATCH", "64")),
+    max_delay=float(os.getenv("DB_WRITE_DELAY_MS", "5")) / 1000.0,
+)
+
 # 基础模型
 Base = declarative_base()
 
+
+class JSONText(TypeDecorator):
+    """
+    JSON 字符串列
+
+    PostgreSQL 上以 JSONB 存储（可建索引、按字段查询），其他数据库上以 Text 存储；
+    对应用层始终读写 JSON 字符串，调用方无需区分数据库。
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and dialect.name == "postgresql":
+            return json.loads(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and not isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
 class SettingDB(Base):
     """简单 Key-Value 配置表（用于首设密码等）"""
     __tablename__ = "settings"
@@ -39,22 +177,124 @@ class TranscriptionSessionDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(36), unique=True, index=True, nullable=False)
     title = Column(String(200), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     status = Column(String(20), default="active", nullable=False)
 
     # 转录内容（JSON 格式存储）
     segments_json = Column(Text, nullable=False, default="[]")
     full_transcript = Column(Text, nullable=False, default="")
+    # 压缩编码的 segments（见 segment_codec）；segments_encoding 为空时使用 segments_json
+    segments_encoding = Column(String(16), nullable=True)
+    segments_blob = Column(LargeBinary, nullable=True)
+    # 冷存储归档（见 archive）：非空时 segments / 全文已移至 ARCHIVE_DIR 下的文件
+    archived_at = Column(DateTime, nullable=True, index=True)
+    archive_path = Column(String(255), nullable=True)
 
     # 元数据
-    duration_seconds = Column(Float, default=0.0)
+    duration_seconds = Column(Float, default=0.0, index=True)
     speaker_count = Column(Integer, default=0)
-    word_count = Column(Integer, default=0)
+    word_count = Column(Integer, default=0, index=True)
+
+    # 会话结束后由后台统计任务计算（analyzed_at 为空表示尚未分析）
+    char_count = Column(Integer, default=0)
+    words_per_minute = Column(Float, default=0.0, index=True)
+    interruption_count = Column(Integer, default=0, index=True)
+    low_confidence_count = Column(Integer, default=0, index=True)
+    stats_json = Column(JSONText, nullable=True)
+    analyzed_at = Column(DateTime, nullable=True, index=True)
+    # 会话附加元数据（JSON），如延迟追踪摘要 {"latency": {...}}
+    metadata_json = Column(JSONText, nullable=True)
 
     # AI 分析结果（可选）
     ai_summary = Column(Text, nullable=True)
     ai_action_items = Column(Text, nullable=True)
+    ai_topics = Column(Text, nullable=True)
+
+
+class SessionSpeakerDB(Base):
+    """
+    每个会话、每个发言人的预聚合统计
+
+    由后台统计任务在会话落库后写入（每次整体替换该会话的行），
+    跨会话的发言人查询只需对本表做聚合，无需解析 segments。
+    """
+    __tablename__ = "session_speakers"
+    __table_args__ = (
+        Index("ix_session_speakers_speaker_created", "speaker", "session_created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(36), index=True, nullable=False)
+    speaker = Column(String(100), nullable=False)
+    # 冗余会话创建时间，便于按时间范围聚合
+    session_created_at = Column(DateTime, index=True, nullable=False)
+    duration_ms = Column(Float, default=0.0, nullable=False)
+    token_count = Column(Integer, default=0, nullable=False)
+    word_count = Column(Integer, default=0, nullable=False)
+    segment_count = Column(Integer, default=0, nullable=False)
+    # 置信度之和，跨会话加权平均 = sum(confidence_sum) / sum(token_count)
+    confidence_sum = Column(Float, default=0.0, nullable=False)
+    avg_confidence = Column(Float, default=0.0, nullable=False)
+
+
+class SessionLanguageDB(Base):
+    """每个会话中出现的语言（按 token 级语言统计片段数与字符数），用于按语言过滤会话"""
+    __tablename__ = "session_languages"
+    __table_args__ = (
+        Index("ix_session_languages_language_session", "language", "session_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(36), index=True, nullable=False)
+    language = Column(String(16), nullable=False)
+    segment_count = Column(Integer, default=0, nullable=False)
+    char_count = Column(Integer, default=0, nullable=False)
+
+
+class SessionTermDB(Base):
+    """
+    检索词项倒排索引
+
+    CJK 文本按二元组、字母文字按小写词切分（见 text_index），每个词项标注语言；
+    搜索以子串匹配为准，词项用于命中已归档（全文不在库中）的会话；
+    SEARCH_TERM_PREFILTER 开启时也用于预筛候选会话。
+    """
+    __tablename__ = "session_terms"
+    __table_args__ = (
+        Index("ix_session_terms_term_language", "term", "language"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(36), index=True, nullable=False)
+    term = Column(String(64), nullable=False)
+    language = Column(String(16), nullable=True)
+    count = Column(Integer, default=1, nullable=False)
+
+
+class LowConfidenceSpanDB(Base):
+    """
+    会话中的低置信度区间索引
+
+    由后台统计任务在会话落库后计算（每次整体替换该会话的行），
+    供审阅时直接跳转到可疑片段，无需扫描全部 token。
+    """
+    __tablename__ = "low_confidence_spans"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(36), index=True, nullable=False)
+    # 在 segments 列表中的下标，及区间首尾 token 在该 segment 中的下标
+    segment_index = Column(Integer, nullable=False)
+    token_start = Column(Integer, nullable=False)
+    token_end = Column(Integer, nullable=False)
+    speaker = Column(String(100), nullable=True)
+    start_ms = Column(Float, nullable=False)
+    end_ms = Column(Float, nullable=False)
+    # 区间内低于阈值的 token 数
+    low_token_count = Column(Integer, nullable=False)
+    min_confidence = Column(Float, nullable=False)
+    avg_confidence = Column(Float, nullable=False)
+    text = Column(Text, nullable=False)
 
 
 # 数据库依赖
@@ -71,7 +311,14 @@ async def get_db():
             await session.close()
 
 
-async def init_db():
-    """初始化数据库"""
+async def init_db() -> bool:
+    """
+    初始化数据库（建表并执行未应用的迁移）
+
+    Returns:
+        结构已是最新时为 True（仅做了一次版本查询）
+    """
+    from migrations import run_migrations
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        return await conn.run_sync(run_migrations)
@@ -0,0 +1,165 @@
+"""
+上游连接共用的 keepalive 调度
+
+Soniox 会话在长时间没有音频时会被关闭，需要定期发送 keepalive 控制消息。
+每个连接各起一个每 5 秒醒来检查的任务，数千个并发会话就是数千个定时器与协程帧。
+这里改为所有连接共用一个调度任务：
+- 最小堆按“最近一次音频 + KEEPALIVE_IDLE_SECONDS”排列各连接的截止时间；
+- 调度任务只在最早的截止时间醒来，并顺带处理 KEEPALIVE_SLACK_SECONDS 内到期的连接，
+  使相近的截止时间合并为一次唤醒；
+- 发送音频只更新连接上的时间戳，不操作堆；到期出堆时若期间有过音频，按新时间戳推迟后重新入堆；
+- 每次发送限时 KEEPALIVE_SEND_TIMEOUT 秒：卡住的连接（对端不再读取、发送缓冲已满）取消发送并注销，
+  不拖住其他连接的 keepalive。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_IDLE_SECONDS = float(os.getenv("KEEPALIVE_IDLE_SECONDS", "15"))
+KEEPALIVE_SLACK_SECONDS = float(os.getenv("KEEPALIVE_SLACK_SECONDS", "1"))
+KEEPALIVE_SEND_TIMEOUT = float(os.getenv("KEEPALIVE_SEND_TIMEOUT", "5"))
+
+
+class KeepaliveScheduler:
+    """按截止时间调度所有连接的 keepalive 发送"""
+
+    def __init__(
+        self,
+        idle_seconds: float = KEEPALIVE_IDLE_SECONDS,
+        slack: float = KEEPALIVE_SLACK_SECONDS,
+        send_timeout: float = KEEPALIVE_SEND_TIMEOUT,
+    ):
+        self.idle_seconds = idle_seconds
+        self.slack = slack
+        self.send_timeout = send_timeout
+        # (截止时间 monotonic, 登记号)；已注销的登记号出堆时丢弃
+        self._heap: List[Tuple[float, int]] = []
+        # 登记号 -> (返回最近活动时间的函数, 发送 keepalive 的协程函数)
+        self._entries: Dict[int, Tuple[Callable[[], float], Callable[[], Awaitable]]] = {}
+        self._ids = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self.wakeups = 0
+        self.sent = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    def register(self, last_activity: Callable[[], float], send: Callable[[], Awaitable]) -> int:
+        """
+        登记一个连接（需在事件循环中调用，首次登记时启动调度任务）
+
+        Args:
+            last_activity: 返回该连接最近一次发送音频的 time.monotonic() 时间
+            send: 发送 keepalive 的协程函数
+        Returns:
+            登记号，供 unregister 使用
+        """
+        token = next(self._ids)
+        self._entries[token] = (last_activity, send)
+        deadline = last_activity() + self.idle_seconds
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (deadline, token))
+        if earliest is None or deadline < earliest:
+            self._wake()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return token
+
+    def unregister(self, token: Optional[int]):
+        if token is not None:
+            self._entries.pop(token, None)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "connections": len(self._entries),
+            "heap": len(self._heap),
+            "wakeups": self.wakeups,
+            "sent": self.sent,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+        }
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._waiter = loop.create_future()
+            if not self._heap:
+                await self._waiter
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                handle = loop.call_later(delay, self._wake)
+                try:
+                    await self._waiter
+                finally:
+                    handle.cancel()
+                continue
+
+            self.wakeups += 1
+            now = time.monotonic()
+            horizon = now + self.slack
+            due = []
+            while self._heap and self._heap[0][0] <= horizon:
+                _, token = heapq.heappop(self._heap)
+                entry = self._entries.get(token)
+                if entry is None:
+                    continue
+                last_activity, send = entry
+                deadline = last_activity() + self.idle_seconds
+                if deadline > horizon:
+                    # 期间发送过音频，按新的截止时间推迟
+                    heapq.heappush(self._heap, (deadline, token))
+                    continue
+                due.append((token, send))
+                heapq.heappush(self._heap, (now + self.idle_seconds, token))
+
+            if due:
+                await self._send_all(due)
+
+    async def _send_all(self, due: List[Tuple[int, Callable[[], Awaitable]]]):
+        """并发发送一批 keepalive；超时未完成的取消发送并注销该连接"""
+        tasks = {asyncio.ensure_future(send()): token for token, send in due}
+        try:
+            _, stuck = await asyncio.wait(tasks, timeout=self.send_timeout)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        for task, token in tasks.items():
+            if task in stuck:
+                self.timeouts += 1
+                self.unregister(token)
+                logger.warning(
+                    f"Keepalive send timed out after {self.send_timeout:.0f}s; connection dropped from keepalive"
+                )
+            elif task.exception() is not None:
+                self.failures += 1
+                logger.warning(f"Keepalive failed: {task.exception()}")
+            elif task.result() is True:
+                self.sent += 1
+            else:
+                self.failures += 1
+
+
+# 进程内共用的调度器
+keepalive_scheduler = KeepaliveScheduler()
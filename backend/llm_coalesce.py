@@ -0,0 +1,294 @@
+"""
+LLM 生成任务：相同请求合并（singleflight）、与 HTTP 连接解耦、可按偏移续传
+
+多个观看者同时对同一会话点击“总结”、或客户端重试时，每个请求各自发起一次上游流式请求，
+重复消耗 token，并竞相写入 ai_summary；浏览器中途断开则已生成的内容全部丢失。这里把生成
+作为后台任务运行：
+- 按调用方给定的键（如 会话 + 提示词 + 模型）合并进行中的请求：第一个请求发起唯一的上游流，
+  产出的文本块追加到缓冲区；同键的后续请求加入该任务，先收到已缓冲的前缀，再随上游继续接收；
+- 任务不随订阅者离开而停止，生成过程中每隔 LLM_JOB_FLUSH_SECONDS 把已生成的部分交给 persist
+  保存，正常结束时再保存一次完整结果；上游出错（produce 抛出异常）时任务标记为 failed，不做最终保存；
+  被取消或停机时先保存上次保存之后生成的部分（任务是唯一的写者，保存按顺序进行）；
+- 每个任务有 job_id，客户端断线后可带上已收到的字符数（offset）重新订阅，从断点继续；
+- 结束的任务在内存中保留 LLM_JOB_RETAIN_SECONDS 供续传，之后只能从数据库读取已保存的结果。
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_JOB_FLUSH_SECONDS = float(os.getenv("LLM_JOB_FLUSH_SECONDS", "2"))
+LLM_JOB_RETAIN_SECONDS = float(os.getenv("LLM_JOB_RETAIN_SECONDS", "600"))
+
+# persist(已生成的文本, 是否为最终结果)
+Persist = Callable[[str, bool], Awaitable[Any]]
+
+
+class _Flight:
+    """一次后台生成任务"""
+
+    __slots__ = (
+        "job_id", "key", "operation", "chunks", "length", "status",
+        "subscribers", "task", "finished_at", "error", "_changed",
+    )
+
+    def __init__(self, key: Hashable, operation: str):
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.operation = operation
+        self.chunks: List[str] = []
+        # 已生成的字符数（Unicode 码点），即续传偏移的上限
+        self.length = 0
+        # running / done / failed / cancelled
+        self.status = "running"
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.finished_at: Optional[float] = None
+        # 失败原因（status 为 failed 时）
+        self.error: Optional[str] = None
+        # 有新文本块或结束时置位，随后换成新的 Event
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def append(self, chunk: str):
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+        self._notify()
+
+    def finish(self, status: str):
+        if self.done:
+            return
+        self.status = status
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def info(self) -> Dict[str, Any]:
+        info = {
+            "job_id": self.job_id,
+            "operation": self.operation,
+            "status": self.status,
+            "length": self.length,
+            "subscribers": self.subscribers,
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class SingleFlight:
+    """按键合并进行中的生成任务，并把同一上游流分发给所有订阅者"""
+
+    def __init__(
+        self,
+        flush_seconds: float = LLM_JOB_FLUSH_SECONDS,
+        retain_seconds: float = LLM_JOB_RETAIN_SECONDS,
+    ):
+        self.flush_seconds = flush_seconds
+        self.retain_seconds = retain_seconds
+        # 合并键 -> 进行中的任务
+        self._flights: Dict[Hashable, _Flight] = {}
+        # job_id -> 进行中或保留期内的任务
+        self._jobs: Dict[str, _Flight] = {}
+        self.started = 0
+        self.joined = 0
+        self.resumed = 0
+        self.cancelled = 0
+        self.flushes = 0
+
+    def start(
+        self,
+        key: Hashable,
+        operation: str,
+        produce: Callable[[], AsyncIterator[str]],
+        persist: Optional[Persist] = None,
+    ) -> _Flight:
+        """
+        加入键对应的进行中任务；没有时调用 produce() 在后台发起
+
+        Args:
+            key: 合并键
+            operation: 指标标签（summarize / analyze_*）
+            produce: 返回上游文本块异步迭代器的函数；出错时应抛出异常而不是产出错误文本
+            persist: 保存已生成文本的协程函数，生成中定期以 final=False 调用，
+                正常结束时以 final=True 调用一次；失败时不调用
+        """
+        self._prune()
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.joined += 1
+            metrics.LLM_COALESCED.labels(operation=operation).inc()
+            return flight
+
+        flight = _Flight(key, operation)
+        self._flights[key] = flight
+        self._jobs[flight.job_id] = flight
+        flight.task = asyncio.create_task(self._run(flight, produce, persist))
+        self.started += 1
+        return flight
+
+    def get(self, job_id: str) -> Optional[_Flight]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    async def stream(self, flight: _Flight, offset: int = 0) -> AsyncIterator[str]:
+        """
+        订阅任务输出：先产出 offset 之后已生成的部分，再随上游继续产出，直到任务结束
+
+        订阅者离开不影响任务。
+        """
+        if offset:
+            self.resumed += 1
+        flight.subscribers += 1
+        try:
+            sent = len(flight.chunks)
+            pending = flight.text()[offset:]
+            if pending:
+                yield pending
+            while True:
+                if sent < len(flight.chunks):
+                    text = "".join(flight.chunks[sent:])
+                    sent = len(flight.chunks)
+                    yield text
+                    continue
+                if flight.done:
+                    return
+                await flight._changed.wait()
+        finally:
+            flight.subscribers -= 1
+
+    async def multiplex(self, jobs: Dict[str, _Flight]) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """
+        交错订阅多个任务：按到达顺序产出 (名称, 文本块)，某任务结束时产出 (名称, None)
+
+        订阅者离开时只停止转发，各任务继续在后台运行。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump(name: str, flight: _Flight):
+            try:
+                async for text in self.stream(flight):
+                    queue.put_nowait((name, text))
+            finally:
+                queue.put_nowait((name, None))
+
+        pumps = [asyncio.create_task(pump(name, flight)) for name, flight in jobs.items()]
+        try:
+            remaining = len(pumps)
+            while remaining:
+                name, text = await queue.get()
+                if text is None:
+                    remaining -= 1
+                yield name, text
+        finally:
+            for task in pumps:
+                task.cancel()
+
+    def cancel(self, job_id: str) -> bool:
+        """停止进行中的任务（已保存的部分保留）"""
+        flight = self._jobs.get(job_id)
+        if flight is None or flight.done:
+            return False
+        self._release(flight)
+        flight.finish("cancelled")
+        flight.task.cancel()
+        self.cancelled += 1
+        return True
+
+    async def stop(self):
+        """停止所有进行中的任务；各任务在退出前保存尚未保存的部分"""
+        tasks = [flight.task for flight in self._flights.values() if flight.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._flights.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "retained": len(self._jobs) - len(self._flights),
+            "subscribers": sum(f.subscribers for f in self._flights.values()),
+            "started": self.started,
+            "joined": self.joined,
+            "resumed": self.resumed,
+            "cancelled": self.cancelled,
+            "flushes": self.flushes,
+        }
+
+    def _release(self, flight: _Flight):
+        # 让出合并键：之后的新请求重新发起，而不是加入已结束 / 将被取消的任务
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def _prune(self):
+        """移除超过保留期的已结束任务"""
+        if not self._jobs:
+            return
+        expire_before = time.monotonic() - self.retain_seconds
+        expired = [
+            job_id for job_id, flight in self._jobs.items()
+            if flight.finished_at is not None and flight.finished_at < expire_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _run(self, flight: _Flight, produce, persist: Optional[Persist]):
+        loop = asyncio.get_running_loop()
+        flushed_length = 0
+        last_flush = loop.time()
+
+        async def flush():
+            nonlocal flushed_length
+            # 保存失败不影响生成，下次继续尝试
+            try:
+                length = flight.length
+                await persist(flight.text(), False)
+                flushed_length = length
+                self.flushes += 1
+            except Exception as e:
+                logger.warning(f"Saving partial {flight.operation} output failed: {str(e)}")
+
+        try:
+            async for chunk in produce():
+                flight.append(chunk)
+                if persist is not None and loop.time() - last_flush >= self.flush_seconds:
+                    await flush()
+                    last_flush = loop.time()
+            if persist is not None:
+                await persist(flight.text(), True)
+            flight.finish("done")
+        except asyncio.CancelledError:
+            # 被取消或停机：保存上次保存之后生成的部分
+            if persist is not None and flight.length > flushed_length:
+                await flush()
+            raise
+        except Exception as e:
+            # 上游出错：已保存的部分保留，不把错误当作结果保存
+            logger.error(
+                f"LLM job {flight.job_id} failed ({flight.length} chars generated, "
+                f"{flushed_length} saved): {str(e)}"
+            )
+            flight.error = str(e) or type(e).__name__
+            flight.finish("failed")
+        finally:
+            flight.finish("cancelled")
+            self._release(flight)
+
+
+# 进程内共用的生成任务表
+llm_flights = SingleFlight()
@@ -0,0 +1,334 @@
+"""
+多端点 LLM 路由：按首块延迟与错误率选择端点，超时对冲，连续失败熔断
+
+单一 api_url 变慢或出错时，总结与问答只能返回“错误”。这里维护一组 OpenAI 兼容端点
+（LLM_ENDPOINTS，JSON 列表），每次请求：
+- 按“首块延迟平滑值 ×（1 + 错误率惩罚）”从低到高排序可用端点，尚无数据的端点按配置顺序优先试用；
+  LLM_EXPLORE_RATE 比例的请求随机首选一个其他端点，以持续更新各端点的统计；
+- 首选端点在 LLM_HEDGE_AFTER_SECONDS 内没有产出首块时，向下一个端点发起对冲请求，先产出首块者胜出，
+  其余请求取消；发起前失败（HTTP 错误、连接失败、空响应）的立即切换到下一个端点；
+- 端点连续失败 LLM_BREAKER_FAILURES 次后熔断 LLM_BREAKER_COOLDOWN_SECONDS 秒，期间不参与路由；
+  冷却结束后只放行一个探测请求，成功则恢复，失败则重新熔断；所有端点都熔断时尝试最早恢复的一个；
+- 首块产出后不再切换（已发送给客户端的文本无法撤回），之后的出错照常抛出。
+
+端点池中的每个端点必须配置自己的密钥，绝不使用请求自带或服务器保存的密钥（否则能修改端点池的人
+可以把保存的密钥发往任意主机）。配置了端点池时忽略请求的 api_url（池中的密钥不能发往请求指定的主机），
+请求的模型有端点提供时只在这些端点间路由，否则使用整个端点池（计入 model_overrides）。
+未配置 LLM_ENDPOINTS 时，使用请求自带的配置（含密钥）作为唯一端点（仍记录统计与熔断状态；
+按 (api_url, model) 保留最近使用的 LLM_ADHOC_MAX_ENDPOINTS 个端点的统计）。
+本模块不依赖 aiohttp：实际请求由调用方以“端点 -> 文本块异步迭代器”的函数传入。
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "")
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "2"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+# 以该比例的请求首选一个非最优端点，使落后端点的统计得以更新（否则一次慢尾后可能再也不被选中）
+LLM_EXPLORE_RATE = float(os.getenv("LLM_EXPLORE_RATE", "0.05"))
+# 请求自带端点的统计最多保留的个数（按最近使用淘汰）
+LLM_ADHOC_MAX_ENDPOINTS = int(os.getenv("LLM_ADHOC_MAX_ENDPOINTS", "32"))
+# 首块延迟与错误率的平滑系数；错误率对排序的惩罚倍数
+_EWMA_ALPHA = 0.2
+_ERROR_PENALTY = 4.0
+
+
+class EndpointError(Exception):
+    """端点返回非 200 或空响应"""
+
+
+class Endpoint:
+    """一个 OpenAI 兼容端点及其观测统计"""
+
+    def __init__(self, name: str, api_url: str, model: str, api_key: str = "", adhoc: bool = False):
+        self.name = name
+        self.api_url = api_url
+        self.model = model
+        self.api_key = api_key
+        # 由请求自带配置生成的端点：使用请求的密钥；端点池中的端点只用自己的密钥
+        self.adhoc = adhoc
+        # 首块延迟平滑值（秒），尚无成功请求时为 None
+        self.ttft: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+
+    @property
+    def tripped(self) -> bool:
+        return self.consecutive_failures >= LLM_BREAKER_FAILURES
+
+    def available(self, now: float) -> bool:
+        if not self.tripped:
+            return True
+        # 冷却结束后只放行一个探测请求
+        return now >= self.open_until and not self.probing
+
+    def score(self) -> float:
+        return (self.ttft or 0.0) * (1 + _ERROR_PENALTY * self.error_rate)
+
+    def on_start(self):
+        self.requests += 1
+        if self.tripped:
+            self.probing = True
+
+    def on_first_chunk(self, seconds: float):
+        self.ttft = seconds if self.ttft is None else self.ttft + _EWMA_ALPHA * (seconds - self.ttft)
+        self.error_rate -= _EWMA_ALPHA * self.error_rate
+        self.wins += 1
+        if self.tripped:
+            logger.info(f"LLM endpoint {self.name} recovered")
+        self.consecutive_failures = 0
+        self.probing = False
+        metrics.LLM_BREAKER_OPEN.labels(endpoint=self.name).set(0)
+
+    def on_slower(self, seconds: float):
+        """对冲中落败：至少比胜者慢 seconds，按下界更新延迟"""
+        if self.ttft is None or seconds > self.ttft:
+            self.ttft = seconds if self.ttft is None else self.ttft + _EWMA_ALPHA * (seconds - self.ttft)
+        self.probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        self.error_rate += _EWMA_ALPHA * (1 - self.error_rate)
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.tripped:
+            self.open_until = time.monotonic() + LLM_BREAKER_COOLDOWN_SECONDS
+            metrics.LLM_BREAKER_OPEN.labels(endpoint=self.name).set(1)
+            logger.warning(
+                f"LLM endpoint {self.name} circuit open for {LLM_BREAKER_COOLDOWN_SECONDS:.0f}s "
+                f"after {self.consecutive_failures} consecutive failures"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "api_url": self.api_url,
+            "model": self.model,
+            "ttft_ms": round(self.ttft * 1000, 1) if self.ttft is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "circuit": "closed" if not self.tripped else ("open" if now < self.open_until else "half_open"),
+            "requests": self.requests,
+            "wins": self.wins,
+            "failures": self.failures,
+        }
+
+
+def parse_endpoints(items: List[Dict[str, Any]]) -> List[Endpoint]:
+    """
+    解析端点配置：[{"name", "api_url", "model", "api_key" 或 "api_key_env"}, ...]
+
+    Raises:
+        ValueError: 配置格式错误，或端点没有密钥（api_key 为空且 api_key_env 未设置）
+    """
+    if not isinstance(items, list):
+        raise ValueError("endpoints must be a list")
+    endpoints = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"endpoint {i} must be an object")
+        name = item.get("name") or f"endpoint{i}"
+        for key in ("api_url", "model"):
+            if not isinstance(item.get(key), str) or not item[key]:
+                raise ValueError(f"endpoint {name}: '{key}' is required")
+        api_key = item.get("api_key") or os.getenv(item.get("api_key_env") or "", "")
+        if not api_key:
+            raise ValueError(f"endpoint {name} has no api_key (set api_key or api_key_env)")
+        endpoints.append(Endpoint(name=name, api_url=item["api_url"], model=item["model"], api_key=api_key))
+    return endpoints
+
+
+class LLMRouter:
+    """按观测统计在多个端点间路由流式请求"""
+
+    def __init__(self, endpoints: Optional[List[Endpoint]] = None, hedge_after: float = LLM_HEDGE_AFTER_SECONDS):
+        self.endpoints: List[Endpoint] = endpoints or []
+        self.hedge_after = hedge_after
+        # 未配置端点池时，按 (api_url, model) 记录请求自带端点的统计（最近使用的在末尾）
+        self._adhoc: "OrderedDict[tuple, Endpoint]" = OrderedDict()
+        self.hedges = 0
+        # 请求的模型没有端点提供、改用整个端点池的次数
+        self.model_overrides = 0
+        self.failovers = 0
+        self.explorations = 0
+
+    def configure(self, endpoints: Optional[List[Endpoint]] = None, hedge_after: Optional[float] = None):
+        """运行中替换端点池（保留同名端点的统计）或调整对冲阈值"""
+        if endpoints is not None:
+            previous = {e.name: e for e in self.endpoints}
+            merged = []
+            for endpoint in endpoints:
+                old = previous.get(endpoint.name)
+                if old is not None and (old.api_url, old.model) == (endpoint.api_url, endpoint.model):
+                    old.api_key = endpoint.api_key
+                    endpoint = old
+                merged.append(endpoint)
+            self.endpoints = merged
+        if hedge_after is not None:
+            self.hedge_after = hedge_after
+
+    def candidates(self, api_url: str, model: str) -> List[Endpoint]:
+        """
+        本次请求可用的端点：已配置的端点池，或请求自带的配置（adhoc，不含密钥，由调用方使用请求自带的密钥）
+
+        有端点池时忽略 api_url；池中有提供 model 的端点时只返回这些端点，否则返回整个端点池。
+        """
+        if self.endpoints:
+            matching = [e for e in self.endpoints if e.model == model]
+            if matching:
+                return matching
+            self.model_overrides += 1
+            logger.debug(f"No LLM endpoint serves model {model!r}; routing across the whole pool")
+            return self.endpoints
+        key = (api_url, model)
+        endpoint = self._adhoc.get(key)
+        if endpoint is None:
+            endpoint = self._adhoc[key] = Endpoint(model, api_url, model, adhoc=True)
+            while len(self._adhoc) > LLM_ADHOC_MAX_ENDPOINTS:
+                # 淘汰最久未用的；进行中的请求仍持有端点对象，不受影响
+                self._adhoc.popitem(last=False)
+        else:
+            self._adhoc.move_to_end(key)
+        return [endpoint]
+
+    def rank(self, endpoints: List[Endpoint]) -> List[Endpoint]:
+        now = time.monotonic()
+        available = [e for e in endpoints if e.available(now)]
+        if not available:
+            # 全部熔断：尝试最早恢复的一个，而不是直接失败
+            return [min(endpoints, key=lambda e: e.open_until)]
+        # sorted 是稳定排序：同分（如均无数据）时保持配置顺序
+        ranked = sorted(available, key=lambda e: e.score())
+        if len(ranked) > 1 and random.random() < LLM_EXPLORE_RATE:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+            self.explorations += 1
+        return ranked
+
+    async def stream(
+        self,
+        operation: str,
+        endpoints: List[Endpoint],
+        open_stream: Callable[[Endpoint], AsyncIterator[str]],
+    ) -> AsyncIterator[str]:
+        """
+        在端点间路由一次流式请求
+
+        Args:
+            operation: 指标标签
+            endpoints: 候选端点（candidates() 的结果）
+            open_stream: 对指定端点发起请求、返回文本块异步迭代器的函数；失败时抛出异常
+        Raises:
+            首块产出前所有候选端点都失败时，抛出最后一个错误
+        """
+        loop = asyncio.get_running_loop()
+        order = self.rank(endpoints)
+        # 进行中的尝试：等待首块的任务 -> (端点, 迭代器, 发起时间)
+        pending: Dict[asyncio.Future, tuple] = {}
+        winner = None
+        last_error: Optional[BaseException] = None
+
+        def launch(force: bool = False) -> bool:
+            """
+            向排序中的下一个端点发起尝试
+
+            排序只在请求开始时做一次：对冲 / 切换时跳过此后已熔断（或正由其他请求探测）的端点。
+            force 用于首个尝试（rank() 在全部熔断时给出的最早恢复端点也要尝试）。
+            """
+            while order:
+                endpoint = order.pop(0)
+                if not force and not endpoint.available(time.monotonic()):
+                    continue
+                endpoint.on_start()
+                chunks = open_stream(endpoint).__aiter__()
+                pending[asyncio.ensure_future(chunks.__anext__())] = (endpoint, chunks, loop.time())
+                return True
+            return False
+
+        launch(force=True)
+        try:
+            while pending and winner is None:
+                timeout = self.hedge_after if order and self.hedge_after > 0 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 首块迟迟未到：对冲到下一个端点，两者同时进行
+                    if launch():
+                        self.hedges += 1
+                        metrics.LLM_HEDGES.labels(operation=operation).inc()
+                    continue
+                for task in done:
+                    endpoint, chunks, started = pending.pop(task)
+                    error = task.exception()
+                    if error is None and winner is None:
+                        endpoint.on_first_chunk(loop.time() - started)
+                        metrics.LLM_ENDPOINT_ATTEMPTS.labels(endpoint=endpoint.name, outcome="won").inc()
+                        winner = (endpoint, chunks, task.result())
+                        continue
+                    if error is None:
+                        # 同一轮中另一个端点也产出了首块：按落败处理
+                        pending[task] = (endpoint, chunks, started)
+                        continue
+                    if isinstance(error, StopAsyncIteration):
+                        error = EndpointError("empty response")
+                    last_error = error
+                    endpoint.on_failure()
+                    metrics.LLM_ENDPOINT_ATTEMPTS.labels(endpoint=endpoint.name, outcome="failed").inc()
+                    logger.warning(f"LLM endpoint {endpoint.name} failed before first chunk: {error}")
+                    if winner is None and launch():
+                        # 立即切换到下一个端点
+                        self.failovers += 1
+                        metrics.LLM_FAILOVERS.labels(operation=operation).inc()
+        finally:
+            # 取消落败 / 未完成的尝试
+            for task, (endpoint, chunks, started) in pending.items():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await chunks.aclose()
+                endpoint.on_slower(loop.time() - started)
+                metrics.LLM_ENDPOINT_ATTEMPTS.labels(endpoint=endpoint.name, outcome="lost").inc()
+
+        if winner is None:
+            raise last_error or EndpointError("no LLM endpoint available")
+
+        endpoint, chunks, first = winner
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception:
+            endpoint.on_failure()
+            metrics.LLM_ENDPOINT_ATTEMPTS.labels(endpoint=endpoint.name, outcome="failed_mid_stream").inc()
+            raise
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_after_seconds": self.hedge_after,
+            "breaker_failures": LLM_BREAKER_FAILURES,
+            "breaker_cooldown_seconds": LLM_BREAKER_COOLDOWN_SECONDS,
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "explorations": self.explorations,
+            "model_overrides": self.model_overrides,
+            "endpoints": [e.stats() for e in (self.endpoints or list(self._adhoc.values()))],
+        }
+
+
+# 进程内共用的路由（端点池来自 LLM_ENDPOINTS）
+llm_router = LLMRouter(parse_endpoints(json.loads(LLM_ENDPOINTS)) if LLM_ENDPOINTS.strip() else [])
@@ -1,13 +1,21 @@
 import asyncio
 import logging
+import time
+
+# 进程启动计时起点（启动完成时记录导入 + 初始化耗时）
+_process_started_at = time.perf_counter()
 import uuid
 import json
 from datetime import datetime, timedelta
 import os, hmac, hashlib, base64
-from typing import Dict, Optional
+import signal
+import sys
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, Response
+from fastapi.responses import StreamingResponse, Response, JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import (
     SonioxConfig,
@@ -15,12 +23,27 @@ from models import (
     TranscriptionSession,
     TranscriptionSegment,
     SummarizeRequest,
+    AnalyzeRequest,
     QuestionRequest,
+    ProfilingConfig,
 )
 from soniox_service import SonioxWebSocketService
-from openai_service import OpenAIService
-from database import get_db, init_db, TranscriptionSessionDB, SettingDB, async_session_maker
+from upstream_pool import UpstreamPool
+from keepalive import keepalive_scheduler
+from llm_coalesce import llm_flights
+from llm_router import llm_router, parse_endpoints
+from prompt_render import render_plain, render_transcript
+from admission import admission, AdmissionRejected
+from database import get_db, init_db, TranscriptionSessionDB, write_queue, async_session_maker, engine
+from analytics import AnalyticsPipeline, find_low_confidence_spans
+from maintenance import MaintenanceScheduler, SegmentCompactor
+from segment_codec import encode_columns
+from settings_cache import settings_cache, upsert_settings, SETTINGS_VERSION_KEY
 import crud
+import metrics
+from tracing import SessionTrace
+from text_index import segment_language
+from profiling import profiler, profiled
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -89,19 +112,23 @@ def _verify_password(stored: str, password: str) -> bool:
         return False
 
 async def _get_setting(key: str) -> Optional[str]:
-    async with async_session_maker() as session:
-        row = await session.get(SettingDB, key)
-        return row.value if row else None
+    return await settings_cache.get(key)
 
 async def _set_setting(key: str, value: str) -> None:
-    async with async_session_maker() as session:
-        row = await session.get(SettingDB, key)
-        if row:
-            row.value = value
-        else:
-            row = SettingDB(key=key, value=value)
-            session.add(row)
-        await session.commit()
+    await _set_settings({key: value})
+
+async def _set_settings(values: Dict[str, str]) -> None:
+    """在一个事务中写入多项配置；与当前取值相同的项跳过"""
+    # 写路径上先刷新缓存，避免依据其他 worker 已修改前的旧值误判“未变化”
+    settings_cache.invalidate()
+    current = await settings_cache.all()
+    changed = {k: v for k, v in values.items() if current.get(k) != v}
+    if not changed:
+        return
+    try:
+        await write_queue.submit(lambda session: upsert_settings(session, changed))
+    finally:
+        settings_cache.invalidate()
 
 async def _is_initialized() -> bool:
     if ACCESS_PASSWORD:
@@ -167,14 +194,26 @@ def _require_auth(request: Request):
     if ACCESS_PASSWORD and (not token or not _verify(token)):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+def _require_admin(request: Request):
+    """
+    读取密钥或改变全局状态的接口：无论哪种密码模式都要求有效的登录 Cookie
+
+    _require_auth 在未设置 ACCESS_PASSWORD 时放行；数据库密码模式下的 Cookie 只能经 /auth/login
+    或 /auth/setup 取得，尚未设置密码时这些接口一律拒绝。
+    """
+    token = request.cookies.get(COOKIE_NAME)
+    if not token or not _verify(token):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
 # 全局云端配置存取
 @app.get("/config")
 async def get_config(request: Request):
     _require_auth(request)
-    soniox_cfg_raw = await _get_setting("soniox_config") or "{}"
-    openai_cfg_raw = await _get_setting("openai_config") or "{}"
-    soniox_key = await _get_setting("soniox_api_key")
-    openai_key = await _get_setting("openai_api_key")
+    settings = await settings_cache.all()
+    soniox_cfg_raw = settings.get("soniox_config") or "{}"
+    openai_cfg_raw = settings.get("openai_config") or "{}"
+    soniox_key = settings.get("soniox_api_key")
+    openai_key = settings.get("openai_api_key")
     try:
         soniox_cfg = json.loads(soniox_cfg_raw) if soniox_cfg_raw else {}
         openai_cfg = json.loads(openai_cfg_raw) if openai_cfg_raw else {}
@@ -208,31 +247,131 @@ async def put_config(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     # 保存（密钥分开存储；留空不更新；clear_* 为 true 时清空）
+    changes: Dict[str, str] = {}
     if soniox:
         key = soniox.get("api_key")
         if key:
-            await _set_setting("soniox_api_key", key)
+            changes["soniox_api_key"] = key
         if soniox.get("clear_api_key") is True:
-            await _set_setting("soniox_api_key", "")
+            changes["soniox_api_key"] = ""
         soniox_slim = {k: v for k, v in soniox.items() if k not in ("api_key", "clear_api_key")}
-        await _set_setting("soniox_config", json.dumps(soniox_slim))
+        changes["soniox_config"] = json.dumps(soniox_slim)
     if openai:
         key = openai.get("api_key")
         if key:
-            await _set_setting("openai_api_key", key)
+            changes["openai_api_key"] = key
         if openai.get("clear_api_key") is True:
-            await _set_setting("openai_api_key", "")
+            changes["openai_api_key"] = ""
         openai_slim = {k: v for k, v in openai.items() if k not in ("api_key", "clear_api_key")}
-        await _set_setting("openai_config", json.dumps(openai_slim))
+        changes["openai_config"] = json.dumps(openai_slim)
+    # 所有变更在一个事务中写入
+    await _set_settings(changes)
     return {"ok": True}
 
+# 不参与导入导出的配置项
+_NON_EXPORTABLE_SETTINGS = {"password_hash", SETTINGS_VERSION_KEY}
+_SECRET_SETTINGS = {"soniox_api_key", "openai_api_key"}
+
+@app.get("/config/export")
+async def export_config(request: Request, include_secrets: bool = Query(False)):
+    """导出全部配置（默认不含 API 密钥；include_secrets 需已登录）"""
+    _require_auth(request)
+    if include_secrets:
+        _require_admin(request)
+    settings = await settings_cache.all()
+    exported = {
+        k: v for k, v in settings.items()
+        if k not in _NON_EXPORTABLE_SETTINGS and (include_secrets or k not in _SECRET_SETTINGS)
+    }
+    return {"settings": exported}
+
+def _redirects_secrets(key: str, value: Any) -> bool:
+    """导入项是否会改写 API 密钥或上游地址（改写地址可让已保存的密钥发往别处）"""
+    if key in _SECRET_SETTINGS:
+        return True
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return False
+    return isinstance(value, dict) and any(str(k).lower().endswith("url") for k in value)
+
+@app.post("/config/import")
+async def import_config(request: Request):
+    """批量导入配置（单事务写入；值为对象时按 JSON 保存；含密钥或 URL 时需已登录）"""
+    _require_auth(request)
+    body = await request.json()
+    incoming = (body or {}).get("settings")
+    if not isinstance(incoming, dict):
+        raise HTTPException(status_code=400, detail="'settings' must be an object")
+    if any(_redirects_secrets(k, v) for k, v in incoming.items()):
+        _require_admin(request)
+    values: Dict[str, str] = {}
+    for k, v in incoming.items():
+        if k in _NON_EXPORTABLE_SETTINGS:
+            raise HTTPException(status_code=400, detail=f"Setting '{k}' cannot be imported")
+        values[k] = v if isinstance(v, str) else json.dumps(v)
+    await _set_settings(values)
+    return {"ok": True, "imported": len(values)}
+
+# 会话结束后的后台统计
+analytics_pipeline = AnalyticsPipeline(
+    async_session_maker,
+    write_queue,
+    workers=int(os.getenv("ANALYTICS_WORKERS", "2")),
+)
+# 旧行的 segments 压缩编码转换
+segment_compactor = SegmentCompactor(async_session_maker, write_queue)
+# 保留策略：低峰期且无进行中的转录时归档 / 删除旧会话并回收空间
+maintenance_scheduler = MaintenanceScheduler(
+    async_session_maker,
+    write_queue,
+    engine,
+    is_idle=lambda: not active_soniox_connections,
+)
+# 预先建立的 Soniox 上游连接，会话开始时取出并发送配置
+upstream_pool = UpstreamPool(SonioxWebSocketService.open_connection)
+
 # 启动事件：初始化数据库
 @app.on_event("startup")
 async def startup_event():
     """应用启动时初始化数据库"""
     logger.info("Initializing database...")
-    await init_db()
-    logger.info("Database initialized successfully")
+    init_started = time.perf_counter()
+    up_to_date = await init_db()
+    init_seconds = time.perf_counter() - init_started
+    await write_queue.start()
+    # 预热配置缓存，首个请求无需再访问数据库
+    await settings_cache.all()
+    await analytics_pipeline.start()
+    segment_compactor.start()
+    maintenance_scheduler.start()
+    upstream_pool.start()
+    admission.start()
+    _install_drain_on_signal()
+    startup_seconds = time.perf_counter() - _process_started_at
+    metrics.STARTUP_SECONDS.set(startup_seconds)
+    logger.info(
+        f"Database initialized successfully (schema {'up to date' if up_to_date else 'migrated'} "
+        f"in {init_seconds * 1000:.0f} ms); startup took {startup_seconds * 1000:.0f} ms"
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时排空进行中的会话，并提交写队列中剩余的写操作"""
+    await start_drain()
+    await admission.stop()
+    await upstream_pool.stop()
+    await keepalive_scheduler.stop()
+    await llm_flights.stop()
+    if "openai_service" in sys.modules:
+        # 按需导入的模块：用过 LLM 才需要关闭共用连接池
+        await sys.modules["openai_service"].close_http_session()
+    await maintenance_scheduler.stop()
+    await segment_compactor.stop()
+    await analytics_pipeline.stop()
+    await write_queue.stop()
 
 # 配置 CORS
 app.add_middleware(
@@ -241,12 +380,143 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Job-Id", "X-Job-Status"],
 )
 
 # 存储活跃的转录会话
 active_sessions: Dict[str, TranscriptionSession] = {}
 # 存储活跃的 Soniox 连接
 active_soniox_connections: Dict[str, SonioxWebSocketService] = {}
+# 活跃会话的延迟追踪
+active_traces: Dict[str, SessionTrace] = {}
+# 可被停机排空的会话：session_id -> (会话收尾函数, 浏览器连接)
+# 先从字典中取出收尾函数的一方（会话自身的 finally 或停机排空）负责落库，避免重复保存
+drainable_sessions: Dict[str, Tuple[Callable[[], TranscriptionSession], WebSocket]] = {}
+
+# 停机排空等待最终 token 的最长时间（秒）
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "10"))
+_drain_task: Optional[asyncio.Task] = None
+
+
+async def drain_sessions() -> Dict[str, Any]:
+    """
+    停机排空
+
+    停止准入，向所有上游发送 finalize 并等待最终 token（最多 SHUTDOWN_DRAIN_SECONDS 秒），
+    然后在一个事务中保存全部进行中的会话，通知浏览器会话已结束并关闭浏览器与上游连接
+    （之后到达的音频不会再被转发而不落库）。准入保持停止，直到 resume_admission()。
+    """
+    started = time.monotonic()
+    admission.drain()
+    services = list(active_soniox_connections.values())
+    logger.info(f"Draining {len(services)} live session(s)")
+    await asyncio.gather(*(svc.finalize() for svc in services), return_exceptions=True)
+    finalized = await asyncio.gather(*(svc.wait_finalized(SHUTDOWN_DRAIN_SECONDS) for svc in services))
+
+    # 取出仍在进行的会话（此后这些会话的 finally 不再重复落库）
+    claimed = [(sid, *drainable_sessions.pop(sid)) for sid in list(drainable_sessions)]
+    # 已取出的会话不再接收 token：先关闭上游，停止转发音频
+    await asyncio.gather(
+        *(active_soniox_connections[sid].close() for sid, _, _ in claimed if sid in active_soniox_connections),
+        return_exceptions=True,
+    )
+    sessions = [seal() for _, seal, _ in claimed]
+    for session in sessions:
+        if session.status == "active":
+            session.status = "stopped"
+    dumps = [[seg.model_dump() for seg in session.segments] for session in sessions]
+    columns = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: [encode_columns(d) for d in dumps]
+    )
+
+    async def add_all(db: AsyncSession):
+        for session, segment_columns in zip(sessions, columns):
+            await crud.add_session(db, session, segment_columns)
+
+    saved = 0
+    if sessions:
+        try:
+            await write_queue.submit(add_all)
+            saved = len(sessions)
+        except Exception as e:
+            # 整批失败时逐个保存，隔离出错的会话
+            logger.warning(f"Batched drain save failed, saving individually: {str(e)}")
+            for session, segment_columns in zip(sessions, columns):
+                try:
+                    await write_queue.submit(lambda db, s=session, c=segment_columns: crud.add_session(db, s, c))
+                    saved += 1
+                except Exception as e:
+                    logger.error(f"Error saving session {session.session_id} during drain: {str(e)}")
+        for session in sessions:
+            analytics_pipeline.submit(session.session_id)
+
+    for sid, _, websocket in claimed:
+        try:
+            await websocket.send_json({"type": "session_completed", "session_id": sid, "reason": "server_shutdown"})
+            # 1001 going away：会话处理函数随之收到断开并清理（已被取出，不会重复保存）
+            await websocket.close(code=1001)
+        except Exception:
+            pass
+
+    result = {
+        "sessions": len(sessions),
+        "saved": saved,
+        "finalized": sum(1 for ok in finalized if ok),
+        "timed_out": sum(1 for ok in finalized if not ok),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info(f"Drain finished: {result}")
+    return result
+
+
+def start_drain() -> asyncio.Task:
+    """启动（或返回已在进行的）停机排空"""
+    global _drain_task
+    if _drain_task is None:
+        _drain_task = asyncio.create_task(drain_sessions())
+    return _drain_task
+
+
+def resume_admission() -> bool:
+    """
+    撤销已完成的排空，恢复接受新会话（如滚动发布中止）
+
+    Returns:
+        排空仍在进行时返回 False
+    """
+    global _drain_task
+    if _drain_task is not None and not _drain_task.done():
+        return False
+    _drain_task = None
+    admission.resume()
+    return True
+
+
+def _install_drain_on_signal():
+    """
+    收到 SIGTERM / SIGINT 时先排空会话，再交给 uvicorn 原有的退出处理
+
+    uvicorn 在执行 shutdown 事件之前就会断开所有 WebSocket 连接，仅在 shutdown 事件中排空为时已晚。
+    排空期间再次收到信号则立即按原处理退出。
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            if _drain_task is not None:
+                previous(signum, frame)
+                return
+            logger.info(f"Received signal {signum}, draining sessions before exit")
+            loop.call_soon_threadsafe(
+                lambda: start_drain().add_done_callback(lambda _: previous(signum, None))
+            )
+
+        signal.signal(sig, handler)
 
 
 @app.get("/")
@@ -255,6 +525,152 @@ async def root():
     return {"status": "ok", "service": "Soniox Transcription Platform"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式指标"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/admin/storage")
+async def get_storage_status(request: Request):
+    """存储维护任务状态（旧行压缩转换进度、保留策略执行情况）"""
+    _require_auth(request)
+    return {"compaction": segment_compactor.stats(), "maintenance": maintenance_scheduler.stats()}
+
+
+@app.post("/admin/maintenance/run")
+async def run_maintenance(request: Request, full_vacuum: bool = False):
+    """
+    立即执行一轮存储维护（忽略低峰时段限制，但要求无进行中的转录）
+
+    full_vacuum=true 时，已有库会做一次完整 VACUUM 以启用增量 auto_vacuum（阻塞写入，耗时与库大小成正比）。
+    """
+    _require_admin(request)
+    if not maintenance_scheduler.is_idle():
+        raise HTTPException(status_code=409, detail="Transcription sessions are active")
+    return await maintenance_scheduler.run_once(full_vacuum=full_vacuum)
+
+
+@app.get("/admin/upstream")
+async def get_upstream_status(request: Request):
+    """
+    上游预热池与 keepalive 调度状态，以及按连接来源的建连耗时与首词延迟（A/B：pool 对比 holdout）
+    """
+    _require_auth(request)
+    return {
+        "pool": upstream_pool.stats(),
+        "keepalive": keepalive_scheduler.stats(),
+        "connect": metrics.SONIOX_CONNECT_SECONDS.summary(),
+        "first_token": metrics.SONIOX_FIRST_TOKEN_SECONDS.summary(),
+    }
+
+
+@app.get("/admin/llm")
+async def get_llm_status(request: Request):
+    """
+    LLM 生成任务状态（进行中 / 保留中的任务，发起 / 合并 / 续传 / 取消次数）、
+    各端点的首块延迟、错误率与熔断状态，以及按操作的首块延迟
+    """
+    _require_auth(request)
+    return {
+        "coalescing": llm_flights.stats(),
+        "routing": llm_router.stats(),
+        "first_chunk": metrics.LLM_FIRST_CHUNK_SECONDS.summary(),
+    }
+
+
+@app.post("/admin/llm")
+async def set_llm_routing(request: Request):
+    """
+    运行中替换端点池或调整对冲阈值：{"endpoints": [...]（格式同 LLM_ENDPOINTS）, "hedge_after_seconds": 2}
+
+    需已登录：端点池决定转录内容发往哪里。每个端点须带自己的密钥，不会使用服务器保存的密钥。
+    """
+    _require_admin(request)
+    body = await request.json()
+    values = {}
+    if "endpoints" in body:
+        try:
+            values["endpoints"] = parse_endpoints(body["endpoints"] or [])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"invalid endpoints: {e}")
+    hedge_after = body.get("hedge_after_seconds")
+    if hedge_after is not None:
+        if not isinstance(hedge_after, (int, float)) or isinstance(hedge_after, bool) or hedge_after < 0:
+            raise HTTPException(status_code=400, detail="hedge_after_seconds must be a non-negative number")
+        values["hedge_after"] = float(hedge_after)
+    llm_router.configure(**values)
+    return llm_router.stats()
+
+
+@app.get("/admin/admission")
+async def get_admission_status(request: Request):
+    """准入控制状态：活跃 / 排队会话数、事件循环延迟、是否过载与建议的重试秒数"""
+    _require_auth(request)
+    return admission.stats()
+
+
+@app.post("/admin/admission")
+async def set_admission(request: Request):
+    """运行中调整 max_sessions / max_queue / max_loop_lag_ms；需已登录（设为 0 即拒绝所有新会话）"""
+    _require_admin(request)
+    body = await request.json()
+    values = {}
+    for key in ("max_sessions", "max_queue", "max_loop_lag_ms"):
+        value = body.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise HTTPException(status_code=400, detail=f"{key} must be a non-negative number")
+        values[key] = int(value) if key != "max_loop_lag_ms" else float(value)
+    admission.configure(**values)
+    return admission.stats()
+
+
+@app.post("/admin/drain")
+async def drain(request: Request):
+    """
+    停止准入并排空进行中的会话（供滚动发布的 preStop 钩子调用），返回排空结果；进程不退出
+
+    需已登录：排空会结束所有会话并拒绝新会话，直到 DELETE /admin/drain。
+    """
+    _require_admin(request)
+    return await start_drain()
+
+
+@app.delete("/admin/drain")
+async def undrain(request: Request):
+    """撤销排空，恢复接受新会话"""
+    _require_admin(request)
+    if not resume_admission():
+        raise HTTPException(status_code=409, detail="Drain still in progress")
+    return admission.stats()
+
+
+@app.get("/admin/profiling")
+async def get_profiling(request: Request):
+    """剖析状态与按函数汇总的耗时统计"""
+    _require_auth(request)
+    return profiler.stats()
+
+
+@app.post("/admin/profiling")
+async def set_profiling(config: ProfilingConfig, request: Request):
+    """开启 / 关闭剖析、调整采样率；reset=true 时清空已收集的数据（需已登录）"""
+    _require_admin(request)
+    profiler.configure(enabled=config.enabled, sample_rate=config.sample_rate)
+    if config.reset:
+        profiler.reset()
+    return {"enabled": profiler.enabled, "sample_rate": profiler.sample_rate}
+
+
+@app.get("/admin/profiling/folded")
+async def get_profiling_folded(request: Request):
+    """折叠栈格式输出，可直接交给 flamegraph.pl 或 speedscope"""
+    _require_auth(request)
+    return PlainTextResponse(profiler.folded())
+
+
 @app.websocket("/ws/transcribe")
 async def transcribe_websocket(websocket: WebSocket):
     """
@@ -267,6 +683,21 @@ async def transcribe_websocket(websocket: WebSocket):
     if ACCESS_PASSWORD and (not token or not _verify(token)):
         await websocket.close(code=4401)
         return
+    # 准入控制：超出并发上限时排队（期间推送排位），过载 / 队列满 / 排队超时则拒绝并给出重试建议
+    try:
+        await admission.acquire(websocket.send_json)
+    except AdmissionRejected as e:
+        await websocket.send_json({
+            "type": "error",
+            "error_code": e.reason,
+            "error_message": f"Server busy, retry after {e.retry_after}s",
+            "retry_after": e.retry_after,
+        })
+        await websocket.close(code=1013)
+        return
+    except WebSocketDisconnect:
+        return
+    admitted_at = time.monotonic()
     session_id = str(uuid.uuid4())
     soniox_service: SonioxWebSocketService = None
     current_segment: TranscriptionSegment = None
@@ -281,10 +712,32 @@ async def transcribe_websocket(websocket: WebSocket):
         created_at=datetime.now(),
     )
     active_sessions[session_id] = session
+    trace = SessionTrace()
+    active_traces[session_id] = trace
+    metrics.ACTIVE_SESSIONS.inc()
+
+    def close_segment(segment: TranscriptionSegment):
+        """片段关闭：标注主语言并加入会话"""
+        segment.language = segment_language(segment.tokens)
+        session.segments.append(segment)
+
+    def seal_session() -> TranscriptionSession:
+        """会话收尾：保存最后的 segment，写入延迟分解"""
+        nonlocal current_segment
+        if current_segment:
+            close_segment(current_segment)
+            current_segment = None
+            session.open_segment = None
+            session.status = "stopped"
+        session.metadata["latency"] = trace.summary()
+        return session
+
+    drainable_sessions[session_id] = (seal_session, websocket)
 
     try:
         # 第一条消息应该是配置
         config_data = await websocket.receive_json()
+        config_received_at = time.perf_counter()
 
         if "config" not in config_data:
             await websocket.send_json({"error": "First message must contain 'config'"})
@@ -304,12 +757,14 @@ async def transcribe_websocket(websocket: WebSocket):
         soniox_config = SonioxConfig(**incoming_cfg)
 
         # 定义消息处理回调
+        @profiled("on_soniox_message")
         async def on_soniox_message(message):
             """处理来自 Soniox 的消息并转发给客户端"""
             nonlocal current_segment, current_speaker
 
             if message["type"] == "transcription":
                 tokens = message["tokens"]
+                changed = False
 
                 # 按发言人分组 tokens
                 for token in tokens:
@@ -318,7 +773,8 @@ async def transcribe_websocket(websocket: WebSocket):
                     # 如果发言人改变，创建新的 segment
                     if speaker != current_speaker:
                         if current_segment:
-                            session.segments.append(current_segment)
+                            close_segment(current_segment)
+                            changed = True
 
                         current_speaker = speaker
                         current_segment = TranscriptionSegment(
@@ -335,16 +791,36 @@ async def transcribe_websocket(websocket: WebSocket):
                         current_segment.text += token.get("text", "")
                         current_segment.end_time = token.get("end_ms", current_segment.end_time)
                         session.full_transcript += token.get("text", "")
+                        changed = True
 
                         # 若检测到句末标记（endpoint 或 finalize），落段并重置
                         if token.get("text") in ("<end>", "<fin>"):
                             if current_segment:
-                                session.segments.append(current_segment)
+                                close_segment(current_segment)
                             current_segment = None
                             current_speaker = None
 
+                session.open_segment = current_segment
+                if changed:
+                    session.version += 1
+
                 # 发送给客户端
+                arrived_at = soniox_service.last_frame_at
+                if trace.first_token_at is None:
+                    metrics.SONIOX_FIRST_TOKEN_SECONDS.labels(
+                        source=soniox_service.upstream_source
+                    ).observe(arrived_at - config_received_at)
+                send_started_at = time.perf_counter()
                 await websocket.send_json(message)
+                sent_at = time.perf_counter()
+                metrics.RELAY_SECONDS.observe(sent_at - arrived_at)
+                trace.on_frame(
+                    arrived_at,
+                    send_started_at,
+                    sent_at,
+                    message.get("audio_final_proc_ms", 0.0),
+                    message.get("audio_total_proc_ms", 0.0),
+                )
 
             elif message["type"] == "session_started":
                 await websocket.send_json(
@@ -355,10 +831,11 @@ async def transcribe_websocket(websocket: WebSocket):
                 await websocket.send_json(message)
 
         # 连接到 Soniox
-        soniox_service = SonioxWebSocketService(soniox_config)
+        soniox_service = SonioxWebSocketService(soniox_config, pool=upstream_pool)
         active_soniox_connections[session_id] = soniox_service
 
         connected = await soniox_service.connect(on_soniox_message)
+        trace.on_upstream_connected(soniox_service.upstream_source, soniox_service.connect_seconds)
 
         if not connected:
             await websocket.send_json({"error": "Failed to connect to Soniox"})
@@ -373,10 +850,17 @@ async def transcribe_websocket(websocket: WebSocket):
         while True:
             message = await websocket.receive()
 
+            if message["type"] == "websocket.disconnect":
+                # 浏览器断开或服务停机断开连接（receive 返回断开消息而非抛出异常）
+                raise WebSocketDisconnect(message.get("code", 1000))
+
             if "bytes" in message:
                 # 音频数据 - 转发到 Soniox
                 audio_data = message["bytes"]
-                await soniox_service.send_audio(audio_data)
+                received_at = time.perf_counter()
+                trace.on_audio(len(audio_data), received_at)
+                if await soniox_service.send_audio(audio_data):
+                    trace.on_upstream_sent(received_at, time.perf_counter())
 
             elif "text" in message:
                 # 文本消息 - 处理命令
@@ -390,8 +874,11 @@ async def transcribe_websocket(websocket: WebSocket):
                 elif data.get("command") == "stop":
                     # 保存当前 segment
                     if current_segment:
-                        session.segments.append(current_segment)
+                        close_segment(current_segment)
+                        current_segment = None
+                        session.open_segment = None
                     session.status = "completed"
+                    session.version += 1
                     await websocket.send_json(
                         {"type": "session_completed", "session_id": session_id}
                     )
@@ -418,24 +905,30 @@ async def transcribe_websocket(websocket: WebSocket):
         await websocket.send_json({"error": str(e)})
     finally:
         # 清理
+        metrics.ACTIVE_SESSIONS.dec()
+        admission.release(time.monotonic() - admitted_at)
+        # 在任何 await 之前取出收尾函数：已被停机排空取走的会话由排空统一保存
+        drainable = drainable_sessions.pop(session_id, None)
         if soniox_service:
             await soniox_service.close()
         if session_id in active_soniox_connections:
             del active_soniox_connections[session_id]
 
-        # 保存最后的 segment
-        if current_segment:
-            session.segments.append(current_segment)
-            session.status = "stopped"
+        if drainable is not None:
+            # 保存最后的 segment，延迟分解随会话元数据一起保存
+            seal_session()
 
-        # 保存到数据库
-        try:
-            async for db in get_db():
-                await crud.create_session(db, session)
+            # 保存到数据库（segments 在线程池中压缩编码，经写队列与其他并发结束的会话合并提交）
+            try:
+                segment_columns = await asyncio.get_running_loop().run_in_executor(
+                    None, encode_columns, [seg.model_dump() for seg in session.segments]
+                )
+                await write_queue.submit(lambda db: crud.add_session(db, session, segment_columns))
                 logger.info(f"Session {session_id} saved to database")
-                break
-        except Exception as e:
-            logger.error(f"Error saving session to database: {str(e)}")
+                analytics_pipeline.submit(session_id)
+            except Exception as e:
+                logger.error(f"Error saving session to database: {str(e)}")
+        active_traces.pop(session_id, None)
 
         logger.info(f"Transcription session ended: {session_id}")
 
@@ -445,11 +938,39 @@ async def get_sessions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     search: Optional[str] = Query(None),
+    min_duration: Optional[float] = Query(None, ge=0),
+    max_duration: Optional[float] = Query(None, ge=0),
+    min_words: Optional[int] = Query(None, ge=0),
+    max_words: Optional[int] = Query(None, ge=0),
+    min_wpm: Optional[float] = Query(None, ge=0),
+    max_wpm: Optional[float] = Query(None, ge=0),
+    min_interruptions: Optional[int] = Query(None, ge=0),
+    max_interruptions: Optional[int] = Query(None, ge=0),
+    min_low_confidence: Optional[int] = Query(None, ge=0),
+    language: Optional[str] = Query(None, max_length=16),
+    order_by: str = Query("created_at", regex="^(created_at|duration|words|wpm|interruptions|low_confidence)$"),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取所有转录会话（从数据库）"""
-    sessions = await crud.get_sessions(db, skip=skip, limit=limit, search=search)
-    total = await crud.get_session_count(db, search=search)
+    """
+    获取所有转录会话（从数据库），可按后台统计列过滤与排序
+
+    language 只返回包含该语言片段的会话；与 search 同时给定时，搜索词须出现在该语言的文本中。
+    """
+    filters = {
+        "min_duration": min_duration,
+        "max_duration": max_duration,
+        "min_words": min_words,
+        "max_words": max_words,
+        "min_wpm": min_wpm,
+        "max_wpm": max_wpm,
+        "min_interruptions": min_interruptions,
+        "max_interruptions": max_interruptions,
+        "min_low_confidence": min_low_confidence,
+    }
+    sessions = await crud.get_sessions(
+        db, skip=skip, limit=limit, search=search, filters=filters, order_by=order_by, language=language
+    )
+    total = await crud.get_session_count(db, search=search, filters=filters, language=language)
 
     return {
         "total": total,
@@ -465,132 +986,430 @@ async def get_sessions(
                 "duration_seconds": session.duration_seconds,
                 "speaker_count": session.speaker_count,
                 "word_count": session.word_count,
+                "char_count": session.char_count,
+                "words_per_minute": session.words_per_minute,
+                "interruption_count": session.interruption_count,
+                "low_confidence_count": session.low_confidence_count,
+                "analyzed": session.analyzed_at is not None,
+                "archived": session.archived_at is not None,
             }
             for session in sessions
         ]
     }
 
 
+def _session_etag(session_id: str, version: int, since: Optional[int]) -> str:
+    """会话内容的弱 ETag（版本号 + 增量游标）"""
+    return f'W/"{session_id}-{version}-{since if since is not None else "all"}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
 @app.get("/sessions/{session_id}")
-async def get_session(session_id: str, db: AsyncSession = Depends(get_db)):
-    """获取特定会话的详细信息"""
+async def get_session(
+    session_id: str,
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取特定会话的详细信息
+
+    since: 可选的 segment 游标；给定时只返回索引 >= since 的已关闭 segment，
+    响应中的 next_since 作为下一次轮询的游标。
+    活跃会话附带尚未关闭的 open_segment（暂定内容，下次轮询时整体替换；关闭后出现在 segments 中）。
+    增量模式不返回 full_transcript：它等于各 segment 与 open_segment 的 text 依次拼接。
+    支持 If-None-Match：内容版本未变化时直接返回 304。
+    """
     # 优先从活跃会话中获取
     if session_id in active_sessions:
         session = active_sessions[session_id]
-        return session.model_dump()
+        etag = _session_etag(session_id, session.version, since)
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if since is None:
+            data = session.model_dump()
+        else:
+            # 增量模式：仅序列化新增的 segment，避免每次轮询复制整段转录
+            data = {
+                "session_id": session.session_id,
+                "title": session.title,
+                "created_at": session.created_at,
+                "status": session.status,
+                "version": session.version,
+                "segments": [seg.model_dump() for seg in session.segments[since:]],
+            }
+        # 未关闭片段的 token 同样推动版本号，需随响应返回，否则客户端会反复收到空增量
+        open_segment = session.open_segment
+        data["open_segment"] = open_segment.model_dump() if open_segment is not None else None
+        data["since"] = since
+        data["next_since"] = len(session.segments)
+        return JSONResponse(content=jsonable_encoder(data), headers={"ETag": etag})
 
     # 从数据库获取
     db_session = await crud.get_session(db, session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    version = int(db_session.updated_at.timestamp() * 1000)
+    etag = _session_etag(session_id, version, since)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
     # 解析 segments
     segments = json.loads(db_session.segments_json)
 
-    return {
+    data = {
         "session_id": db_session.session_id,
         "title": db_session.title,
         "created_at": db_session.created_at.isoformat(),
-        "segments": segments,
+        "segments": segments if since is None else segments[since:],
         "full_transcript": db_session.full_transcript,
         "status": db_session.status,
+        "version": version,
+        "since": since,
+        "next_since": len(segments),
         "duration_seconds": db_session.duration_seconds,
         "speaker_count": db_session.speaker_count,
         "word_count": db_session.word_count,
         "ai_summary": db_session.ai_summary,
         "ai_action_items": db_session.ai_action_items,
+        "ai_topics": db_session.ai_topics,
+        "metadata": json.loads(db_session.metadata_json) if db_session.metadata_json else {},
+        "char_count": db_session.char_count,
+        "words_per_minute": db_session.words_per_minute,
+        "interruption_count": db_session.interruption_count,
+        "stats": json.loads(db_session.stats_json) if db_session.stats_json else None,
+        "archived": db_session.archived_at is not None,
     }
+    if since is not None:
+        data.pop("full_transcript")
+    return JSONResponse(content=data, headers={"ETag": etag})
 
 
-@app.post("/summarize")
-async def summarize_session(request: SummarizeRequest, db: AsyncSession = Depends(get_db)):
-    """总结会话内容（流式响应）"""
-    # 从活跃会话或数据库获取
-    transcript = None
-    if request.session_id in active_sessions:
-        session = active_sessions[request.session_id]
-        transcript = session.full_transcript
+@app.get("/sessions/{session_id}/latency")
+async def get_session_latency(session_id: str, db: AsyncSession = Depends(get_db)):
+    """会话的端到端延迟分解（活跃会话为实时数据，已结束会话取自保存的元数据）"""
+    if session_id in active_traces:
+        return {"session_id": session_id, "live": True, "latency": active_traces[session_id].summary()}
+
+    db_session = await crud.get_session(db, session_id)
+    if not db_session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    meta = json.loads(db_session.metadata_json) if db_session.metadata_json else {}
+    if "latency" not in meta:
+        raise HTTPException(status_code=404, detail="No latency trace recorded for this session")
+    return {"session_id": session_id, "live": False, "latency": meta["latency"]}
+
+
+async def _load_low_confidence_spans(
+    db: AsyncSession,
+    db_session: TranscriptionSessionDB,
+    max_confidence: Optional[float] = None
+) -> list:
+    """读取预计算的低置信度区间；会话尚未完成后台统计时现场计算"""
+    if db_session.analyzed_at is None:
+        spans = find_low_confidence_spans(json.loads(db_session.segments_json))
+        if max_confidence is not None:
+            spans = [span for span in spans if span["avg_confidence"] <= max_confidence]
+        return spans
+    rows = await crud.get_low_confidence_spans(db, db_session.session_id, max_confidence=max_confidence)
+    return [
+        {
+            "segment_index": row.segment_index,
+            "token_start": row.token_start,
+            "token_end": row.token_end,
+            "speaker": row.speaker,
+            "start_ms": row.start_ms,
+            "end_ms": row.end_ms,
+            "low_token_count": row.low_token_count,
+            "min_confidence": row.min_confidence,
+            "avg_confidence": row.avg_confidence,
+            "text": row.text,
+        }
+        for row in rows
+    ]
+
+
+@app.get("/sessions/{session_id}/low-confidence")
+async def get_low_confidence_spans(
+    session_id: str,
+    max_confidence: Optional[float] = Query(None, ge=0, le=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    会话中的低置信度区间，供审阅时直接跳转
+
+    区间由后台统计按 LOW_CONFIDENCE_THRESHOLD 预计算；max_confidence 可按区间平均置信度进一步收窄。
+    """
+    db_session = await crud.get_session(db, session_id)
+    if not db_session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    spans = await _load_low_confidence_spans(db, db_session, max_confidence)
+    return {
+        "session_id": session_id,
+        "analyzed": db_session.analyzed_at is not None,
+        "spans": spans,
+    }
+
+
+@app.get("/sessions/{session_id}/speakers")
+async def get_session_speakers(session_id: str, db: AsyncSession = Depends(get_db)):
+    """会话内各发言人的时长、词数与平均置信度（后台统计完成后可用）"""
+    rows = await crud.get_session_speakers(db, session_id)
+    if not rows and not await crud.get_session(db, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {
+        "session_id": session_id,
+        "speakers": [
+            {
+                "speaker": row.speaker,
+                "duration_ms": row.duration_ms,
+                "token_count": row.token_count,
+                "word_count": row.word_count,
+                "segment_count": row.segment_count,
+                "avg_confidence": row.avg_confidence,
+            }
+            for row in rows
+        ]
+    }
+
+
+@app.get("/analytics/languages")
+async def get_language_analytics(db: AsyncSession = Depends(get_db)):
+    """各语言出现的会话数、片段数与字符数（可用于 /sessions 的 language 过滤）"""
+    return {"languages": await crud.get_language_totals(db)}
+
+
+@app.get("/analytics/speakers")
+async def get_speaker_analytics(
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    speaker: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    跨会话的发言人聚合：总发言时长、token / 词数、平均置信度
+
+    start / end 按会话创建时间过滤（左闭右开），数据来自 session_speakers 预聚合表。
+    """
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be earlier than end")
+    speakers = await crud.get_speaker_totals(db, start=start, end=end, speaker=speaker, limit=limit)
+    return {
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "speakers": speakers,
+    }
+
+
+async def _get_transcript(db: AsyncSession, session_id: str) -> str:
+    """
+    从活跃会话或数据库获取供 LLM 使用的转录文本
+
+    按片段渲染为带发言人代号的紧凑文本（见 prompt_render）；没有片段时退回清理后的全文。
+    活跃会话尚未关闭的片段（最新的发言）接在末尾。
+    """
+    full_transcript = None
+    if session_id in active_sessions:
+        session = active_sessions[session_id]
+        segments = list(session.segments)
+        if session.open_segment is not None and session.open_segment.tokens:
+            segments.append(session.open_segment)
+        full_transcript = session.full_transcript
     else:
-        db_session = await crud.get_session(db, request.session_id)
-        if not db_session:
+        segments = await crud.get_session_segments(db, session_id)
+        if segments is None:
             raise HTTPException(status_code=404, detail="Session not found")
-        transcript = db_session.full_transcript
 
+    transcript, stats = render_transcript(segments)
+    if not transcript:
+        if full_transcript is None:
+            db_session = await crud.get_session(db, session_id)
+            full_transcript = db_session.full_transcript if db_session else None
+        transcript, stats = render_plain(full_transcript or "")
     if not transcript:
         raise HTTPException(status_code=400, detail="No transcript available")
 
+    metrics.LLM_PROMPT_TOKENS.observe(stats["tokens"])
+    if stats["omitted_turns"]:
+        metrics.LLM_PROMPT_OMITTED_TURNS.inc(stats["omitted_turns"])
+        logger.info(
+            f"Transcript of {session_id} trimmed to ~{stats['tokens']} tokens "
+            f"({stats['omitted_turns']} of {stats['turns']} turns omitted)"
+        )
+    return transcript
+
+
+async def _resolve_openai_config(openai_cfg: OpenAIConfig) -> OpenAIConfig:
+    """未传 api_key 时使用服务器保存的密钥与非密钥字段"""
+    if openai_cfg.api_key:
+        return openai_cfg
+    stored_key = await _get_setting("openai_api_key")
+    if not stored_key:
+        return openai_cfg
+    raw = await _get_setting("openai_config") or "{}"
+    try:
+        base = json.loads(raw)
+    except Exception:
+        base = {}
+    return OpenAIConfig(
+        api_url=base.get("api_url", openai_cfg.api_url),
+        api_key=stored_key,
+        model=base.get("model", openai_cfg.model),
+    )
+
+
+@app.post("/summarize")
+async def summarize_session(request: SummarizeRequest, db: AsyncSession = Depends(get_db)):
+    """总结会话内容（流式响应）"""
+    transcript = await _get_transcript(db, request.session_id)
+
     # 创建 OpenAI 服务（若未传 api_key 则使用服务器保存）
-    openai_cfg = request.openai_config
-    if not openai_cfg.api_key:
-        stored_key = await _get_setting("openai_api_key")
-        if stored_key:
-            # 尝试加载服务器保存的非密钥字段
-            raw = await _get_setting("openai_config") or "{}"
-            try:
-                base = json.loads(raw)
-            except Exception:
-                base = {}
-            openai_cfg = OpenAIConfig(
-                api_url=base.get("api_url", openai_cfg.api_url),
-                api_key=stored_key,
-                model=base.get("model", openai_cfg.model),
-            )
+    openai_cfg = await _resolve_openai_config(request.openai_config)
+    from openai_service import OpenAIService  # 按需导入（aiohttp），缩短启动时间
     openai_service = OpenAIService(openai_cfg)
+    session_id = request.session_id
+
+    # 由后台任务在生成中定期、结束时再保存一次（不使用请求作用域的 db：响应开始后它可能已关闭）
+    async def save_summary(summary: str, final: bool):
+        await write_queue.submit(lambda db: crud.set_ai_results(db, session_id, {"ai_summary": summary}))
+
+    # 生成在后台进行，不随连接断开而停止；相同会话、提示词与模型的并发请求共用一次上游流式生成
+    job = llm_flights.start(
+        (session_id, request.prompt, openai_cfg.api_url, openai_cfg.model),
+        "summarize",
+        lambda: openai_service.summarize(transcript, request.prompt),
+        persist=save_summary,
+    )
+    return StreamingResponse(
+        _stream_job(job), media_type="text/plain", headers={"X-Job-Id": job.job_id}
+    )
 
-    # 流式返回总结
-    async def generate():
-        summary = ""
-        async for chunk in openai_service.summarize(transcript, request.prompt):
-            summary += chunk
-            yield chunk
 
-        # 保存总结到数据库
-        try:
-            await crud.update_ai_summary(db, request.session_id, summary)
-        except Exception as e:
-            logger.error(f"Error saving summary: {str(e)}")
+async def _stream_job(job, offset: int = 0):
+    """转发任务输出；任务失败时最后产出以“错误”开头的文本（与前端既有约定一致，不计入任务文本）"""
+    async for text in llm_flights.stream(job, offset):
+        yield text
+    if job.status == "failed":
+        yield f"错误: {job.error}"
+
+
+def _get_summary_job(job_id: str):
+    job = llm_flights.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@app.get("/summarize/{job_id}")
+async def resume_summary(job_id: str, offset: int = Query(0, ge=0)):
+    """
+    重新订阅总结任务（流式），从第 offset 个字符（已收到的字符数）继续；任务结束后保留一段时间
+    """
+    job = _get_summary_job(job_id)
+    if offset > job.length:
+        raise HTTPException(status_code=400, detail=f"offset exceeds generated length {job.length}")
+    return StreamingResponse(
+        _stream_job(job, offset), media_type="text/plain",
+        headers={"X-Job-Id": job.job_id, "X-Job-Status": job.status},
+    )
+
+
+@app.get("/summarize/{job_id}/status")
+async def get_summary_job(job_id: str):
+    """总结任务状态：running / done / failed / cancelled，以及已生成的字符数"""
+    return _get_summary_job(job_id).info()
 
-    return StreamingResponse(generate(), media_type="text/plain")
+
+@app.delete("/summarize/{job_id}")
+async def cancel_summary(job_id: str):
+    """停止进行中的总结任务（已保存的部分保留）"""
+    job = _get_summary_job(job_id)
+    if not llm_flights.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return job.info()
+
+# 分析类型 -> 结果列
+_ANALYSIS_COLUMNS = {"summary": "ai_summary", "action_items": "ai_action_items", "topics": "ai_topics"}
+
+
+@app.post("/analyze")
+async def analyze_session(request: AnalyzeRequest, db: AsyncSession = Depends(get_db)):
+    """
+    并行生成总结、待办事项与主题（多路复用的 NDJSON 流）
+
+    各项分析作为独立的后台任务并发运行，共用同一份预处理后的转录文本与 LLM 连接池，
+    每项完成即写入对应列。输出行依次为：
+    {"type": "jobs", "jobs": {类型: job_id}}（断线后可用 GET /summarize/{job_id}?offset= 分别续传）、
+    {"kind": 类型, "delta": 文本块}（各项交错）、{"kind": 类型, "status": "done" / "failed" / "cancelled"}
+    （failed 时附 "error"）
+    """
+    kinds = list(dict.fromkeys(request.kinds))
+    unknown = [kind for kind in kinds if kind not in _ANALYSIS_COLUMNS]
+    if not kinds or unknown:
+        raise HTTPException(
+            status_code=400, detail=f"kinds must be a non-empty subset of {list(_ANALYSIS_COLUMNS)}"
+        )
+    transcript = await _get_transcript(db, request.session_id)
+    openai_cfg = await _resolve_openai_config(request.openai_config)
+    from openai_service import OpenAIService  # 按需导入（aiohttp），缩短启动时间
+    openai_service = OpenAIService(openai_cfg)
+    session_id = request.session_id
+
+    def persist_to(column: str):
+        async def persist(text: str, final: bool):
+            await write_queue.submit(lambda db: crud.set_ai_results(db, session_id, {column: text}))
+        return persist
+
+    jobs = {
+        kind: llm_flights.start(
+            (session_id, "analyze", kind, openai_cfg.api_url, openai_cfg.model),
+            f"analyze_{kind}",
+            lambda kind=kind: openai_service.analyze(transcript, kind),
+            persist=persist_to(_ANALYSIS_COLUMNS[kind]),
+        )
+        for kind in kinds
+    }
+
+    async def generate():
+        yield json.dumps({"type": "jobs", "jobs": {kind: job.job_id for kind, job in jobs.items()}}) + "\n"
+        async for kind, text in llm_flights.multiplex(jobs):
+            if text is None:
+                line = {"kind": kind, "status": jobs[kind].status}
+                if jobs[kind].error is not None:
+                    line["error"] = jobs[kind].error
+            else:
+                line = {"kind": kind, "delta": text}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @app.post("/question")
 async def answer_question(request: QuestionRequest, db: AsyncSession = Depends(get_db)):
     """回答关于会话内容的问题（流式响应）"""
-    # 从活跃会话或数据库获取
-    transcript = None
-    if request.session_id in active_sessions:
-        session = active_sessions[request.session_id]
-        transcript = session.full_transcript
-    else:
-        db_session = await crud.get_session(db, request.session_id)
-        if not db_session:
-            raise HTTPException(status_code=404, detail="Session not found")
-        transcript = db_session.full_transcript
-
-    if not transcript:
-        raise HTTPException(status_code=400, detail="No transcript available")
+    transcript = await _get_transcript(db, request.session_id)
 
     # 创建 OpenAI 服务（若未传 api_key 则使用服务器保存）
-    openai_cfg = request.openai_config
-    if not openai_cfg.api_key:
-        stored_key = await _get_setting("openai_api_key")
-        if stored_key:
-            raw = await _get_setting("openai_config") or "{}"
-            try:
-                base = json.loads(raw)
-            except Exception:
-                base = {}
-            openai_cfg = OpenAIConfig(
-                api_url=base.get("api_url", openai_cfg.api_url),
-                api_key=stored_key,
-                model=base.get("model", openai_cfg.model),
-            )
+    openai_cfg = await _resolve_openai_config(request.openai_config)
+    from openai_service import OpenAIService  # 按需导入（aiohttp），缩短启动时间
     openai_service = OpenAIService(openai_cfg)
 
-    # 流式返回回答
+    # 流式返回回答；出错时产出以“错误”开头的文本，与前端既有约定一致
     async def generate():
-        async for chunk in openai_service.answer_question(transcript, request.question):
-            yield chunk
+        try:
+            async for chunk in openai_service.answer_question(transcript, request.question):
+                yield chunk
+        except Exception as e:
+            yield f"错误: {str(e)}"
 
     return StreamingResponse(generate(), media_type="text/plain")
 
@@ -615,13 +1434,19 @@ async def delete_session(session_id: str, db: AsyncSession = Depends(get_db)):
     return {"message": "Session deleted"}
 
 
+def _format_ms(ms: float) -> str:
+    seconds = int(ms // 1000)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
 @app.get("/sessions/{session_id}/export")
 async def export_session(
     session_id: str,
     format: str = Query("txt", regex="^(txt|json|markdown)$"),
+    low_confidence: bool = Query(False),
     db: AsyncSession = Depends(get_db)
 ):
-    """导出会话内容"""
+    """导出会话内容（low_confidence=true 时附带低置信度区间列表）"""
     # 获取会话
     db_session = await crud.get_session(db, session_id)
     if not db_session:
@@ -629,6 +1454,7 @@ async def export_session(
 
     # 解析 segments
     segments = json.loads(db_session.segments_json)
+    spans = await _load_low_confidence_spans(db, db_session) if low_confidence else None
 
     if format == "txt":
         # 纯文本格式
@@ -642,6 +1468,13 @@ async def export_session(
             content += f"[{seg['speaker']}]\n"
             content += f"{seg['text']}\n\n"
 
+        if spans is not None:
+            content += "=" * 50 + "\n"
+            content += f"Low-confidence regions: {len(spans)}\n\n"
+            for span in spans:
+                content += f"{_format_ms(span['start_ms'])}-{_format_ms(span['end_ms'])} [{span['speaker']}] "
+                content += f"({span['avg_confidence']:.2f}) {span['text']}\n"
+
         return Response(
             content=content,
             media_type="text/plain",
@@ -661,7 +1494,10 @@ async def export_session(
             "full_transcript": db_session.full_transcript,
             "ai_summary": db_session.ai_summary,
             "ai_action_items": db_session.ai_action_items,
+            "ai_topics": db_session.ai_topics,
         }
+        if spans is not None:
+            data["low_confidence_spans"] = spans
 
         return Response(
             content=json.dumps(data, indent=2, ensure_ascii=False),
@@ -685,12 +1521,23 @@ async def export_session(
             content += "## Action Items\n\n"
             content += f"{db_session.ai_action_items}\n\n"
 
+        if db_session.ai_topics:
+            content += "## Topics\n\n"
+            content += f"{db_session.ai_topics}\n\n"
+
         content += "## Transcript\n\n"
 
         for seg in segments:
             content += f"### {seg['speaker']}\n\n"
             content += f"{seg['text']}\n\n"
 
+        if spans is not None:
+            content += "## Low-Confidence Regions\n\n"
+            for span in spans:
+                content += f"- **{_format_ms(span['start_ms'])}–{_format_ms(span['end_ms'])}** "
+                content += f"{span['speaker']} ({span['avg_confidence']:.2f}): {span['text']}\n"
+            content += "\n"
+
         return Response(
             content=content,
             media_type="text/markdown",
@@ -698,6 +1545,83 @@ async def export_session(
         )
 
 
+@app.get("/export/sessions")
+async def bulk_export_sessions(
+    format: str = Query("jsonl", regex="^(jsonl|zip)$"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    search: Optional[str] = Query(None),
+    ids: Optional[str] = Query(None, description="逗号分隔的 session_id"),
+    language: Optional[str] = Query(None, max_length=16),
+):
+    """
+    批量流式导出会话（JSONL 或 zip）
+
+    按创建时间范围（左闭右开）、搜索词、语言或 ID 列表选择会话；服务端游标逐批读取，
+    内存占用与导出规模无关。
+    """
+    import bulk  # 按需导入，缩短启动时间
+    id_list = [i.strip() for i in ids.split(",") if i.strip()] if ids else None
+    records = bulk.iter_records(
+        async_session_maker, start=start, end=end, search=search, ids=id_list, language=language
+    )
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    if format == "zip":
+        return StreamingResponse(
+            bulk.zip_stream(records),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename=sessions-{stamp}.zip"}
+        )
+    return StreamingResponse(
+        bulk.jsonl_stream(records),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=sessions-{stamp}.jsonl"}
+    )
+
+
+@app.post("/import/sessions")
+async def bulk_import_sessions(request: Request):
+    """
+    批量导入会话：请求体为 /export/sessions 产出的 JSONL 或 zip（按 Content-Type 区分）
+
+    已存在的 session_id 跳过，格式错误的记录计入 failed 并列出原因，其余记录照常导入；
+    每批提交后即排队进行后台统计与索引。zip 本身损坏时返回 400，并注明出错前已导入的会话数。
+    """
+    import bulk  # 按需导入，缩短启动时间
+    import tempfile
+    import zipfile
+    content_type = request.headers.get("content-type", "")
+    committed = []
+
+    def on_imported(session_ids):
+        committed.extend(session_ids)
+        for session_id in session_ids:
+            analytics_pipeline.submit(session_id)
+
+    try:
+        if "zip" in content_type:
+            # zip 需随机读取目录，先落到临时文件（小包留在内存）
+            with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as spool:
+                async for chunk in request.stream():
+                    spool.write(chunk)
+                spool.seek(0)
+                result = await bulk.import_records(bulk.iter_zip(spool), write_queue, on_imported=on_imported)
+        else:
+            result = await bulk.import_records(
+                bulk.iter_jsonl(request.stream()), write_queue, on_imported=on_imported
+            )
+    except zipfile.BadZipFile as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid import data: {str(e)} ({len(committed)} sessions imported before the error)",
+        )
+
+    logger.info(
+        f"Imported {result['imported']} sessions, skipped {result['skipped']}, failed {result['failed']}"
+    )
+    return result
+
+
 @app.put("/sessions/{session_id}/title")
 async def update_session_title(
     session_id: str,
@@ -0,0 +1,305 @@
+"""
+后台存储维护任务
+
+- SegmentCompactor：把压缩编码上线前写入的旧行（segments_encoding 为空）分批转换为
+  segment_codec 的压缩编码，降低数据库与备份体积；
+- MaintenanceScheduler：按保留策略在低峰期把旧会话移入冷存储文件（archive）、
+  删除超过删除期限的会话，并执行 SQLite 增量 VACUUM / ANALYZE 归还磁盘空间。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+import archive
+import crud
+import segment_codec
+from write_queue import WriteQueue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 创建超过该天数的会话移入冷存储（0 表示不归档）
+RETENTION_ARCHIVE_DAYS = float(os.getenv("RETENTION_ARCHIVE_DAYS", "0"))
+# 创建超过该天数的会话彻底删除（0 表示不删除）
+RETENTION_DELETE_DAYS = float(os.getenv("RETENTION_DELETE_DAYS", "0"))
+# 维护检查间隔（秒）与允许执行的本地时段，如 "2-5" 表示 02:00-04:59；为空表示任意时段
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+MAINTENANCE_HOURS = os.getenv("MAINTENANCE_HOURS", "2-5")
+# 单次维护最多归档的会话数、每次增量 VACUUM 归还的页数（0 表示全部空闲页）
+MAINTENANCE_MAX_ARCHIVE = int(os.getenv("MAINTENANCE_MAX_ARCHIVE", "500"))
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "2000"))
+
+
+def parse_hours(spec: str) -> Optional[Tuple[int, int]]:
+    """"2-5" -> (2, 5)；支持跨午夜，如 "22-4"；为空返回 None（不限时段）"""
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    start, _, end = spec.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+def in_window(hour: int, window: Optional[Tuple[int, int]]) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    if start <= end:
+        return start <= hour <= end
+    return hour >= start or hour <= end
+
+
+class SegmentCompactor:
+    """
+    后台把旧行（segments_encoding 为空）转换为压缩编码
+
+    每批读取 batch 行，在线程池中编码后经写队列回写；批与批之间让出 pause 秒，
+    避免与在线写入争用。
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        writer: WriteQueue,
+        batch: int = 50,
+        pause: float = 0.5,
+    ):
+        self.session_maker = session_maker
+        self.writer = writer
+        self.batch = max(1, batch)
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.converted = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running or segment_codec.SEGMENTS_ENCODING == "json":
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compactor")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "encoding": segment_codec.SEGMENTS_ENCODING,
+            "converted": self.converted,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                async with self.session_maker() as db:
+                    rows = await crud.get_uncompressed_segments(db, limit=self.batch)
+                if not rows:
+                    if self.converted:
+                        logger.info(
+                            f"Segment compaction done: {self.converted} sessions, "
+                            f"{self.bytes_before} -> {self.bytes_after} bytes"
+                        )
+                    return
+                for session_id, segments_json in rows:
+                    values = await loop.run_in_executor(
+                        self._executor, segment_codec.encode_columns, json.loads(segments_json)
+                    )
+                    await self.writer.submit(
+                        lambda db, sid=session_id, v=values: crud.set_segment_columns(db, sid, v)
+                    )
+                    self.converted += 1
+                    self.bytes_before += len(segments_json.encode("utf-8"))
+                    self.bytes_after += len(values["segments_blob"] or b"")
+                await asyncio.sleep(self.pause)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Segment compaction failed: {str(e)}")
+
+
+class MaintenanceScheduler:
+    """
+    低峰期存储维护
+
+    每隔 MAINTENANCE_INTERVAL 秒检查一次：处于 MAINTENANCE_HOURS 时段、且 is_idle()
+    为真（无进行中的转录）时执行一轮 run_once()。
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        writer: WriteQueue,
+        engine: AsyncEngine,
+        is_idle: Callable[[], bool] = lambda: True,
+        archive_days: float = RETENTION_ARCHIVE_DAYS,
+        delete_days: float = RETENTION_DELETE_DAYS,
+        interval: float = MAINTENANCE_INTERVAL,
+        hours: str = MAINTENANCE_HOURS,
+    ):
+        self.session_maker = session_maker
+        self.writer = writer
+        self.engine = engine
+        self.is_idle = is_idle
+        self.archive_days = archive_days
+        self.delete_days = delete_days
+        self.interval = interval
+        self.window = parse_hours(hours)
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.archived = 0
+        self.deleted = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "archive_days": self.archive_days,
+            "delete_days": self.delete_days,
+            "hours": self.window,
+            "archived": self.archived,
+            "deleted": self.deleted,
+            "last_run": self.last_run,
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not in_window(datetime.now().hour, self.window) or not self.is_idle():
+                continue
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Storage maintenance failed: {str(e)}")
+
+    async def run_once(self, full_vacuum: bool = False) -> Dict[str, Any]:
+        """
+        执行一轮维护：删除过期会话、归档旧会话、回收空间并更新统计信息
+
+        Args:
+            full_vacuum: 已有库尚未启用增量 auto_vacuum 时，是否做一次完整 VACUUM 切换模式。
+                完整 VACUUM 会重写整个库文件并阻塞所有写入，只在显式请求且 is_idle() 时执行。
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            report: Dict[str, Any] = {"started_at": datetime.utcnow().isoformat()}
+            now = datetime.now()
+            if self.delete_days > 0:
+                report["deleted"] = await self._delete_expired(now - timedelta(days=self.delete_days))
+            if self.archive_days > 0:
+                report["archived"] = await self._archive_old(now - timedelta(days=self.archive_days))
+            report.update(await self._vacuum(full_vacuum))
+            report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+            self.last_run = report
+            logger.info(f"Storage maintenance: {report}")
+            return report
+
+    async def _delete_expired(self, before: datetime) -> int:
+        total = 0
+        while True:
+            paths = await self.writer.submit(lambda db: crud.delete_sessions_before(db, before))
+            if not paths:
+                break
+            total += len(paths)
+            for path in paths:
+                if path:
+                    await asyncio.to_thread(archive.remove_archive, path)
+        self.deleted += total
+        return total
+
+    async def _archive_old(self, before: datetime) -> int:
+        total = 0
+        while total < MAINTENANCE_MAX_ARCHIVE:
+            async with self.session_maker() as db:
+                rows = await crud.get_archive_candidates(db, before)
+            if not rows:
+                break
+            for row in rows:
+                path = await asyncio.to_thread(
+                    archive.write_archive,
+                    row.session_id,
+                    row.created_at,
+                    json.loads(row.segments_json),
+                    row.full_transcript,
+                )
+                ok = await self.writer.submit(
+                    lambda db, r=row, p=path: crud.mark_archived(db, r.session_id, p, r.updated_at)
+                )
+                if ok:
+                    total += 1
+                else:
+                    # 读取后会话被修改，放弃本次归档
+                    await asyncio.to_thread(archive.remove_archive, path)
+            await asyncio.sleep(0)
+        self.archived += total
+        return total
+
+    async def _vacuum(self, full: bool = False) -> Dict[str, Any]:
+        """
+        SQLite：增量 VACUUM 归还空闲页并执行 PRAGMA optimize；
+        已有库（auto_vacuum 尚未生效）只在 full 为真且无进行中的转录时做一次完整 VACUUM
+        启用增量模式，否则跳过回收，结果中 vacuum 为 "needs_full"。
+        PostgreSQL：ANALYZE（空间回收交给 autovacuum）。
+        """
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if self.engine.dialect.name != "sqlite":
+                await conn.execute(text("ANALYZE"))
+                return {"analyzed": True}
+
+            freelist = (await conn.execute(text("PRAGMA freelist_count"))).scalar() or 0
+            mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+            if mode == 2:
+                pages = VACUUM_PAGES if VACUUM_PAGES > 0 else ""
+                await conn.execute(text(f"PRAGMA incremental_vacuum({pages})"))
+                vacuum = "incremental"
+            elif full and self.is_idle():
+                await conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+                await conn.execute(text("VACUUM"))
+                vacuum = "full"
+            else:
+                if freelist:
+                    logger.info(
+                        f"{freelist} free pages not reclaimed: incremental auto_vacuum is not enabled yet, "
+                        f"run POST /admin/maintenance/run?full_vacuum=true while idle"
+                    )
+                vacuum = "needs_full"
+            await conn.execute(text("PRAGMA optimize"))
+            remaining = (await conn.execute(text("PRAGMA freelist_count"))).scalar() or 0
+            return {"vacuum": vacuum, "freed_pages": max(0, freelist - remaining)}
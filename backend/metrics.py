@@ -0,0 +1,302 @@
+"""
+Prometheus 文本格式的进程内指标
+
+所有指标都在事件循环线程内更新：计数只是整数自增，直方图按桶下标自增，
+不加锁、不分配对象，常驻开启的开销可以忽略。带标签的指标通过 labels() 取得子项，
+热路径上应预先取得子项并复用，避免每次查找标签。
+"""
+import functools
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 延迟类直方图的默认桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# 标签值中需转义的字符（Prometheus 文本格式：反斜杠、双引号、换行）
+_LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{str(v).translate(_LABEL_ESCAPES)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        return self._children[()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._children.items():
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """单调递增计数"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """固定桶直方图"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        按标签汇总延迟直方图：计数、均值与按桶估计的 p50 / p95（取所在桶的上界，秒换算为毫秒）
+
+        键为以 "," 连接的标签值，无标签时为 ""。
+        """
+        result = {}
+        for key, child in self._children.items():
+            if not child.count:
+                continue
+
+            def quantile(q: float):
+                rank, seen = q * child.count, 0
+                for bound, n in zip(self.buckets, child.counts):
+                    seen += n
+                    if seen >= rank:
+                        return round(bound * 1000, 2)
+                return None  # 落在 +Inf 桶
+
+            result[",".join(key)] = {
+                "count": child.count,
+                "mean_ms": round(child.sum / child.count * 1000, 2),
+                "p50_ms": quantile(0.5),
+                "p95_ms": quantile(0.95),
+            }
+        return result
+
+    def _render_child(self, key, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# ============== 各路径共用的指标 ==============
+
+# 进程
+STARTUP_SECONDS = gauge("process_startup_seconds", "Time from importing main to the end of startup")
+
+# 转发链路（浏览器 <-> 本服务 <-> Soniox）
+ACTIVE_SESSIONS = gauge("soniox_active_sessions", "Active /ws/transcribe sessions")
+AUDIO_BYTES = counter("soniox_audio_bytes_total", "Audio bytes relayed to Soniox", ["direction"])
+SONIOX_FRAMES = counter("soniox_frames_total", "Frames received from Soniox", ["kind"])
+SONIOX_PARSE_SECONDS = histogram(
+    "soniox_frame_parse_seconds", "Time to parse a Soniox frame",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+RELAY_SECONDS = histogram(
+    "soniox_relay_seconds", "Time from Soniox frame arrival to browser send completion"
+)
+# source：pool（预热池）/ holdout（A/B 对照组）/ empty（池已取空）/ stale（池中连接失效）/ disabled
+SONIOX_CONNECT_SECONDS = histogram(
+    "soniox_connect_seconds", "Time from client config to Soniox config sent", ["source"]
+)
+SONIOX_FIRST_TOKEN_SECONDS = histogram(
+    "soniox_first_token_seconds", "Time from client config to first Soniox token frame", ["source"]
+)
+
+# 准入控制
+ADMISSION_QUEUE = gauge("admission_queue_length", "Sessions waiting for admission")
+ADMISSION_REJECTED = counter("admission_rejected_total", "Rejected sessions", ["reason"])
+LOOP_LAG_SECONDS = gauge("event_loop_lag_seconds", "Smoothed event loop scheduling lag")
+
+# 存储
+DB_SECONDS = histogram("db_operation_seconds", "Latency of crud operations", ["operation"])
+DB_ERRORS = counter("db_operation_errors_total", "Failed crud operations", ["operation"])
+
+# LLM
+LLM_FIRST_CHUNK_SECONDS = histogram(
+    "llm_first_chunk_seconds", "Time from request to first streamed chunk", ["operation"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0),
+)
+LLM_CHUNKS_PER_SECOND = histogram(
+    "llm_chunks_per_second", "Streamed chunks (approx. tokens) per second after the first chunk",
+    ["operation"], buckets=(1, 5, 10, 20, 40, 80, 160, 320),
+)
+LLM_REQUESTS = counter("llm_requests_total", "LLM requests by outcome", ["operation", "outcome"])
+# outcome：won（首块最先到达）/ lost（对冲落败被取消）/ failed / failed_mid_stream
+LLM_ENDPOINT_ATTEMPTS = counter("llm_endpoint_attempts_total", "LLM attempts per endpoint", ["endpoint", "outcome"])
+LLM_HEDGES = counter("llm_hedged_requests_total", "Hedge requests sent after the first-chunk threshold", ["operation"])
+LLM_FAILOVERS = counter("llm_failovers_total", "Switches to the next endpoint after a failure", ["operation"])
+LLM_BREAKER_OPEN = gauge("llm_circuit_open", "1 while the endpoint circuit breaker is open", ["endpoint"])
+LLM_PROMPT_TOKENS = histogram(
+    "llm_prompt_transcript_tokens", "Estimated tokens of the rendered transcript embedded in prompts",
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+LLM_PROMPT_OMITTED_TURNS = counter(
+    "llm_prompt_omitted_turns_total", "Speaker turns dropped to fit PROMPT_TOKEN_BUDGET"
+)
+LLM_COALESCED = counter(
+    "llm_coalesced_total", "LLM requests served by joining an identical in-flight stream", ["operation"]
+)
+
+
+def timed_db(func):
+    """记录 crud 协程函数耗时与失败次数（按函数名区分）"""
+    observe = DB_SECONDS.labels(operation=func.__name__).observe
+    errors = DB_ERRORS.labels(operation=func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            observe(time.perf_counter() - start)
+
+    return wrapper
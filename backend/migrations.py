@@ -0,0 +1,244 @@
+"""
+数据库结构迁移
+
+按版本号顺序记录结构变更，已应用的版本写入 schema_migrations 表。
+新增列 / 索引时在 MIGRATIONS 末尾追加一项，不要修改已发布的迁移。
+
+启动时先只读查询已应用的最高版本，与 SCHEMA_VERSION 一致即返回，
+不再检查各表是否存在（create checkfirst / 反射），多 worker 同时启动时也不争用写锁。
+需要迁移时，PostgreSQL 上先取事务级咨询锁，多个 worker 依次执行（后到者重新读取已应用的版本）；
+记录版本时忽略已存在的版本号，不因主键冲突使启动失败。
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, String, Table, func, insert, inspect, literal, select, text,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateTable
+from database import (
+    Base,
+    LowConfidenceSpanDB,
+    SessionLanguageDB,
+    SessionSpeakerDB,
+    SessionTermDB,
+    TranscriptionSessionDB,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_meta = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# pg_advisory_xact_lock 的键（任意固定值，仅用于迁移）
+_MIGRATION_LOCK_KEY = 72150001
+
+
+def _add_column(conn: Connection, model, name: str):
+    """
+    为已有表补加模型中新增的列（新库由 baseline 建表时已包含，跳过）
+
+    模型带常量默认值（如计数列的 0）时随列一并声明 DEFAULT，已有行取该值而不是 NULL。
+    """
+    table = model.__table__
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    if name in existing:
+        return
+    column = table.c[name]
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}"
+    if column.default is not None and column.default.is_scalar:
+        value = literal(column.default.arg, column.type).compile(
+            dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {value}"
+    conn.execute(text(ddl))
+
+
+def _create_index(conn: Connection, name: str, column):
+    """
+    补建索引（已存在则跳过）
+
+    Index(name, column) 会挂到共享的表定义上；留在那里时，同一进程中对另一个库执行
+    create_all（测试、基准的多个 --url）会与模型自带的同名索引重复创建。
+    """
+    index = Index(name, column)
+    try:
+        index.create(conn, checkfirst=True)
+    finally:
+        column.table.indexes.discard(index)
+
+
+def _baseline(conn: Connection):
+    """初始结构：新库直接建表；已有库中的表保持不变"""
+    Base.metadata.create_all(conn)
+
+
+def _created_at_index(conn: Connection):
+    """列表页按 created_at 倒序分页，已有库补建索引"""
+    _create_index(conn, "ix_transcription_sessions_created_at", TranscriptionSessionDB.__table__.c.created_at)
+
+
+def _postgres_search(conn: Connection):
+    """PostgreSQL：为标题 / 全文建立三元组索引以加速子串搜索"""
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transcription_sessions_title_trgm "
+        "ON transcription_sessions USING gin (title gin_trgm_ops)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transcription_sessions_transcript_trgm "
+        "ON transcription_sessions USING gin (full_transcript gin_trgm_ops)"
+    ))
+
+
+def _session_metadata(conn: Connection):
+    _add_column(conn, TranscriptionSessionDB, "metadata_json")
+
+
+def _session_stats(conn: Connection):
+    """后台统计列及其索引；已有会话的 analyzed_at 为空，启动后由统计任务补算"""
+    for name in ("char_count", "words_per_minute", "interruption_count", "stats_json", "analyzed_at"):
+        _add_column(conn, TranscriptionSessionDB, name)
+    table = TranscriptionSessionDB.__table__
+    for name in ("duration_seconds", "word_count", "words_per_minute", "interruption_count", "analyzed_at"):
+        _create_index(conn, f"ix_{table.name}_{name}", table.c[name])
+
+
+def _session_speakers(conn: Connection):
+    """发言人预聚合表；已有会话由第 8 步统一重新排队统计后填充"""
+    SessionSpeakerDB.__table__.create(conn, checkfirst=True)
+
+
+def _low_confidence_spans(conn: Connection):
+    """低置信度区间索引表及会话上的区间计数列；已有会话由第 8 步统一重新排队统计"""
+    LowConfidenceSpanDB.__table__.create(conn, checkfirst=True)
+    _add_column(conn, TranscriptionSessionDB, "low_confidence_count")
+    table = TranscriptionSessionDB.__table__
+    _create_index(conn, f"ix_{table.name}_low_confidence_count", table.c.low_confidence_count)
+
+
+def _language_index(conn: Connection):
+    """
+    语言与检索词项索引表
+
+    已有会话重新排队统计，一次补齐第 6-8 步新增的发言人、低置信度区间与语言 / 词项索引
+    （统计任务对每个会话写全部派生表，只需在最后一步重置一次）。
+    """
+    SessionLanguageDB.__table__.create(conn, checkfirst=True)
+    SessionTermDB.__table__.create(conn, checkfirst=True)
+    conn.execute(text("UPDATE transcription_sessions SET analyzed_at = NULL"))
+
+
+def _segments_compression(conn: Connection):
+    """压缩编码列；已有行保持 segments_json，由 maintenance.SegmentCompactor 在后台转换"""
+    for name in ("segments_encoding", "segments_blob"):
+        _add_column(conn, TranscriptionSessionDB, name)
+
+
+def _session_archive(conn: Connection):
+    """冷存储归档列"""
+    for name in ("archived_at", "archive_path"):
+        _add_column(conn, TranscriptionSessionDB, name)
+    table = TranscriptionSessionDB.__table__
+    _create_index(conn, f"ix_{table.name}_archived_at", table.c.archived_at)
+
+
+def _ai_topics(conn: Connection):
+    """并行分析的主题 / 关键词结果列"""
+    _add_column(conn, TranscriptionSessionDB, "ai_topics")
+
+
+def _segments_text(conn: Connection):
+    """
+    PostgreSQL：segments_json 改回 TEXT
+
+    早期版本的第 3 步把该列转为 JSONB，但压缩编码（第 9 步）之后新行只在该列写占位的 "[]"，
+    segments 存于 segments_blob，JSONB 列上没有可查询的数据，徒增写入时的解析开销。
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    data_type = conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'transcription_sessions' AND column_name = 'segments_json'"
+    )).scalar()
+    if data_type == "jsonb":
+        conn.execute(text(
+            "ALTER TABLE transcription_sessions "
+            "ALTER COLUMN segments_json TYPE TEXT USING segments_json::text"
+        ))
+
+
+# (版本号, 名称, 迁移函数)
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline", _baseline),
+    (2, "created_at_index", _created_at_index),
+    (3, "postgres_search", _postgres_search),
+    (4, "session_metadata", _session_metadata),
+    (5, "session_stats", _session_stats),
+    (6, "session_speakers", _session_speakers),
+    (7, "low_confidence_spans", _low_confidence_spans),
+    (8, "language_index", _language_index),
+    (9, "segments_compression", _segments_compression),
+    (10, "session_archive", _session_archive),
+    (11, "ai_topics", _ai_topics),
+    (12, "segments_text", _segments_text),
+]
+
+
+# 当前代码对应的结构版本
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    """已应用的最高迁移版本；尚无 schema_migrations 表时为 0"""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return 0
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def run_migrations(conn: Connection) -> bool:
+    """
+    执行所有未应用的迁移（同步函数，通过 AsyncConnection.run_sync 调用）
+
+    Returns:
+        是否走了快速路径（结构已是最新，未做任何检查与变更）
+    """
+    if current_version(conn) == SCHEMA_VERSION:
+        return True
+
+    if conn.dialect.name == "postgresql":
+        # 提交或回滚时释放；等到锁时前一个 worker 的迁移已提交
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+    conn.execute(CreateTable(schema_migrations, if_not_exists=True))
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Applying migration {version}: {name}")
+        migrate(conn)
+        _record_version(conn, version, name)
+    return False
+
+
+def _record_version(conn: Connection, version: int, name: str):
+    """记录已应用的版本；另一个 worker 已记录时忽略（迁移本身均可重复执行）"""
+    values = dict(version=version, name=name, applied_at=datetime.utcnow())
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(conn.dialect.name)
+    if dialect_insert is None:
+        conn.execute(insert(schema_migrations).values(**values))
+        return
+    statement = dialect_insert(schema_migrations).values(**values)
+    conn.execute(statement.on_conflict_do_nothing(index_elements=["version"]))
@@ -21,6 +21,8 @@ class TranscriptionSegment(BaseModel):
     start_time: float
     end_time: float
     tokens: List[TranscriptionToken] = Field(default_factory=list)
+    # 片段主语言（开启语言识别时在片段关闭时按 token 的 language 计算）
+    language: Optional[str] = None
 
 
 class TranscriptionSession(BaseModel):
@@ -31,6 +33,12 @@ class TranscriptionSession(BaseModel):
     segments: List[TranscriptionSegment] = Field(default_factory=list)
     full_transcript: str = ""
     status: str = "active"  # active, stopped, completed
+    # 内容版本号：每次有最终 token 落入会话时递增，用于增量轮询与 ETag
+    version: int = 0
+    # 附加元数据（落库到 metadata_json），如延迟追踪摘要
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    # 尚未关闭的片段（仅活跃会话有；不参与序列化与落库，关闭后并入 segments）
+    open_segment: Optional[TranscriptionSegment] = Field(default=None, exclude=True)
 
 
 class SonioxConfig(BaseModel):
@@ -61,8 +69,22 @@ class SummarizeRequest(BaseModel):
     openai_config: OpenAIConfig
 
 
+class AnalyzeRequest(BaseModel):
+    """并行分析请求：kinds 为 summary / action_items / topics 的子集"""
+    session_id: str
+    kinds: List[str] = Field(default_factory=lambda: ["summary", "action_items", "topics"])
+    openai_config: OpenAIConfig
+
+
 class QuestionRequest(BaseModel):
     """提问请求"""
     session_id: str
     question: str
     openai_config: OpenAIConfig
+
+
+class ProfilingConfig(BaseModel):
+    """剖析开关与采样率；未给出的字段保持不变"""
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None
+    reset: bool = False
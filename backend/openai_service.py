@@ -1,18 +1,60 @@
+import json
 import logging
-from typing import AsyncGenerator
+import os
+import time
+from typing import AsyncGenerator, Dict, List, Optional
 import aiohttp
 from models import OpenAIConfig
+from llm_router import Endpoint, EndpointError, llm_router
+from metrics import LLM_CHUNKS_PER_SECOND, LLM_FIRST_CHUNK_SECONDS, LLM_REQUESTS
+from profiling import profiler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 所有请求共用的连接池：总连接数上限与空闲连接保留秒数
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_POOL_KEEPALIVE_SECONDS = float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", "30"))
+
+# 并行分析的各项提示词：键为分析类型
+ANALYSIS_PROMPTS = {
+    "summary": "请总结以下会议内容的要点，以清晰的列表形式呈现：",
+    "action_items": "请从以下会议内容中提取所有的待办事项、行动项和决策，以列表形式呈现，注明负责人（如有）：",
+    "topics": "请列出以下会议内容讨论的主要主题，每个主题附 3-5 个关键词，以列表形式呈现：",
+}
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def _get_http_session() -> aiohttp.ClientSession:
+    """
+    共用的 aiohttp 会话（首次使用时在事件循环中创建）
+
+    每次请求新建 ClientSession 会重新建立 TCP / TLS 连接；共用会话后，并行的分析请求与
+    相继的总结、提问复用到同一 API 的连接。
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=LLM_POOL_SIZE, keepalive_timeout=LLM_POOL_KEEPALIVE_SECONDS
+            )
+        )
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
 
 class OpenAIService:
     """OpenAI 兼容 API 服务"""
 
     def __init__(self, config: OpenAIConfig):
         self.config = config
-        self.api_url = config.api_url.rstrip("/") + "/chat/completions"
 
     async def summarize(self, transcript: str, prompt: str) -> AsyncGenerator[str, None]:
         """
@@ -25,63 +67,39 @@ class OpenAIService:
         Yields:
             总结内容的流式文本块
         """
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": self.config.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的会议助手，擅长总结和分析会议内容。"
-                    },
-                    {
-                        "role": "user",
-                        "content": f"{prompt}\n\n转录内容：\n{transcript}"
-                    }
-                ],
-                "stream": True,
-                "temperature": 0.7
+        messages = [
+            {
+                "role": "system",
+                "content": "你是一个专业的会议助手，擅长总结和分析会议内容。"
+            },
+            {
+                "role": "user",
+                "content": f"{prompt}\n\n转录内容：\n{transcript}"
             }
+        ]
+        async for chunk in self._stream_chat("summarize", messages):
+            yield chunk
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {error_text}")
-                        yield f"错误: {error_text}"
-                        return
-
-                    # 处理流式响应
-                    async for line in response.content:
-                        line = line.decode("utf-8").strip()
-                        if line.startswith("data: "):
-                            data_str = line[6:]  # 移除 "data: " 前缀
-
-                            if data_str == "[DONE]":
-                                break
-
-                            try:
-                                import json
-                                data = json.loads(data_str)
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    delta = data["choices"][0].get("delta", {})
-                                    content = delta.get("content", "")
-                                    if content:
-                                        yield content
-                            except json.JSONDecodeError:
-                                continue
+    async def analyze(self, transcript: str, kind: str) -> AsyncGenerator[str, None]:
+        """
+        按 ANALYSIS_PROMPTS 中的一项分析转录内容（流式），指标按分析类型区分
 
-        except Exception as e:
-            logger.error(f"Error in OpenAI service: {str(e)}")
-            yield f"错误: {str(e)}"
+        Args:
+            transcript: 转录文本（多项分析共用同一份预处理结果）
+            kind: summary / action_items / topics
+        """
+        messages = [
+            {
+                "role": "system",
+                "content": "你是一个专业的会议助手，擅长总结和分析会议内容。"
+            },
+            {
+                "role": "user",
+                "content": f"{ANALYSIS_PROMPTS[kind]}\n\n转录内容：\n{transcript}"
+            }
+        ]
+        async for chunk in self._stream_chat(f"analyze_{kind}", messages):
+            yield chunk
 
     async def answer_question(
         self, transcript: str, question: str
@@ -96,60 +114,124 @@ class OpenAIService:
         Yields:
             回答内容的流式文本块
         """
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
+        messages = [
+            {
+                "role": "system",
+                "content": "你是一个专业的会议助手。请根据提供的会议转录内容回答用户的问题。"
+            },
+            {
+                "role": "user",
+                "content": f"会议转录内容：\n{transcript}\n\n问题：{question}"
             }
+        ]
+        async for chunk in self._stream_chat("question", messages):
+            yield chunk
 
-            payload = {
-                "model": self.config.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的会议助手。请根据提供的会议转录内容回答用户的问题。"
-                    },
-                    {
-                        "role": "user",
-                        "content": f"会议转录内容：\n{transcript}\n\n问题：{question}"
-                    }
-                ],
-                "stream": True,
-                "temperature": 0.7
-            }
+    async def _stream_chat(
+        self, operation: str, messages: List[Dict[str, str]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        发送流式 chat/completions 请求并逐块产出 delta 内容
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {error_text}")
-                        yield f"错误: {error_text}"
-                        return
-
-                    # 处理流式响应
-                    async for line in response.content:
-                        line = line.decode("utf-8").strip()
-                        if line.startswith("data: "):
-                            data_str = line[6:]
-
-                            if data_str == "[DONE]":
-                                break
-
-                            try:
-                                import json
-                                data = json.loads(data_str)
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    delta = data["choices"][0].get("delta", {})
-                                    content = delta.get("content", "")
-                                    if content:
-                                        yield content
-                            except json.JSONDecodeError:
-                                continue
+        请求经 llm_router 在端点间路由（对冲、故障切换与熔断），同时记录首块延迟与
+        每秒块数（流式 delta 近似等于 token）指标。
 
+        Raises:
+            EndpointError: 所有端点都返回错误；其他异常：连接失败等。出错不会作为文本产出，
+            以免被当作结果保存；如何呈现给前端由调用方决定
+        """
+        first_chunk_hist = LLM_FIRST_CHUNK_SECONDS.labels(operation=operation)
+        chunks_per_sec_hist = LLM_CHUNKS_PER_SECOND.labels(operation=operation)
+        start = time.perf_counter()
+        first_at = None
+        chunks = 0
+        try:
+            endpoints = llm_router.candidates(self.config.api_url, self.config.model)
+            async for content in llm_router.stream(
+                operation, endpoints, lambda endpoint: self._stream_endpoint(endpoint, messages)
+            ):
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    first_chunk_hist.observe(first_at - start)
+                chunks += 1
+                yield content
+
+            LLM_REQUESTS.labels(operation=operation, outcome="ok").inc()
+            profiler.record(f"OpenAIService.{operation}", time.perf_counter() - start)
+            if first_at is not None and chunks > 1:
+                elapsed = time.perf_counter() - first_at
+                if elapsed > 0:
+                    chunks_per_sec_hist.observe((chunks - 1) / elapsed)
+
+        except EndpointError:
+            LLM_REQUESTS.labels(operation=operation, outcome="http_error").inc()
+            raise
         except Exception as e:
             logger.error(f"Error in OpenAI service: {str(e)}")
-            yield f"错误: {str(e)}"
+            LLM_REQUESTS.labels(operation=operation, outcome="error").inc()
+            raise
+
+    async def _stream_endpoint(
+        self, endpoint: Endpoint, messages: List[Dict[str, str]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        向单个端点发送流式请求（供 llm_router 调用）
+
+        Raises:
+            EndpointError: 非 200 响应
+        """
+        # 只有请求自带配置生成的端点才使用请求的密钥；端点池中的端点只用自己配置的密钥
+        api_key = self.config.api_key if endpoint.adhoc else endpoint.api_key
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+
+        payload = {
+            "model": endpoint.model,
+            "messages": messages,
+            "stream": True,
+            "temperature": 0.7
+        }
+
+        async with _get_http_session().post(
+            endpoint.api_url.rstrip("/") + "/chat/completions",
+            headers=headers,
+            json=payload
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"OpenAI API error ({endpoint.name}): {error_text}")
+                raise EndpointError(error_text)
+
+            # 处理流式响应
+            async for line in response.content:
+                with profiler.span("OpenAIService.parse_chunk"):
+                    content = self._parse_sse_line(line)
+                if content is None:
+                    break
+                if content:
+                    yield content
+
+    @staticmethod
+    def _parse_sse_line(raw: bytes) -> Optional[str]:
+        """
+        解析一行 SSE 数据
+
+        Returns:
+            delta 文本；无内容的行返回空字符串；流结束（[DONE]）返回 None
+        """
+        line = raw.decode("utf-8").strip()
+        if not line.startswith("data: "):
+            return ""
+        data_str = line[6:]  # 移除 "data: " 前缀
+        if data_str == "[DONE]":
+            return None
+        try:
+            data = json.loads(data_str)
+        except json.JSONDecodeError:
+            return ""
+        if "choices" in data and len(data["choices"]) > 0:
+            delta = data["choices"][0].get("delta", {})
+            return delta.get("content", "") or ""
+        return ""
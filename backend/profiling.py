@@ -0,0 +1,181 @@
+"""
+可在线开启的采样式热路径剖析
+
+通过环境变量 PROFILING_ENABLED=1（采样率 PROFILING_SAMPLE_RATE，默认 0.01）或
+管理接口 POST /admin/profiling 开启。开启后：
+- 每个根 span 按采样率决定是否记录，被采中的根 span 内嵌套的 span 全部记录；
+- 按调用栈汇总自身耗时，可导出为 flamegraph.pl / speedscope 可读的折叠栈格式；
+- 同时汇总每个 span 名称的调用次数、总耗时、自身耗时与最大耗时。
+
+耗时为墙钟时间，包含协程内 await 等待的时间，用于定位线上事故中慢在哪一段。
+关闭时每个埋点只有一次布尔判断。
+"""
+import functools
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# 超过该数量的新调用栈不再单独记录，避免内存无限增长
+_MAX_STACKS = 10000
+
+
+class _Frame:
+    __slots__ = ("path", "child_time")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.child_time = 0.0
+
+
+_current: ContextVar[Optional[_Frame]] = ContextVar("profiling_frame", default=None)
+
+
+class _Stat:
+    __slots__ = ("count", "total", "self_total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.self_total = 0.0
+        self.max = 0.0
+
+
+class _NullSpan:
+    """未采样时使用的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "frame", "parent", "token", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, parent: Optional[_Frame]):
+        self.profiler = profiler
+        self.name = name
+        self.parent = parent
+        self.frame = _Frame(f"{parent.path};{name}" if parent else name)
+
+    def __enter__(self):
+        self.token = _current.set(self.frame)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _current.reset(self.token)
+        if self.parent is not None:
+            self.parent.child_time += elapsed
+        self.profiler._record(self.name, self.frame.path, elapsed, elapsed - self.frame.child_time)
+        return False
+
+
+class Profiler:
+    """进程内采样剖析器"""
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.01):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.started_at = time.time()
+        self._stacks: Dict[str, float] = {}
+        self._stats: Dict[str, _Stat] = {}
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, sample_rate))
+
+    def reset(self):
+        self._stacks = {}
+        self._stats = {}
+        self.started_at = time.time()
+
+    def span(self, name: str):
+        """返回一个上下文管理器；处于已采样的 span 内时总是记录，否则按采样率决定"""
+        if not self.enabled:
+            return _NULL_SPAN
+        parent = _current.get()
+        if parent is None and random.random() >= self.sample_rate:
+            return _NULL_SPAN
+        return _Span(self, name, parent)
+
+    def record(self, name: str, elapsed: float):
+        """记录一段已测得的耗时（用于无法用 with 包裹的场景，如跨 yield 的流式循环）"""
+        if not self.enabled:
+            return
+        parent = _current.get()
+        if parent is None and random.random() >= self.sample_rate:
+            return
+        path = f"{parent.path};{name}" if parent else name
+        self._record(name, path, elapsed, elapsed)
+
+    def _record(self, name: str, path: str, elapsed: float, self_time: float):
+        stat = self._stats.get(name)
+        if stat is None:
+            stat = self._stats[name] = _Stat()
+        stat.count += 1
+        stat.total += elapsed
+        stat.self_total += self_time
+        if elapsed > stat.max:
+            stat.max = elapsed
+
+        if path in self._stacks or len(self._stacks) < _MAX_STACKS:
+            self._stacks[path] = self._stacks.get(path, 0.0) + self_time
+
+    def folded(self) -> str:
+        """折叠栈格式：每行 "frame;frame;frame 自身耗时微秒" """
+        lines = [f"{path} {int(seconds * 1_000_000)}" for path, seconds in sorted(self._stacks.items())]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def stats(self) -> Dict[str, Any]:
+        functions = {
+            name: {
+                "count": s.count,
+                "total_ms": round(s.total * 1000, 3),
+                "self_ms": round(s.self_total * 1000, 3),
+                "mean_ms": round(s.total * 1000 / s.count, 3) if s.count else 0.0,
+                "max_ms": round(s.max * 1000, 3),
+            }
+            for name, s in sorted(self._stats.items(), key=lambda kv: kv[1].total, reverse=True)
+        }
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "since": self.started_at,
+            "functions": functions,
+        }
+
+
+profiler = Profiler(
+    enabled=os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes"),
+    sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0.01")),
+)
+
+
+def profiled(name: Optional[str] = None):
+    """协程函数装饰器：以 span 包裹整个调用"""
+
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return await func(*args, **kwargs)
+            with profiler.span(label):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
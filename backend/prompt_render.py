@@ -0,0 +1,147 @@
+"""
+转录 -> LLM 提示词的紧凑渲染
+
+full_transcript 是所有最终 token 的直接拼接：夹带 <end> / <fin> 控制标记，没有发言人信息。
+按片段逐行写出“发言人: 文本”能让模型区分发言人，但 Soniox 每个句末标记都会落段，
+同一发言人连续的多句会重复出现标签，篇幅明显变大。这里：
+- 去掉控制标记并规整空白；
+- 合并同一发言人的连续片段为一轮发言；
+- 发言人按首次出现顺序改用单字母代号（A、B……），开头附一行代号对照；只有一位发言人时不加标签；
+- 按估算的 token 数（CJK 每字约 1 个，其他文字每 4 个字符约 1 个，标点各 1 个）限制在
+  PROMPT_TOKEN_BUDGET 内，超出时保留开头与结尾的发言，省略中间部分并注明省略了多少。
+"""
+import math
+import os
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+from text_index import CJK_CHARS, CONTROL_TOKENS
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "24000"))
+
+_CONTROL_RE = re.compile("|".join(re.escape(t) for t in CONTROL_TOKENS))
+_SPACE_RE = re.compile(r"\s+")
+_CJK_RE = re.compile(rf"[{CJK_CHARS}]")
+_WORD_RE = re.compile(rf"[^\s{CJK_CHARS}\W]+", re.UNICODE)
+_PUNCT_RE = re.compile(rf"[^\w\s{CJK_CHARS}]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数（不依赖具体分词器，对常见模型偏保守）"""
+    cjk = len(_CJK_RE.findall(text))
+    words = sum(math.ceil(len(w) / 4) for w in _WORD_RE.findall(text))
+    punct = len(_PUNCT_RE.findall(text))
+    return cjk + words + punct
+
+
+def clean_text(text: str) -> str:
+    """去掉控制标记并把连续空白规整为一个空格"""
+    return _SPACE_RE.sub(" ", _CONTROL_RE.sub("", text or "")).strip()
+
+
+def _alias(index: int) -> str:
+    """0 -> A，25 -> Z，26 -> AA"""
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(ord("A") + rem) + name
+    return name
+
+
+def _field(segment: Any, key: str) -> Any:
+    if isinstance(segment, dict):
+        return segment.get(key)
+    return getattr(segment, key, None)
+
+
+def merge_turns(segments: Iterable[Any]) -> List[Tuple[str, str]]:
+    """合并同一发言人的连续片段：返回 [(发言人, 清理后的文本)]，空片段跳过"""
+    turns: List[Tuple[str, List[str]]] = []
+    for segment in segments:
+        text = _CONTROL_RE.sub("", _field(segment, "text") or "")
+        if not text.strip():
+            continue
+        speaker = str(_field(segment, "speaker") or "")
+        if turns and turns[-1][0] == speaker:
+            turns[-1][1].append(text)
+        else:
+            turns.append((speaker, [text]))
+    return [(speaker, _SPACE_RE.sub(" ", "".join(parts)).strip()) for speaker, parts in turns]
+
+
+def _fit(lines: List[str], budget: int) -> Tuple[List[str], int]:
+    """
+    按预算保留开头与结尾的行，省略中间部分
+
+    Returns:
+        (保留的行（含省略说明）, 省略的行数)
+    """
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    if sum(costs) <= budget:
+        return lines, 0
+
+    marker_cost = 24
+    head_budget = (budget - marker_cost) // 2
+    tail_budget = budget - marker_cost - head_budget
+    head, used = 0, 0
+    while head < len(lines) and used + costs[head] <= head_budget:
+        used += costs[head]
+        head += 1
+    tail, used = len(lines), 0
+    while tail > head and used + costs[tail - 1] <= tail_budget:
+        used += costs[tail - 1]
+        tail -= 1
+
+    omitted_tokens = sum(costs[head:tail])
+    if head == 0 and tail == len(lines):
+        # 开头一轮发言就超出预算：按比例截取其开头
+        first = lines[0][: max(1, len(lines[0]) * (budget - marker_cost) // costs[0])]
+        omitted_tokens -= estimate_tokens(first)
+        return [first, f"……（其余内容省略，约 {omitted_tokens} tokens）……"], len(lines) - 1
+    kept = lines[:head]
+    kept.append(f"……（中间省略 {tail - head} 段发言，约 {omitted_tokens} tokens）……")
+    kept.extend(lines[tail:])
+    return kept, tail - head
+
+
+def render_transcript(segments: Iterable[Any], token_budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[str, Dict[str, Any]]:
+    """
+    把会话片段渲染为提示词中的转录文本
+
+    Args:
+        segments: 片段（dict 或 TranscriptionSegment），需含 speaker / text
+        token_budget: 估算 token 数上限
+    Returns:
+        (文本, 统计：片段数、发言轮数、发言人数、估算 token 数、省略的发言轮数)；无内容时文本为空
+    """
+    segments = list(segments)
+    turns = merge_turns(segments)
+    aliases: Dict[str, str] = {}
+    for speaker, _ in turns:
+        if speaker not in aliases:
+            aliases[speaker] = _alias(len(aliases))
+
+    if len(aliases) > 1:
+        legend = "发言人代号：" + "，".join(f"{alias}={speaker}" for speaker, alias in aliases.items())
+        lines = [f"{aliases[speaker]}: {text}" for speaker, text in turns]
+        body, omitted = _fit(lines, token_budget - estimate_tokens(legend) - 1)
+        text = "\n".join([legend] + body)
+    else:
+        body, omitted = _fit([text for _, text in turns], token_budget)
+        text = "\n".join(body)
+
+    return text, {
+        "segments": len(segments),
+        "turns": len(turns),
+        "speakers": len(aliases),
+        "tokens": estimate_tokens(text),
+        "omitted_turns": omitted,
+    }
+
+
+def render_plain(transcript: str, token_budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[str, Dict[str, Any]]:
+    """没有片段（如只导入了全文的会话）时，清理全文并按预算截断"""
+    body, omitted = _fit([clean_text(transcript)], token_budget) if transcript else ([], 0)
+    text = "\n".join(line for line in body if line)
+    return text, {"segments": 0, "turns": 1 if text else 0, "speakers": 0,
+                  "tokens": estimate_tokens(text), "omitted_turns": omitted}
@@ -0,0 +1,228 @@
+"""
+segments 的紧凑存储编码
+
+segments_json 中每个 token 都重复键名、时间戳和文本，full_transcript 又保存一遍文本，
+行体积约为口述文本的 10 倍。落库时改为：
+- 列式：片段与 token 的各字段分别存为数组，speaker / language 用字典编码，
+  整数毫秒时间戳按差分存储，片段文本等于 token 拼接时不再重复保存；
+  已知字段以外的键（如上游新增的 token 字段）按行号存入稀疏的 extra 列，原样还原；
+- 压缩：列式 JSON 再经 zstd（安装了 zstandard 时）或 zlib 压缩，存入 segments_blob。
+
+segments_encoding 记录编码方式（"zlib-col1" / "zstd-col1"）；为空表示旧行，仍使用 segments_json。
+解码结果与 TranscriptionSegment / TranscriptionToken 的 model_dump() 结构一致。
+旧行由 maintenance.SegmentCompactor 在后台分批转换。
+"""
+import json
+import logging
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 新写入行的编码：zstd / zlib / json（json 表示不压缩，保持旧格式）
+SEGMENTS_ENCODING = os.getenv("SEGMENTS_ENCODING", "zstd" if zstandard else "zlib")
+ZLIB_LEVEL = int(os.getenv("SEGMENTS_ZLIB_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("SEGMENTS_ZSTD_LEVEL", "9"))
+
+# 列式结构中有专门列的字段；其余键进入 extra 列
+_SEGMENT_KEYS = frozenset(("speaker", "text", "start_time", "end_time", "tokens", "language"))
+_TOKEN_KEYS = frozenset(("text", "start_ms", "end_ms", "confidence", "is_final", "speaker", "language"))
+
+
+def _dictionary(values: List[Any]) -> Tuple[List[Any], List[int]]:
+    """字典编码：返回 (不重复的取值表, 每个值在表中的下标)"""
+    table: List[Any] = []
+    index: Dict[Any, int] = {}
+    codes = []
+    for value in values:
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(table)
+            table.append(value)
+        codes.append(code)
+    return table, codes
+
+
+def _pack_times(values: List[Any]) -> Dict[str, Any]:
+    """
+    时间戳列：全部为整数值时按差分存储，否则原样保存
+
+    模型中的时间字段是 float（model_dump() 给出 1200.0），毫秒时间戳实际都是整数值，
+    同样按整数差分；"f" 标记原值为 float，解码时还原类型。
+    """
+    if not all(type(v) is int or (type(v) is float and v.is_integer()) for v in values):
+        return {"v": values}
+    ints = [int(v) for v in values]
+    packed: Dict[str, Any] = {"d": [b - a for a, b in zip([0] + ints[:-1], ints)]}
+    if any(type(v) is float for v in values):
+        packed["f"] = 1
+    return packed
+
+
+def _unpack_times(packed: Dict[str, Any]) -> List[Any]:
+    if "v" in packed:
+        return packed["v"]
+    values, total = [], 0
+    for delta in packed["d"]:
+        total += delta
+        values.append(total)
+    if packed.get("f"):
+        return [float(v) for v in values]
+    return values
+
+
+def _extra(rows: List[Dict[str, Any]], known: frozenset) -> List[List[Any]]:
+    """稀疏保存已知字段以外的键：[[行号, {键: 值}], ...]"""
+    extra = []
+    for i, row in enumerate(rows):
+        unknown = {k: v for k, v in row.items() if k not in known}
+        if unknown:
+            extra.append([i, unknown])
+    return extra
+
+
+def _apply_extra(rows: List[Dict[str, Any]], extra: List[List[Any]]):
+    for i, unknown in extra:
+        rows[i].update(unknown)
+
+
+def to_columns(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """segments（dict 列表）-> 列式结构"""
+    tokens = [t for seg in segments for t in seg.get("tokens") or []]
+    token_text = [t.get("text", "") for t in tokens]
+
+    seg_text = []
+    offset = 0
+    for seg in segments:
+        n = len(seg.get("tokens") or [])
+        joined = "".join(token_text[offset:offset + n])
+        offset += n
+        # 与 token 拼接一致的片段文本不再重复保存
+        seg_text.append(None if seg.get("text", "") == joined else seg.get("text", ""))
+
+    speakers, speaker_codes = _dictionary(
+        [seg.get("speaker") for seg in segments] + [t.get("speaker") for t in tokens]
+    )
+    languages, language_codes = _dictionary(
+        [seg.get("language") for seg in segments] + [t.get("language") for t in tokens]
+    )
+    n_seg = len(segments)
+    columns = {
+        "v": 1,
+        "speakers": speakers,
+        "languages": languages,
+        "segments": {
+            "n": [len(seg.get("tokens") or []) for seg in segments],
+            "speaker": speaker_codes[:n_seg],
+            "language": language_codes[:n_seg],
+            "start": _pack_times([seg.get("start_time", 0.0) for seg in segments]),
+            "end": _pack_times([seg.get("end_time", 0.0) for seg in segments]),
+            "text": seg_text,
+        },
+        "tokens": {
+            "text": token_text,
+            "start": _pack_times([t.get("start_ms", 0.0) for t in tokens]),
+            "end": _pack_times([t.get("end_ms", 0.0) for t in tokens]),
+            "confidence": [t.get("confidence", 1.0) for t in tokens],
+            "is_final": [1 if t.get("is_final") else 0 for t in tokens],
+            "speaker": speaker_codes[n_seg:],
+            "language": language_codes[n_seg:],
+        },
+    }
+    for key, rows, known in (("segments", segments, _SEGMENT_KEYS), ("tokens", tokens, _TOKEN_KEYS)):
+        extra = _extra(rows, known)
+        if extra:
+            columns[key]["extra"] = extra
+    return columns
+
+
+def from_columns(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """列式结构 -> segments（dict 列表）"""
+    speakers = columns["speakers"]
+    languages = columns["languages"]
+    seg_cols = columns["segments"]
+    tok_cols = columns["tokens"]
+
+    tok_start = _unpack_times(tok_cols["start"])
+    tok_end = _unpack_times(tok_cols["end"])
+    tokens = [
+        {
+            "text": tok_cols["text"][i],
+            "start_ms": tok_start[i],
+            "end_ms": tok_end[i],
+            "confidence": tok_cols["confidence"][i],
+            "is_final": bool(tok_cols["is_final"][i]),
+            "speaker": speakers[tok_cols["speaker"][i]],
+            "language": languages[tok_cols["language"][i]],
+        }
+        for i in range(len(tok_cols["text"]))
+    ]
+    _apply_extra(tokens, tok_cols.get("extra", []))
+
+    seg_start = _unpack_times(seg_cols["start"])
+    seg_end = _unpack_times(seg_cols["end"])
+    segments = []
+    offset = 0
+    for i, n in enumerate(seg_cols["n"]):
+        seg_tokens = tokens[offset:offset + n]
+        offset += n
+        text = seg_cols["text"][i]
+        segments.append({
+            "speaker": speakers[seg_cols["speaker"][i]],
+            "text": "".join(t["text"] for t in seg_tokens) if text is None else text,
+            "start_time": seg_start[i],
+            "end_time": seg_end[i],
+            "tokens": seg_tokens,
+            "language": languages[seg_cols["language"][i]],
+        })
+    _apply_extra(segments, seg_cols.get("extra", []))
+    return segments
+
+
+def encode(segments: List[Dict[str, Any]], encoding: str = SEGMENTS_ENCODING) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Returns:
+        (segments_encoding, segments_blob)；encoding 为 "json" 时返回 (None, None)，调用方写 segments_json
+    """
+    if encoding == "json":
+        return None, None
+    raw = json.dumps(to_columns(segments), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("SEGMENTS_ENCODING=zstd requires the zstandard package")
+        return "zstd-col1", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib-col1", zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode(encoding: Optional[str], blob: Optional[bytes], segments_json: Optional[str]) -> List[Dict[str, Any]]:
+    """按行上的编码方式还原 segments；旧行直接解析 segments_json"""
+    if not encoding:
+        return json.loads(segments_json) if segments_json else []
+    if encoding == "zstd-col1":
+        if zstandard is None:
+            raise RuntimeError("zstd-encoded segments require the zstandard package")
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    elif encoding == "zlib-col1":
+        raw = zlib.decompress(blob)
+    else:
+        raise ValueError(f"Unknown segments encoding: {encoding}")
+    return from_columns(json.loads(raw))
+
+
+def encode_columns(segments: List[Dict[str, Any]], encoding: str = SEGMENTS_ENCODING) -> Dict[str, Any]:
+    """
+    写入会话行时的 segments 相关列值
+
+    压缩时 segments_json 置为占位的 "[]"（该列非空）。
+    """
+    name, blob = encode(segments, encoding)
+    if name is None:
+        return {"segments_json": json.dumps(segments), "segments_encoding": None, "segments_blob": None}
+    return {"segments_json": "[]", "segments_encoding": name, "segments_blob": blob}
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from database import SettingDB, async_session_maker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 版本行：每次写配置时更新为新值，其他 worker 据此判断本地缓存是否过期
+SETTINGS_VERSION_KEY = "_settings_version"
+
+
+async def upsert_settings(session: AsyncSession, values: Dict[str, str]) -> None:
+    """
+    批量写入配置（INSERT ... ON CONFLICT DO UPDATE），并在同一语句中更新版本行
+
+    整批只产生一条语句、一次提交；不支持 ON CONFLICT 的数据库退化为逐行 merge。
+    """
+    rows = [{"key": k, "value": v} for k, v in values.items()]
+    rows.append({"key": SETTINGS_VERSION_KEY, "value": uuid.uuid4().hex})
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            await session.merge(SettingDB(**row))
+        return
+
+    stmt = insert(SettingDB).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SettingDB.key],
+        set_={"value": stmt.excluded.value},
+    )
+    await session.execute(stmt)
+
+
+class SettingsCache:
+    """
+    配置表的进程内缓存
+
+    一次查询加载全部配置；之后最多每 check_interval 秒读取一次版本行，
+    版本变化（本进程或其他 worker 写过配置）时整表重新加载。
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, check_interval: float = 1.0):
+        self.session_maker = session_maker
+        self.check_interval = check_interval
+        self._values: Optional[Dict[str, str]] = None
+        self._version: Optional[str] = None
+        self._checked_at: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """丢弃本地缓存，下次读取时重新加载"""
+        self._values = None
+
+    async def get(self, key: str) -> Optional[str]:
+        values = await self.all()
+        return values.get(key)
+
+    async def all(self) -> Dict[str, str]:
+        """返回全部配置（不含版本行）"""
+        if self._values is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._values
+
+        async with self._lock:
+            # 等锁期间可能已被其他协程刷新
+            if self._values is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._values
+            async with self.session_maker() as session:
+                if self._values is not None:
+                    row = await session.get(SettingDB, SETTINGS_VERSION_KEY)
+                    if (row.value if row else None) == self._version:
+                        self._checked_at = time.monotonic()
+                        return self._values
+                rows = (await session.execute(select(SettingDB))).scalars().all()
+            values = {row.key: row.value for row in rows}
+            self._version = values.pop(SETTINGS_VERSION_KEY, None)
+            self._values = values
+            self._checked_at = time.monotonic()
+            return values
+
+
+settings_cache = SettingsCache(
+    async_session_maker,
+    check_interval=float(os.getenv("SETTINGS_CACHE_TTL", "1.0")),
+)
@@ -1,9 +1,20 @@
 import asyncio
 import json
 import logging
+import time
 import websockets
 from typing import Callable, Optional
 from models import SonioxConfig, TranscriptionToken
+from metrics import AUDIO_BYTES, SONIOX_CONNECT_SECONDS, SONIOX_FRAMES, SONIOX_PARSE_SECONDS
+from keepalive import keepalive_scheduler
+from profiling import profiler
+from upstream_pool import UpstreamPool
+
+_audio_in = AUDIO_BYTES.labels(direction="in")
+_audio_out = AUDIO_BYTES.labels(direction="out")
+_frames_transcription = SONIOX_FRAMES.labels(kind="transcription")
+_frames_control = SONIOX_FRAMES.labels(kind="control")
+_frames_error = SONIOX_FRAMES.labels(kind="error")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,58 +25,91 @@ class SonioxWebSocketService:
 
     SONIOX_WS_URL = "wss://stt-rt.soniox.com/transcribe-websocket"
 
-    def __init__(self, config: SonioxConfig):
+    def __init__(self, config: SonioxConfig, pool: Optional[UpstreamPool] = None):
         self.config = config
+        # 预热连接池；为空时每次连接都新建
+        self.pool = pool
+        # 本次上游连接的来源（pool / holdout / empty / stale / disabled）与建连耗时
+        self.upstream_source: Optional[str] = None
+        self.connect_seconds: float = 0.0
         self.ws_connection: Optional[websockets.WebSocketClientProtocol] = None
         self.is_connected = False
         self.session_id: Optional[str] = None
+        # 最近一次发送音频（或 keepalive 登记）的 time.monotonic() 时间
         self._last_audio_ts: float = 0.0
-        self._keepalive_task: Optional[asyncio.Task] = None
+        self._keepalive_token: Optional[int] = None
+        self._receive_task: Optional[asyncio.Task] = None
+        # 收到 finalize 的应答（<fin> token）或连接结束时置位
+        self._finalized = asyncio.Event()
         self._on_message_cb: Optional[Callable] = None
+        # 最近一帧 Soniox 消息的到达时间（perf_counter），供回调计算转发延迟
+        self.last_frame_at: float = 0.0
+
+    @classmethod
+    async def open_connection(cls):
+        """建立一条未配置的上游连接（也供预热池使用）"""
+        return await websockets.connect(
+            cls.SONIOX_WS_URL,
+            ping_interval=20,
+            ping_timeout=10,
+            max_size=10 * 1024 * 1024  # 10MB
+        )
+
+    def _config_message(self) -> dict:
+        """会话的初始配置消息"""
+        config_message = {
+            "api_key": (self.config.api_key or "").strip(),
+            "model": self.config.model,
+            # 音频格式：若指定则按指定；否则自动检测容器
+            "audio_format": self.config.audio_format or "auto",
+            "enable_speaker_diarization": self.config.enable_speaker_diarization,
+            "enable_language_identification": self.config.enable_language_identification,
+            "enable_endpoint_detection": getattr(self.config, "enable_endpoint_detection", True),
+        }
+        if self.config.audio_format and self.config.audio_format.startswith("pcm"):
+            if self.config.sample_rate:
+                config_message["sample_rate"] = self.config.sample_rate
+            if self.config.num_channels:
+                config_message["num_channels"] = self.config.num_channels
+
+        if self.config.language_hints:
+            config_message["language_hints"] = self.config.language_hints
+        return config_message
 
     async def connect(self, on_message: Callable):
-        """连接到 Soniox WebSocket API"""
+        """连接到 Soniox WebSocket API（优先取用预热池中的连接）"""
         try:
             self._on_message_cb = on_message
-            logger.info(f"Connecting to Soniox WebSocket: {self.SONIOX_WS_URL}")
-
-            # 连接到 WebSocket
-            self.ws_connection = await websockets.connect(
-                self.SONIOX_WS_URL,
-                ping_interval=20,
-                ping_timeout=10,
-                max_size=10 * 1024 * 1024  # 10MB
-            )
+            started = time.perf_counter()
+            config_message = json.dumps(self._config_message())
 
-            # 发送初始配置
-            config_message = {
-                "api_key": (self.config.api_key or "").strip(),
-                "model": self.config.model,
-                # 音频格式：若指定则按指定；否则自动检测容器
-                "audio_format": self.config.audio_format or "auto",
-                "enable_speaker_diarization": self.config.enable_speaker_diarization,
-                "enable_language_identification": self.config.enable_language_identification,
-                "enable_endpoint_detection": getattr(self.config, "enable_endpoint_detection", True),
-            }
-            if self.config.audio_format and self.config.audio_format.startswith("pcm"):
-                if self.config.sample_rate:
-                    config_message["sample_rate"] = self.config.sample_rate
-                if self.config.num_channels:
-                    config_message["num_channels"] = self.config.num_channels
-
-            if self.config.language_hints:
-                config_message["language_hints"] = self.config.language_hints
-
-            await self.ws_connection.send(json.dumps(config_message))
-            logger.info("Sent configuration to Soniox")
+            ws, self.upstream_source = self.pool.checkout() if self.pool else (None, "disabled")
+            if ws is not None:
+                try:
+                    await ws.send(config_message)
+                    self.ws_connection = ws
+                except Exception as e:
+                    # 池中连接已被上游关闭，改为新建
+                    logger.warning(f"Pooled Soniox connection unusable, reconnecting: {e}")
+                    self.upstream_source = "stale"
+            if self.ws_connection is None:
+                logger.info(f"Connecting to Soniox WebSocket: {self.SONIOX_WS_URL}")
+                self.ws_connection = await self.open_connection()
+                await self.ws_connection.send(config_message)
+            logger.info(f"Sent configuration to Soniox ({self.upstream_source})")
+            self.connect_seconds = time.perf_counter() - started
+            SONIOX_CONNECT_SECONDS.labels(source=self.upstream_source).observe(self.connect_seconds)
 
             self.is_connected = True
+            self._last_audio_ts = time.monotonic()
 
             # 启动消息接收循环
-            asyncio.create_task(self._receive_messages(on_message))
+            self._receive_task = asyncio.create_task(self._receive_messages(on_message))
 
-            # 启动 keepalive 任务（在无音频分片时维持会话与上下文）
-            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+            # 登记到共用的 keepalive 调度（在无音频分片时维持会话与上下文）
+            self._keepalive_token = keepalive_scheduler.register(
+                lambda: self._last_audio_ts, self.send_keepalive
+            )
 
             return True
 
@@ -79,49 +123,60 @@ class SonioxWebSocketService:
         try:
             async for message in self.ws_connection:
                 if isinstance(message, str):
-                    data = json.loads(message)
-
-                    # 服务端错误透传给上游，便于前端提示与排查
-                    if data.get("error_code") is not None:
-                        await on_message({
-                            "type": "error",
-                            "error_code": data.get("error_code"),
-                            "error_message": data.get("error_message"),
-                        })
-                        break
-
-                    # 处理转录结果
-                    if "tokens" in data:
-                        tokens = []
-                        for token_data in data["tokens"]:
-                            token = TranscriptionToken(
-                                text=token_data.get("text", ""),
-                                start_ms=token_data.get("start_ms", 0.0),
-                                end_ms=token_data.get("end_ms", 0.0),
-                                confidence=token_data.get("confidence", 1.0),
-                                is_final=token_data.get("is_final", False),
-                                speaker=token_data.get("speaker"),
-                                language=token_data.get("language")
-                            )
-                            tokens.append(token)
-
-                        # 调用回调函数
-                        await on_message({
-                            "type": "transcription",
-                            "tokens": [token.model_dump() for token in tokens],
-                            "audio_final_proc_ms": data.get("audio_final_proc_ms", 0.0),
-                            "audio_total_proc_ms": data.get("audio_total_proc_ms", 0.0)
-                        })
-
-                    # 处理其他消息类型
-                    elif "message_type" in data:
-                        logger.info(f"Received message: {data.get('message_type')}")
-                        if data.get("message_type") == "session_started":
-                            self.session_id = data.get("session_id")
+                    with profiler.span("SonioxWebSocketService._receive_messages"):
+                        self.last_frame_at = time.perf_counter()
+                        data = json.loads(message)
+
+                        # 服务端错误透传给上游，便于前端提示与排查
+                        if data.get("error_code") is not None:
+                            _frames_error.inc()
                             await on_message({
-                                "type": "session_started",
-                                "session_id": self.session_id
+                                "type": "error",
+                                "error_code": data.get("error_code"),
+                                "error_message": data.get("error_message"),
                             })
+                            break
+
+                        # 处理转录结果
+                        if "tokens" in data:
+                            with profiler.span("parse_tokens"):
+                                tokens = []
+                                for token_data in data["tokens"]:
+                                    token = TranscriptionToken(
+                                        text=token_data.get("text", ""),
+                                        start_ms=token_data.get("start_ms", 0.0),
+                                        end_ms=token_data.get("end_ms", 0.0),
+                                        confidence=token_data.get("confidence", 1.0),
+                                        is_final=token_data.get("is_final", False),
+                                        speaker=token_data.get("speaker"),
+                                        language=token_data.get("language")
+                                    )
+                                    tokens.append(token)
+
+                                payload = {
+                                    "type": "transcription",
+                                    "tokens": [token.model_dump() for token in tokens],
+                                    "audio_final_proc_ms": data.get("audio_final_proc_ms", 0.0),
+                                    "audio_total_proc_ms": data.get("audio_total_proc_ms", 0.0)
+                                }
+                            _frames_transcription.inc()
+                            SONIOX_PARSE_SECONDS.observe(time.perf_counter() - self.last_frame_at)
+
+                            # 调用回调函数
+                            await on_message(payload)
+                            if any(t.text == "<fin>" for t in tokens):
+                                self._finalized.set()
+
+                        # 处理其他消息类型
+                        elif "message_type" in data:
+                            _frames_control.inc()
+                            logger.info(f"Received message: {data.get('message_type')}")
+                            if data.get("message_type") == "session_started":
+                                self.session_id = data.get("session_id")
+                                await on_message({
+                                    "type": "session_started",
+                                    "session_id": self.session_id
+                                })
 
         except websockets.exceptions.ConnectionClosed:
             logger.info("Soniox WebSocket connection closed")
@@ -129,40 +184,30 @@ class SonioxWebSocketService:
         except Exception as e:
             logger.error(f"Error receiving messages from Soniox: {str(e)}")
             self.is_connected = False
+        finally:
+            # 不会再有 token 到达
+            self._finalized.set()
 
-    async def _keepalive_loop(self):
-        """在长时间静默时发送 keepalive 控制消息，避免会话因无音频而被关闭"""
-        try:
-            import time
-            while self.is_connected and self.ws_connection:
-                now = time.time()
-                # 若 15 秒未发送音频，则发送 keepalive
-                if now - self._last_audio_ts > 15:
-                    try:
-                        await self.ws_connection.send(json.dumps({"type": "keepalive"}))
-                        logger.debug("Sent keepalive to Soniox")
-                        # 避免高频发送
-                        self._last_audio_ts = now
-                    except Exception as e:
-                        logger.warning(f"Keepalive failed: {e}")
-                await asyncio.sleep(5)
-        except Exception as e:
-            logger.warning(f"Keepalive loop error: {e}")
+    async def send_keepalive(self) -> bool:
+        """发送 keepalive 控制消息（由 keepalive_scheduler 在静默超时后调用）"""
+        if not self.is_connected or not self.ws_connection:
+            return False
+        await self.ws_connection.send(json.dumps({"type": "keepalive"}))
+        logger.debug("Sent keepalive to Soniox")
+        return True
 
     async def send_audio(self, audio_data: bytes):
         """发送音频数据到 Soniox"""
+        _audio_in.inc(len(audio_data))
         if not self.is_connected or not self.ws_connection:
             logger.error("Not connected to Soniox")
             return False
 
         try:
             await self.ws_connection.send(audio_data)
+            _audio_out.inc(len(audio_data))
             # 记录最近发送音频时间戳
-            try:
-                import time
-                self._last_audio_ts = time.time()
-            except Exception:
-                pass
+            self._last_audio_ts = time.monotonic()
             return True
         except Exception as e:
             logger.error(f"Error sending audio to Soniox: {str(e)}")
@@ -174,6 +219,7 @@ class SonioxWebSocketService:
             return False
 
         try:
+            self._finalized.clear()
             finalize_message = {"type": "finalize"}
             await self.ws_connection.send(json.dumps(finalize_message))
             return True
@@ -181,8 +227,18 @@ class SonioxWebSocketService:
             logger.error(f"Error sending finalize message: {str(e)}")
             return False
 
+    async def wait_finalized(self, timeout: float) -> bool:
+        """等待 finalize 之后的最终 token 全部到达（或连接结束）；超时返回 False"""
+        try:
+            await asyncio.wait_for(self._finalized.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
     async def close(self):
         """关闭 WebSocket 连接"""
+        keepalive_scheduler.unregister(self._keepalive_token)
+        self._keepalive_token = None
         if self.ws_connection:
             try:
                 # 发送空帧来优雅地关闭
@@ -194,10 +250,15 @@ class SonioxWebSocketService:
             finally:
                 self.is_connected = False
                 self.ws_connection = None
-                # 结束 keepalive 任务
-                if self._keepalive_task and not self._keepalive_task.done():
-                    self._keepalive_task.cancel()
-                    self._keepalive_task = None
+                # 结束接收循环（上游未正常关闭时不会自行退出）
+                task = self._receive_task
+                self._receive_task = None
+                if task and not task.done() and task is not asyncio.current_task():
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
 
     async def reconfigure(self, audio_format: str, sample_rate: Optional[int], num_channels: Optional[int]) -> bool:
         """关闭现有连接并以新的音频格式重连（用于前端 PCM 回退）"""
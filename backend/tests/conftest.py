@@ -0,0 +1,42 @@
+"""
+测试公共设置
+
+在 backend 目录下运行：python -m pytest -q
+后端模块以 backend 目录为导入根；协程用例用 asyncio.run 执行，不依赖 pytest 插件。
+接口用例共用一个 TestClient（临时 SQLite 库、未设置 ACCESS_PASSWORD 的默认模式）。
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 须在导入 database / main 之前设置：模块导入时即读取
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.pop("ACCESS_PASSWORD", None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """启动一次应用；Cookie 不在客户端保存，需要登录的请求显式带上 admin 头"""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    # Cookie 为 secure，需经 https 发送
+    with TestClient(main.app, base_url="https://testserver") as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def admin(client):
+    """经 /auth/setup 设置数据库密码，返回带登录 Cookie 的请求头"""
+    import main
+
+    response = client.post("/auth/setup", json={"password": "test-password"})
+    assert response.status_code == 200
+    token = response.cookies[main.COOKIE_NAME]
+    client.cookies.clear()
+    return {"Cookie": f"{main.COOKIE_NAME}={token}"}
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+class Notices:
+    """记录排队期间发给客户端的排位消息"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, message):
+        self.messages.append(message)
+
+
+def _controller(**kwargs):
+    kwargs.setdefault("max_sessions", 1)
+    kwargs.setdefault("max_queue", 2)
+    kwargs.setdefault("queue_timeout", 5)
+    return AdmissionController(**kwargs)
+
+
+def test_queued_sessions_are_admitted_in_order():
+    async def main():
+        controller = _controller()
+        await controller.acquire(Notices())
+        first, second = Notices(), Notices()
+        waiting = [asyncio.ensure_future(controller.acquire(first)),
+                   asyncio.ensure_future(controller.acquire(second))]
+        await asyncio.sleep(0.01)
+        assert [m["position"] for m in first.messages] == [1]
+        assert [m["position"] for m in second.messages] == [2]
+
+        controller.release(10.0)
+        await asyncio.sleep(0.01)
+        assert waiting[0].done() and not waiting[1].done()
+        # 前面的会话准入后，第二位的排位前移
+        assert second.messages[-1]["position"] == 1
+        controller.release(10.0)
+        await asyncio.gather(*waiting)
+        assert controller.stats()["active"] == 1
+        assert controller.stats()["admitted"] == 3
+
+    asyncio.run(main())
+
+
+def test_full_queue_and_timeout_are_rejected():
+    async def main():
+        controller = _controller(max_queue=1, queue_timeout=0.05)
+        await controller.acquire(Notices())
+        waiting = asyncio.ensure_future(controller.acquire(Notices()))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as full:
+            await controller.acquire(Notices())
+        assert full.value.reason == "queue_full" and full.value.retry_after >= 1
+
+        with pytest.raises(AdmissionRejected) as timeout:
+            await waiting
+        assert timeout.value.reason == "queue_timeout"
+        assert controller.stats()["queued"] == 0
+
+    asyncio.run(main())
+
+
+def test_overload_rejects_new_sessions_and_holds_the_queue():
+    async def main():
+        controller = _controller(max_loop_lag_ms=100)
+        controller.loop_lag_ms = 250
+        with pytest.raises(AdmissionRejected) as overloaded:
+            await controller.acquire(Notices())
+        assert overloaded.value.reason == "overloaded"
+        # 重试秒数随延迟超出阈值的程度增加
+        assert overloaded.value.retry_after == 13
+
+    asyncio.run(main())
+
+
+def test_drain_rejects_waiters_and_resume_admits_again():
+    async def main():
+        controller = _controller()
+        await controller.acquire(Notices())
+        waiting = asyncio.ensure_future(controller.acquire(Notices()))
+        await asyncio.sleep(0.01)
+        controller.drain()
+        with pytest.raises(AdmissionRejected, match="draining"):
+            await waiting
+        controller.release(1.0)
+        with pytest.raises(AdmissionRejected, match="draining"):
+            await controller.acquire(Notices())
+        controller.resume()
+        await controller.acquire(Notices())
+        assert controller.active == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        controller = _controller()
+        await controller.acquire(Notices())
+        waiting = asyncio.ensure_future(controller.acquire(Notices()))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert controller.stats()["queued"] == 0
+        controller.release(1.0)
+        assert controller.active == 0
+
+    asyncio.run(main())
+
+
+def test_admission_limits_require_login(client, admin):
+    anonymous = client.post("/admin/admission", json={"max_sessions": 0, "max_queue": 0})
+    assert anonymous.status_code == 401
+    current = client.get("/admin/admission").json()
+    assert current["max_sessions"] != 0
+
+    response = client.post("/admin/admission", headers=admin, json={"max_queue": current["max_queue"]})
+    assert response.status_code == 200
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import crud
+from analytics import AnalyticsPipeline, compute_session_stats, count_words, find_low_confidence_spans
+from bulk import record_to_row
+from database import TranscriptionSessionDB, create_engine_for
+from migrations import run_migrations
+from write_queue import WriteQueue
+
+
+def _token(text, start, end, confidence=0.95):
+    return {"text": text, "start_ms": start, "end_ms": end, "confidence": confidence, "is_final": True}
+
+
+def _segment(speaker, *tokens):
+    return {"speaker": speaker, "text": "".join(t["text"] for t in tokens),
+            "start_time": tokens[0]["start_ms"], "end_time": tokens[-1]["end_ms"], "tokens": list(tokens)}
+
+
+def test_cjk_characters_count_as_words():
+    assert count_words("我们开会<end>") == (4, 4)
+    assert count_words("deadline 是 next week") == (4, 17)
+    assert count_words("  <fin> ") == (0, 0)
+
+
+def test_interruption_needs_an_unfinished_turn_and_a_short_gap():
+    segments = [
+        # A 未说完（无句末标记），B 在 100 ms 内开口：插话
+        _segment("A", _token("我觉得", 0, 600)),
+        _segment("B", _token("不对", 700, 1000), _token("<end>", 1000, 1000)),
+        # B 已以句末标记结束：轮换，不算插话
+        _segment("A", _token("好", 1100, 1300)),
+        # A 未说完，但停顿超过阈值：不算插话
+        _segment("B", _token("嗯", 2000, 2200)),
+        # 只有 <fin> 的片段不算发言
+        _segment("A", _token("<fin>", 2200, 2200)),
+    ]
+    stats = compute_session_stats(segments)
+    assert stats["interruption_count"] == 1
+    assert stats["word_count"] == 7
+    assert stats["speaker_count"] == 2
+    assert stats["speakers"]["A"]["segments"] == 2
+    assert stats["speakers"]["B"]["talk_time_ms"] == 500.0
+    assert stats["duration_seconds"] == 2.2
+
+
+def _with_analyzed(tmp_path, records, check):
+    """导入记录并由统计任务补算完成后，以 session maker 执行 check 协程"""
+    async def main():
+        engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'analytics.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+        maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        writer = WriteQueue(maker)
+        await writer.start()
+        pipeline = AnalyticsPipeline(maker, writer, workers=1)
+        rows = [record_to_row(record) for record in records]
+        await writer.submit(lambda db: crud.import_sessions(db, rows))
+        try:
+            # 启动时补算尚未分析的会话
+            await pipeline.start()
+            for _ in range(100):
+                if pipeline.processed + pipeline.failed >= len(rows):
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await pipeline.stop()
+            await writer.stop()
+        try:
+            assert (pipeline.processed, pipeline.failed) == (len(rows), 0)
+            await check(maker)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_pipeline_writes_stats_back(tmp_path):
+    segments = [_segment("A", _token("今天讨论", 0, 1000)),
+                _segment("B", _token("好的", 1050, 1500, confidence=0.3))]
+
+    async def check(maker):
+        async with maker() as db:
+            saved = (await db.execute(select(TranscriptionSessionDB))).scalars().one()
+        assert saved.analyzed_at is not None
+        assert (saved.word_count, saved.char_count, saved.interruption_count) == (6, 6, 1)
+        assert saved.low_confidence_count == 1
+
+    _with_analyzed(tmp_path, [{"session_id": "s1", "segments": segments, "full_transcript": "今天讨论好的"}], check)
+
+
+def test_speaker_totals_aggregate_across_sessions(tmp_path):
+    records = [
+        {"session_id": "jan", "created_at": "2024-01-10T09:00:00",
+         "segments": [_segment("A", _token("一二", 0, 1000, confidence=0.8)), _segment("B", _token("三", 1000, 1500))]},
+        {"session_id": "feb", "created_at": "2024-02-10T09:00:00",
+         "segments": [_segment("A", _token("四五六", 0, 3000, confidence=0.6))]},
+    ]
+
+    async def check(maker):
+        async with maker() as db:
+            totals = await crud.get_speaker_totals(db)
+            january = await crud.get_speaker_totals(db, start=datetime(2024, 1, 1), end=datetime(2024, 2, 1))
+            only_b = await crud.get_speaker_totals(db, speaker="B")
+        # 按总发言时长倒序
+        assert [t["speaker"] for t in totals] == ["A", "B"]
+        assert totals[0] == {"speaker": "A", "sessions": 2, "duration_ms": 4000.0, "token_count": 2,
+                             "word_count": 5, "segment_count": 2, "avg_confidence": 0.7}
+        assert [(t["speaker"], t["duration_ms"]) for t in january] == [("A", 1000.0), ("B", 500.0)]
+        assert [t["sessions"] for t in only_b] == [1]
+
+    _with_analyzed(tmp_path, records, check)
+
+
+def test_low_confidence_tokens_merge_within_a_segment():
+    segments = [
+        _segment("A", _token("会议", 0, 300, 0.4), _token("在", 300, 400), _token("周三", 400, 700, 0.5),
+                  _token("<end>", 700, 700, 0.1), _token("下午", 2000, 2300, 0.3)),
+        _segment("B", _token("好", 2400, 2500, 0.2)),
+    ]
+    spans = find_low_confidence_spans(segments, threshold=0.6, merge_gap_ms=1000)
+    # 间隔不超过 1000 ms 的低置信度 token 合并（中间的高置信度 token 一并覆盖），控制标记不计
+    assert [(s["segment_index"], s["token_start"], s["token_end"], s["low_token_count"]) for s in spans] == [
+        (0, 0, 2, 2), (0, 4, 4, 1), (1, 0, 0, 1)
+    ]
+    assert spans[0]["text"] == "会议在周三"
+    assert spans[0]["min_confidence"] == 0.4
+    assert spans[0]["avg_confidence"] == round((0.4 + 0.95 + 0.5) / 3, 4)
+    # 区间不跨片段
+    assert spans[2]["speaker"] == "B"
+
+
+def test_low_confidence_spans_are_indexed(tmp_path):
+    segments = [_segment("A", _token("一", 0, 100, 0.5), _token("二", 100, 200), _token("三", 3000, 3100, 0.2))]
+
+    async def check(maker):
+        async with maker() as db:
+            rows = await crud.get_low_confidence_spans(db, "s1")
+            narrowed = await crud.get_low_confidence_spans(db, "s1", max_confidence=0.3)
+        assert [(r.token_start, r.token_end, r.text) for r in rows] == [(0, 0, "一"), (2, 2, "三")]
+        assert [r.text for r in narrowed] == ["三"]
+
+    _with_analyzed(tmp_path, [{"session_id": "s1", "segments": segments}], check)
@@ -0,0 +1,63 @@
+import json
+import time
+import uuid
+
+import openai_service
+
+
+def _import_session(client):
+    session_id = str(uuid.uuid4())
+    record = {"session_id": session_id, "full_transcript": "周三发布<end>",
+              "segments": [{"speaker": "Speaker 1", "text": "周三发布<end>", "start_time": 0, "end_time": 900}]}
+    assert client.post("/import/sessions", content=json.dumps(record).encode()).json()["imported"] == 1
+    return session_id
+
+
+def _request(session_id, kinds):
+    return {"session_id": session_id, "kinds": kinds,
+            "openai_config": {"api_url": "http://unused/v1", "api_key": "k", "model": "m"}}
+
+
+def test_analyses_run_in_parallel_and_fail_independently(client, monkeypatch):
+    transcripts = []
+
+    async def fake_analyze(self, transcript, kind):
+        transcripts.append(transcript)
+        if kind == "topics":
+            raise RuntimeError("upstream 500")
+        for part in (f"{kind}-1", f"{kind}-2"):
+            yield part
+
+    monkeypatch.setattr(openai_service.OpenAIService, "analyze", fake_analyze)
+    session_id = _import_session(client)
+    response = client.post("/analyze", json=_request(session_id, ["summary", "action_items", "topics", "summary"]))
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert lines[0]["type"] == "jobs" and sorted(lines[0]["jobs"]) == ["action_items", "summary", "topics"]
+    deltas = {}
+    statuses = {}
+    for line in lines[1:]:
+        if "delta" in line:
+            deltas[line["kind"]] = deltas.get(line["kind"], "") + line["delta"]
+        else:
+            statuses[line["kind"]] = line
+    assert deltas == {"summary": "summary-1summary-2", "action_items": "action_items-1action_items-2"}
+    assert statuses["summary"]["status"] == statuses["action_items"]["status"] == "done"
+    assert statuses["topics"]["status"] == "failed" and "error" in statuses["topics"]
+    # 各项共用同一份预处理后的转录
+    assert len(transcripts) == 3 and len(set(transcripts)) == 1
+
+    for _ in range(50):
+        saved = client.get(f"/sessions/{session_id}").json()
+        if saved["ai_summary"] and saved["ai_action_items"]:
+            break
+        time.sleep(0.02)
+    assert (saved["ai_summary"], saved["ai_action_items"]) == ("summary-1summary-2", "action_items-1action_items-2")
+    assert saved["ai_topics"] is None
+
+
+def test_unknown_kinds_are_rejected(client):
+    response = client.post("/analyze", json=_request("any", ["summary", "poem"]))
+    assert response.status_code == 400
+    assert client.post("/analyze", json=_request("any", [])).status_code == 400
@@ -0,0 +1,86 @@
+import io
+import json
+import uuid
+import zipfile
+
+
+def _record(session_id, text="hello world"):
+    return {
+        "session_id": session_id,
+        "title": f"Session {session_id}",
+        "created_at": "2024-03-01T10:00:00",
+        "updated_at": "2024-03-01T10:05:00",
+        "status": "completed",
+        "duration_seconds": 300.0,
+        "segments": [{"speaker": "Speaker 1", "text": text, "start_time": 0.0, "end_time": 1200.0,
+                      "tokens": [{"text": text, "start_ms": 0.0, "end_ms": 1200.0, "confidence": 0.9,
+                                  "is_final": True, "speaker": "Speaker 1", "language": "en"}],
+                      "language": "en"}],
+        "full_transcript": text,
+        "ai_summary": None,
+        "ai_action_items": None,
+        "ai_topics": None,
+        "metadata": {"source": "test"},
+    }
+
+
+def _export(client, ids, fmt="jsonl"):
+    response = client.get("/export/sessions", params={"format": fmt, "ids": ",".join(ids)})
+    assert response.status_code == 200
+    if fmt == "zip":
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            return {json.loads(archive.read(name))["session_id"]: json.loads(archive.read(name))
+                    for name in archive.namelist() if name.startswith("sessions/")}
+    return {r["session_id"]: r for r in map(json.loads, response.text.splitlines())}
+
+
+def test_jsonl_round_trip_with_malformed_lines(client):
+    prefix = uuid.uuid4().hex[:8]
+    good = [_record(f"{prefix}-{i}") for i in range(3)]
+    wrong_types = dict(_record(f"{prefix}-bad"), segments="not a list")
+    lines = [json.dumps(good[0]), "{not json", json.dumps(good[1]), json.dumps(wrong_types),
+             json.dumps(dict(good[0], title="duplicate")), "", json.dumps(good[2])]
+    response = client.post("/import/sessions", content="\n".join(lines).encode(),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["skipped"], result["failed"]) == (3, 1, 2)
+    assert [e["record"] for e in result["errors"]] == ["line 2", "line 4"]
+    assert "segments" in result["errors"][1]["error"]
+
+    exported = _export(client, [r["session_id"] for r in good])
+    for record in good:
+        assert exported[record["session_id"]]["segments"] == record["segments"]
+        assert exported[record["session_id"]]["title"] == record["title"]
+
+    # 再次导入同一批：全部跳过
+    response = client.post("/import/sessions", content="\n".join(json.dumps(r) for r in good).encode())
+    assert response.json()["skipped"] == 3
+
+
+def test_zip_round_trip_with_malformed_member(client):
+    prefix = uuid.uuid4().hex[:8]
+    records = [_record(f"{prefix}-{i}", text="你好 世界") for i in range(2)]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for record in records:
+            archive.writestr(f"sessions/{record['session_id']}.json", json.dumps(record))
+        archive.writestr("sessions/broken.json", "[1, 2")
+        archive.writestr("sessions/wrong.json", json.dumps(dict(records[0], session_id="x", created_at=5)))
+    response = client.post("/import/sessions", content=buffer.getvalue(),
+                           headers={"Content-Type": "application/zip"})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["skipped"], result["failed"]) == (2, 0, 2)
+
+    exported = _export(client, [r["session_id"] for r in records], fmt="zip")
+    assert sorted(exported) == sorted(r["session_id"] for r in records)
+    # 导出的 zip 可原样导回（全部已存在）
+    response = client.get("/export/sessions", params={"format": "zip", "ids": ",".join(exported)})
+    response = client.post("/import/sessions", content=response.content, headers={"Content-Type": "application/zip"})
+    assert response.json()["skipped"] == 2
+
+
+def test_corrupt_zip_is_rejected(client):
+    response = client.post("/import/sessions", content=b"not a zip", headers={"Content-Type": "application/zip"})
+    assert response.status_code == 400
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("settings", [
+    {"soniox_api_key": "sk-other"},
+    {"openai_config": {"api_url": "https://example.invalid/v1", "model": "m"}},
+    {"openai_config": '{"api_url": "https://example.invalid/v1"}'},
+])
+def test_importing_keys_or_urls_requires_login(client, admin, settings):
+    response = client.post("/config/import", json={"settings": settings})
+    assert response.status_code == 401
+
+    response = client.post("/config/import", json={"settings": settings}, headers=admin)
+    assert response.status_code == 200
+
+
+def test_importing_plain_settings_stays_open(client, admin):
+    response = client.post("/config/import", json={"settings": {"soniox_config": {"model": "stt-rt-v3"}}})
+    assert response.status_code == 200
+    assert response.json()["imported"] == 1
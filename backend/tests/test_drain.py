@@ -0,0 +1,70 @@
+import uuid
+from datetime import datetime
+
+from models import TranscriptionSegment, TranscriptionSession
+
+
+class FakeUpstream:
+    """上游连接替身：finalize 后立即视为已收到最终 token"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def finalize(self):
+        self.calls.append("finalize")
+        return True
+
+    async def wait_finalized(self, timeout):
+        self.calls.append("wait_finalized")
+        return True
+
+    async def close(self):
+        self.calls.append("close")
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def test_drain_saves_live_sessions_and_blocks_admission(client, admin):
+    import main
+
+    session_id = str(uuid.uuid4())
+    session = TranscriptionSession(session_id=session_id, title="live", created_at=datetime.now())
+    session.segments.append(TranscriptionSegment(speaker="Speaker 1", text="drained", start_time=0, end_time=100))
+    upstream, browser = FakeUpstream(), FakeBrowser()
+    main.active_soniox_connections[session_id] = upstream
+    main.drainable_sessions[session_id] = (lambda: session, browser)
+    try:
+        assert client.post("/admin/drain").status_code == 401
+
+        response = client.post("/admin/drain", headers=admin)
+        assert response.status_code == 200
+        assert {k: response.json()[k] for k in ("sessions", "saved", "finalized", "timed_out")} == {
+            "sessions": 1, "saved": 1, "finalized": 1, "timed_out": 0
+        }
+        # 先等最终 token，再关闭上游，最后通知并关闭浏览器连接
+        assert upstream.calls == ["finalize", "wait_finalized", "close"]
+        assert browser.sent == [{"type": "session_completed", "session_id": session_id, "reason": "server_shutdown"}]
+        assert browser.close_code == 1001
+        assert session_id not in main.drainable_sessions
+
+        saved = client.get(f"/sessions/{session_id}").json()
+        assert saved["status"] == "stopped"
+        assert [seg["text"] for seg in saved["segments"]] == ["drained"]
+        assert main.admission.stats()["draining"] is True
+    finally:
+        main.active_soniox_connections.pop(session_id, None)
+        main.drainable_sessions.pop(session_id, None)
+        response = client.delete("/admin/drain", headers=admin)
+
+    assert response.status_code == 200
+    assert response.json()["draining"] is False
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from keepalive import KeepaliveScheduler
+
+
+class Connection:
+    """记录 keepalive 发送时间；hang 为 True 时发送永不完成"""
+
+    def __init__(self, idle_before: float = 0.0, hang: bool = False):
+        self.last_audio = time.monotonic() - idle_before
+        self.hang = hang
+        self.sent = []
+
+    def last_activity(self) -> float:
+        return self.last_audio
+
+    async def send(self) -> bool:
+        if self.hang:
+            await asyncio.Event().wait()
+        self.sent.append(time.monotonic())
+        return True
+
+
+def _run(test):
+    async def main():
+        scheduler = KeepaliveScheduler(idle_seconds=0.2, slack=0.05, send_timeout=0.1)
+        try:
+            await test(scheduler)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+
+
+def test_keepalive_is_sent_after_idle_deadline():
+    async def test(scheduler):
+        conn = Connection()
+        scheduler.register(conn.last_activity, conn.send)
+        await asyncio.sleep(0.1)
+        assert conn.sent == []
+        await asyncio.sleep(0.2)
+        assert len(conn.sent) == 1
+        # 发送后按 idle_seconds 重新入堆
+        await asyncio.sleep(0.25)
+        assert len(conn.sent) == 2
+
+    _run(test)
+
+
+def test_audio_postpones_the_deadline():
+    async def test(scheduler):
+        conn = Connection()
+        scheduler.register(conn.last_activity, conn.send)
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            conn.last_audio = time.monotonic()
+        assert conn.sent == []
+        await asyncio.sleep(0.3)
+        assert len(conn.sent) == 1
+
+    _run(test)
+
+
+def test_close_deadlines_share_one_wakeup():
+    async def test(scheduler):
+        first, second = Connection(idle_before=0.02), Connection()
+        scheduler.register(first.last_activity, first.send)
+        scheduler.register(second.last_activity, second.send)
+        await asyncio.sleep(0.25)
+        assert len(first.sent) == len(second.sent) == 1
+        assert scheduler.wakeups == 1
+
+    _run(test)
+
+
+def test_earlier_registration_wakes_the_scheduler():
+    async def test(scheduler):
+        late = Connection()
+        scheduler.register(late.last_activity, late.send)
+        await asyncio.sleep(0.01)
+        # 新连接的截止时间早于堆顶：调度任务须提前醒来
+        early = Connection(idle_before=0.15)
+        scheduler.register(early.last_activity, early.send)
+        await asyncio.sleep(0.1)
+        assert len(early.sent) == 1 and late.sent == []
+
+    _run(test)
+
+
+def test_unregistered_connection_is_skipped():
+    async def test(scheduler):
+        conn = Connection()
+        token = scheduler.register(conn.last_activity, conn.send)
+        scheduler.unregister(token)
+        await asyncio.sleep(0.3)
+        assert conn.sent == []
+        assert scheduler.stats()["connections"] == 0
+
+    _run(test)
+
+
+def test_stuck_send_is_dropped_without_delaying_others():
+    async def test(scheduler):
+        stuck, healthy = Connection(hang=True), Connection()
+        scheduler.register(stuck.last_activity, stuck.send)
+        scheduler.register(healthy.last_activity, healthy.send)
+        await asyncio.sleep(0.35)
+        stats = scheduler.stats()
+        assert stats["timeouts"] == 1 and stats["connections"] == 1
+        # 卡住的发送只占用一次超时，之后健康连接照常按期发送
+        await asyncio.sleep(0.3)
+        assert len(healthy.sent) >= 2
+
+    _run(test)
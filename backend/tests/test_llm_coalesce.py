@@ -0,0 +1,165 @@
+import asyncio
+
+from llm_coalesce import SingleFlight
+
+
+class Producer:
+    """可控的上游：每次 release() 放出一个文本块；fail_after 个块后抛出异常"""
+
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = list(chunks)
+        self.fail_after = fail_after
+        self.calls = 0
+        self.closed = False
+        self._gate = asyncio.Queue()
+
+    def release(self, n: int = 1):
+        for _ in range(n):
+            self._gate.put_nowait(None)
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            for i, chunk in enumerate(self.chunks):
+                if self.fail_after is not None and i == self.fail_after:
+                    raise RuntimeError("upstream 500")
+                await self._gate.get()
+                yield chunk
+        finally:
+            self.closed = True
+
+
+class Saved:
+    """记录 persist 调用：[(文本, 是否最终)]"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, text: str, final: bool):
+        self.calls.append((text, final))
+
+
+async def _collect(flights, flight, offset=0):
+    return "".join([text async for text in flights.stream(flight, offset)])
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_upstream_stream():
+    async def main():
+        flights = SingleFlight(flush_seconds=60)
+        producer = Producer(["a", "b", "c"])
+        first = flights.start("key", "summarize", producer)
+        reader = asyncio.ensure_future(_collect(flights, first))
+        producer.release()
+        await _settle()
+        # 后加入的请求先收到已生成的前缀
+        second = flights.start("key", "summarize", producer)
+        late = asyncio.ensure_future(_collect(flights, second))
+        producer.release(2)
+        assert second is first
+        assert await reader == await late == "abc"
+        assert producer.calls == 1
+        assert flights.stats()["joined"] == 1
+        # 结束后同键请求重新发起
+        assert flights.start("key", "summarize", Producer([])) is not first
+
+    asyncio.run(main())
+
+
+def test_resume_from_offset_and_subscriber_leaving_keeps_job_running():
+    async def main():
+        flights = SingleFlight(flush_seconds=60)
+        producer = Producer(["你好", "世界", "!"])
+        saved = Saved()
+        flight = flights.start("key", "summarize", producer, persist=saved)
+        stream = flights.stream(flight)
+        producer.release()
+        assert await stream.__anext__() == "你好"
+        await stream.aclose()
+
+        producer.release(2)
+        await flight.task
+        assert flight.status == "done"
+        assert saved.calls[-1] == ("你好世界!", True)
+        assert await _collect(flights, flights.get(flight.job_id), offset=3) == "界!"
+        assert flights.stats()["resumed"] == 1
+
+    asyncio.run(main())
+
+
+def test_cancel_saves_partial_text_and_stops_upstream():
+    async def main():
+        flights = SingleFlight(flush_seconds=60)
+        producer = Producer(["a", "b", "c"])
+        saved = Saved()
+        flight = flights.start("key", "summarize", producer, persist=saved)
+        producer.release(2)
+        await _settle()
+
+        assert flights.cancel(flight.job_id)
+        await asyncio.gather(flight.task, return_exceptions=True)
+        assert flight.status == "cancelled"
+        assert producer.closed
+        assert saved.calls == [("ab", False)]
+        assert not flights.cancel(flight.job_id)
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_upstream_error_fails_job_without_final_save():
+    async def main():
+        flights = SingleFlight(flush_seconds=0)
+        producer = Producer(["a", "b", "c"], fail_after=2)
+        saved = Saved()
+        flight = flights.start("key", "summarize", producer, persist=saved)
+        producer.release(2)
+        await flight.task
+
+        assert flight.status == "failed"
+        assert flight.error == "upstream 500"
+        assert flight.info()["error"] == "upstream 500"
+        # 只有生成中的部分保存，失败后不做 final=True 的保存
+        assert saved.calls and all(not final for _, final in saved.calls)
+        assert await _collect(flights, flight) == "ab"
+
+    asyncio.run(main())
+
+
+def test_stop_flushes_unsaved_text():
+    async def main():
+        flights = SingleFlight(flush_seconds=60)
+        producer = Producer(["a", "b", "c"])
+        saved = Saved()
+        flight = flights.start("key", "summarize", producer, persist=saved)
+        producer.release(2)
+        await _settle()
+
+        await flights.stop()
+        assert flight.status == "cancelled"
+        assert saved.calls == [("ab", False)]
+
+    asyncio.run(main())
+
+
+def test_multiplex_interleaves_jobs_and_reports_completion():
+    async def main():
+        flights = SingleFlight(flush_seconds=60)
+        summary, topics = Producer(["s1", "s2"]), Producer(["t1"])
+        jobs = {
+            "summary": flights.start("s", "analyze_summary", summary),
+            "topics": flights.start("t", "analyze_topics", topics),
+        }
+        summary.release(2)
+        topics.release()
+        events = [event async for event in flights.multiplex(jobs)]
+
+        assert "".join(text for name, text in events if name == "summary" and text) == "s1s2"
+        assert [text for name, text in events if name == "topics"] == ["t1", None]
+        assert events.count(("summary", None)) == 1
+
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+
+import llm_router
+import openai_service
+from llm_router import EndpointError, LLMRouter, parse_endpoints
+from models import OpenAIConfig
+from openai_service import OpenAIService, close_http_session
+
+
+class StandIn:
+    """OpenAI 兼容替身服务器：首块前等待 delay 秒，status 非 200 时直接返回错误；记录收到的密钥"""
+
+    def __init__(self, name: str, delay: float = 0.0, status: int = 200):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.keys = []
+        self.url = None
+        self._runner = None
+
+    async def chat(self, request: web.Request):
+        await request.read()
+        self.keys.append(request.headers.get("Authorization"))
+        if self.status != 200:
+            return web.Response(status=self.status, text=f"{self.name} failure")
+        response = web.StreamResponse()
+        response.content_type = "text/event-stream"
+        await response.prepare(request)
+        await asyncio.sleep(self.delay)
+        for part in (self.name, "-ok"):
+            data = json.dumps({"choices": [{"delta": {"content": part}}]})
+            await response.write(f"data: {data}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    def endpoint(self, api_key: str = "pool-key"):
+        return {"name": self.name, "api_url": self.url, "model": "m", "api_key": api_key}
+
+
+@pytest.fixture(autouse=True)
+def router(monkeypatch):
+    """每个用例使用独立的路由，关闭随机探索，熔断阈值为 2 次"""
+    instance = LLMRouter()
+    monkeypatch.setattr(openai_service, "llm_router", instance)
+    monkeypatch.setattr(llm_router, "LLM_EXPLORE_RATE", 0.0)
+    monkeypatch.setattr(llm_router, "LLM_BREAKER_FAILURES", 2)
+    return instance
+
+
+def _service(url: str = "http://unused/v1", api_key: str = "request-key"):
+    return OpenAIService(OpenAIConfig(api_url=url, api_key=api_key, model="m"))
+
+
+async def _summarize(service) -> str:
+    return "".join([chunk async for chunk in service.summarize("转录", "总结")])
+
+
+def _with_servers(*servers):
+    """启动替身服务器，执行用例协程后关闭服务器与共用连接池"""
+
+    def decorate(test):
+        async def main(router):
+            started = [await server.start() for server in servers]
+            try:
+                await test(router, *started)
+            finally:
+                await close_http_session()
+                for server in started:
+                    await server.stop()
+
+        return lambda router: asyncio.run(main(router))
+
+    return decorate
+
+
+@_with_servers(StandIn("broken", status=500), StandIn("good"))
+async def test_fails_over_to_next_endpoint(router, broken, good):
+    router.configure(endpoints=parse_endpoints([broken.endpoint(), good.endpoint()]))
+
+    assert await _summarize(_service()) == "good-ok"
+    assert router.failovers == 1
+    stats = {e["name"]: e for e in router.stats()["endpoints"]}
+    assert stats["broken"]["failures"] == 1
+    assert stats["good"]["wins"] == 1
+
+
+@_with_servers(StandIn("broken", status=500), StandIn("good"))
+async def test_open_circuit_is_skipped(router, broken, good):
+    router.configure(endpoints=parse_endpoints([broken.endpoint(), good.endpoint()]))
+
+    for _ in range(5):
+        assert await _summarize(_service()) == "good-ok"
+    # 连续失败 2 次后熔断，之后的请求不再发往 broken
+    assert len(broken.keys) == 2
+    assert router.stats()["endpoints"][0]["circuit"] == "open"
+
+
+@_with_servers(StandIn("slow", delay=0.5), StandIn("broken", status=500), StandIn("good"))
+async def test_hedge_skips_endpoint_tripped_after_ranking(router, slow, broken, good):
+    router.configure(endpoints=parse_endpoints([slow.endpoint(), broken.endpoint(), good.endpoint()]),
+                     hedge_after=0.2)
+    request = asyncio.ensure_future(_summarize(_service()))
+    await asyncio.sleep(0.05)
+    # 请求已按 slow, broken, good 排好序；对冲之前 broken 被其他请求的失败熔断
+    for _ in range(2):
+        router.endpoints[1].on_failure()
+
+    assert await request == "good-ok"
+    assert broken.keys == []
+    assert router.hedges == 1
+
+
+@_with_servers(StandIn("broken", status=500))
+async def test_all_open_tries_earliest_recovery(router, broken):
+    router.configure(endpoints=parse_endpoints([broken.endpoint()]))
+    for _ in range(3):
+        with pytest.raises(EndpointError, match="broken failure"):
+            await _summarize(_service())
+    # 熔断后仍尝试唯一的端点，而不是直接失败
+    assert len(broken.keys) == 3
+
+
+@_with_servers(StandIn("pool"))
+async def test_pool_endpoint_uses_only_its_own_key(router, pool):
+    router.configure(endpoints=parse_endpoints([pool.endpoint(api_key="pool-key")]))
+    await _summarize(_service(api_key="request-key"))
+    assert pool.keys == ["Bearer pool-key"]
+
+
+@_with_servers(StandIn("own"))
+async def test_adhoc_endpoint_uses_request_key(router, own):
+    assert await _summarize(_service(url=own.url, api_key="request-key")) == "own-ok"
+    assert own.keys == ["Bearer request-key"]
+
+
+def test_endpoint_without_key_is_rejected(router, monkeypatch):
+    monkeypatch.delenv("MISSING_KEY", raising=False)
+    with pytest.raises(ValueError, match="no api_key"):
+        parse_endpoints([{"name": "x", "api_url": "http://h/v1", "model": "m", "api_key_env": "MISSING_KEY"}])
+    with pytest.raises(ValueError, match="api_url"):
+        parse_endpoints([{"name": "x", "model": "m", "api_key": "k"}])
+    monkeypatch.setenv("MISSING_KEY", "from-env")
+    assert parse_endpoints([{"api_url": "http://h/v1", "model": "m", "api_key_env": "MISSING_KEY"}])[0].api_key == "from-env"
+
+
+def test_pool_is_narrowed_to_the_requested_model(router):
+    router.configure(endpoints=parse_endpoints([
+        {"name": "a", "api_url": "http://a/v1", "model": "gpt-4o-mini", "api_key": "k"},
+        {"name": "b", "api_url": "http://b/v1", "model": "qwen-plus", "api_key": "k"},
+    ]))
+    assert [e.name for e in router.candidates("http://ignored/v1", "qwen-plus")] == ["b"]
+    assert router.model_overrides == 0
+    # 没有端点提供该模型：改用整个端点池并计数
+    assert [e.name for e in router.candidates("http://ignored/v1", "other")] == ["a", "b"]
+    assert router.stats()["model_overrides"] == 1
+
+
+def test_adhoc_endpoints_are_bounded(router, monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_ADHOC_MAX_ENDPOINTS", 2)
+    first = router.candidates("http://one/v1", "m")[0]
+    router.candidates("http://two/v1", "m")
+    # 再次使用 one，使 two 成为最久未用的
+    assert router.candidates("http://one/v1", "m")[0] is first
+    router.candidates("http://three/v1", "m")
+    assert [e["api_url"] for e in router.stats()["endpoints"]] == ["http://one/v1", "http://three/v1"]
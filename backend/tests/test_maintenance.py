@@ -0,0 +1,45 @@
+import asyncio
+import sqlite3
+
+from sqlalchemy import text
+
+from database import create_engine_for
+from maintenance import MaintenanceScheduler
+
+
+def _legacy_db(path):
+    """增量 auto_vacuum 上线前创建的库：删除数据后留有空闲页"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?)", [("x" * 1000,)] * 200)
+    conn.commit()
+    conn.execute("DELETE FROM t")
+    conn.commit()
+    conn.close()
+
+
+async def _vacuum(path, idle: bool, full: bool):
+    engine = create_engine_for(f"sqlite+aiosqlite:///{path}")
+    scheduler = MaintenanceScheduler(None, None, engine, is_idle=lambda: idle)
+    try:
+        report = await scheduler._vacuum(full)
+        async with engine.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+    finally:
+        await engine.dispose()
+    return report["vacuum"], mode
+
+
+def test_scheduled_run_never_does_full_vacuum(tmp_path):
+    path = tmp_path / "legacy.db"
+    _legacy_db(path)
+    assert asyncio.run(_vacuum(path, idle=True, full=False)) == ("needs_full", 0)
+
+
+def test_full_vacuum_requires_idle(tmp_path):
+    path = tmp_path / "legacy.db"
+    _legacy_db(path)
+    assert asyncio.run(_vacuum(path, idle=False, full=True)) == ("needs_full", 0)
+    assert asyncio.run(_vacuum(path, idle=True, full=True)) == ("full", 2)
+    # 切换后的维护只做增量回收
+    assert asyncio.run(_vacuum(path, idle=False, full=False)) == ("incremental", 2)
@@ -0,0 +1,32 @@
+from metrics import Counter, Histogram
+
+
+def test_label_values_are_escaped():
+    counter = Counter("test_errors_total", "errors", ["reason"])
+    counter.labels(reason='bad "quote"\\path\nnext').inc()
+    assert counter.render()[-1] == 'test_errors_total{reason="bad \\"quote\\"\\\\path\\nnext"} 1'
+
+
+def test_counter_render():
+    counter = Counter("test_requests_total", "requests", ["method"])
+    counter.labels(method="GET").inc()
+    counter.labels(method="GET").inc(2)
+    assert counter.render() == [
+        "# HELP test_requests_total requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{method="GET"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 3.65",
+        "test_seconds_count 4",
+    ]
+    assert histogram.summary()[""]["p50_ms"] == 100.0
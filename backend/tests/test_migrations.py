@@ -0,0 +1,84 @@
+import asyncio
+
+from sqlalchemy import delete, select, text
+
+import migrations
+from database import TranscriptionSessionDB, create_engine_for
+from migrations import SCHEMA_VERSION, current_version, run_migrations, schema_migrations
+
+
+def _engine(tmp_path):
+    return create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}")
+
+
+def test_added_columns_take_the_model_default(tmp_path):
+    async def main():
+        engine = _engine(tmp_path)
+        async with engine.begin() as conn:
+            # 升级前的表：只有部分列，已有一行
+            await conn.execute(text("CREATE TABLE transcription_sessions (session_id VARCHAR(36) PRIMARY KEY)"))
+            await conn.execute(text("INSERT INTO transcription_sessions VALUES ('old')"))
+            for name in ("char_count", "words_per_minute", "stats_json"):
+                await conn.run_sync(migrations._add_column, TranscriptionSessionDB, name)
+            row = (await conn.execute(text(
+                "SELECT char_count, words_per_minute, stats_json FROM transcription_sessions"
+            ))).one()
+        await engine.dispose()
+        assert tuple(row) == (0, 0.0, None)
+
+    asyncio.run(main())
+
+
+def test_version_recorded_by_another_worker_is_ignored(tmp_path):
+    async def main():
+        engine = _engine(tmp_path)
+        async with engine.begin() as conn:
+            assert await conn.run_sync(run_migrations) is False
+            # 另一个 worker 在本 worker 读取已应用版本之后记录了同一版本
+            await conn.run_sync(migrations._record_version, SCHEMA_VERSION, "duplicate")
+            assert await conn.run_sync(current_version) == SCHEMA_VERSION
+
+            # 重新执行最后一步迁移后记录版本，不因主键冲突失败
+            await conn.execute(delete(schema_migrations).where(schema_migrations.c.version == SCHEMA_VERSION))
+            assert await conn.run_sync(run_migrations) is False
+            versions = (await conn.execute(select(schema_migrations.c.version))).scalars().all()
+        await engine.dispose()
+        assert sorted(versions) == list(range(1, SCHEMA_VERSION + 1))
+
+    asyncio.run(main())
+
+
+def test_up_to_date_schema_takes_the_fast_path(tmp_path):
+    async def main():
+        engine = _engine(tmp_path)
+        async with engine.begin() as conn:
+            assert await conn.run_sync(current_version) == 0
+            # 新库：建表并记录全部版本
+            assert await conn.run_sync(run_migrations) is False
+            assert await conn.run_sync(current_version) == SCHEMA_VERSION
+        async with engine.begin() as conn:
+            # 已是最新：只查询版本号，不再检查各表（删掉的表不会被补建）
+            await conn.execute(text("DROP TABLE session_terms"))
+            assert await conn.run_sync(run_migrations) is True
+            tables = (await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))).scalars().all()
+        await engine.dispose()
+        assert "session_terms" not in tables and "transcription_sessions" in tables
+
+    asyncio.run(main())
+
+
+def test_partially_migrated_database_applies_only_missing_steps(tmp_path):
+    async def main():
+        engine = _engine(tmp_path)
+        async with engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+            await conn.execute(delete(schema_migrations).where(schema_migrations.c.version > 10))
+            await conn.execute(text("ALTER TABLE transcription_sessions DROP COLUMN ai_topics"))
+        async with engine.begin() as conn:
+            assert await conn.run_sync(run_migrations) is False
+            columns = [row[1] for row in await conn.execute(text("PRAGMA table_info(transcription_sessions)"))]
+            assert await conn.run_sync(current_version) == SCHEMA_VERSION
+        await engine.dispose()
+        assert "ai_topics" in columns
+
+    asyncio.run(main())
@@ -0,0 +1,15 @@
+def test_profiling_toggle_requires_login(client, admin):
+    response = client.post("/admin/profiling", json={"enabled": True})
+    assert response.status_code == 401
+
+    response = client.post("/admin/profiling", json={"enabled": True, "sample_rate": 0.5}, headers=admin)
+    assert response.status_code == 200
+    assert response.json() == {"enabled": True, "sample_rate": 0.5}
+
+    response = client.post("/admin/profiling", json={"enabled": False, "reset": True}, headers=admin)
+    assert response.json()["enabled"] is False
+
+
+def test_profiling_toggle_validates_its_body(client, admin):
+    response = client.post("/admin/profiling", json={"sample_rate": "often"}, headers=admin)
+    assert response.status_code == 422
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from models import TranscriptionSegment, TranscriptionSession
+from prompt_render import estimate_tokens, merge_turns, render_plain, render_transcript
+
+
+def _segment(speaker, text):
+    return TranscriptionSegment(speaker=speaker, text=text, start_time=0, end_time=0,
+                                tokens=[{"text": text, "start_ms": 0, "end_ms": 0,
+                                         "confidence": 1.0, "is_final": True}])
+
+
+def test_consecutive_segments_of_one_speaker_merge_into_a_turn():
+    segments = [
+        {"speaker": "Speaker 1", "text": "你好<end>"},
+        {"speaker": "Speaker 1", "text": " 今天开会<end>"},
+        {"speaker": "Speaker 2", "text": "<fin>"},
+        {"speaker": "Speaker 2", "text": "好的"},
+    ]
+    assert merge_turns(segments) == [("Speaker 1", "你好 今天开会"), ("Speaker 2", "好的")]
+
+
+def test_speakers_are_aliased_in_order_of_appearance():
+    text, stats = render_transcript([
+        {"speaker": "Speaker 2", "text": "hello"},
+        {"speaker": "Speaker 1", "text": "hi"},
+        {"speaker": "Speaker 2", "text": "bye"},
+    ])
+    assert text.splitlines() == [
+        "发言人代号：A=Speaker 2，B=Speaker 1",
+        "A: hello",
+        "B: hi",
+        "A: bye",
+    ]
+    assert stats["speakers"] == 2 and stats["turns"] == 3 and stats["omitted_turns"] == 0
+
+
+def test_single_speaker_has_no_labels():
+    text, stats = render_transcript([{"speaker": "Speaker 1", "text": "只有一个人<end>"}])
+    assert text == "只有一个人"
+    assert stats["speakers"] == 1
+
+
+def test_budget_keeps_head_and_tail_and_notes_the_gap():
+    segments = [{"speaker": f"S{i % 2}", "text": "一二三四五六七八九十"} for i in range(20)]
+    text, stats = render_transcript(segments, token_budget=100)
+    lines = text.splitlines()
+    assert lines[1] == "A: 一二三四五六七八九十"
+    assert lines[-1] == "B: 一二三四五六七八九十"
+    assert "中间省略" in text
+    assert stats["omitted_turns"] == 20 - (len(lines) - 2)
+    assert estimate_tokens(text) <= 100
+
+
+def test_oversized_single_turn_is_truncated():
+    text, stats = render_plain("字" * 500, token_budget=100)
+    assert text.startswith("字") and "其余内容省略" in text
+    assert estimate_tokens(text) <= 100
+
+
+def test_active_transcript_includes_the_open_segment():
+    import main
+
+    session = TranscriptionSession(session_id="open-tail", title="t", created_at=datetime.now())
+    session.segments.append(_segment("Speaker 1", "第一句<end>"))
+    session.open_segment = _segment("Speaker 2", "最新的发言")
+    main.active_sessions[session.session_id] = session
+    try:
+        text = asyncio.run(main._get_transcript(None, session.session_id))
+        assert text.splitlines()[-1] == "B: 最新的发言"
+        # 不参与序列化与落库
+        assert "open_segment" not in session.model_dump()
+
+        # 只有未关闭的片段时也能生成转录
+        session.segments.clear()
+        assert asyncio.run(main._get_transcript(None, session.session_id)) == "最新的发言"
+
+        session.open_segment = None
+        with pytest.raises(HTTPException):
+            asyncio.run(main._get_transcript(None, session.session_id))
+    finally:
+        del main.active_sessions[session.session_id]
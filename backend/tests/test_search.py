@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import crud
+from database import SessionTermDB, TranscriptionSessionDB, create_engine_for
+from migrations import run_migrations
+
+
+def _row(session_id: str, transcript, **extra):
+    now = datetime(2024, 1, 1)
+    row = {
+        "session_id": session_id, "title": f"Session {session_id}", "created_at": now, "updated_at": now,
+        "status": "completed", "segments_json": "[]", "full_transcript": transcript,
+        "duration_seconds": 60.0, "speaker_count": 1, "word_count": 3, "analyzed_at": now,
+    }
+    row.update(extra)
+    return row
+
+
+async def _search(tmp_path, search: str):
+    engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'search.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(run_migrations)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        await db.execute(insert(TranscriptionSessionDB), [
+            _row("live", "the deadline moved"),
+            # 已归档：全文不在库中，只能经词项索引命中
+            _row("archived", None, archived_at=datetime(2024, 2, 1)),
+        ])
+        await db.execute(insert(SessionTermDB), [
+            {"session_id": "live", "term": term, "language": "en"} for term in ("the", "deadline", "moved")
+        ] + [{"session_id": "archived", "term": "deadline", "language": "en"}])
+        await db.commit()
+        sessions = await crud.get_sessions(db, search=search)
+        count = await crud.get_session_count(db, search=search)
+    await engine.dispose()
+    return sorted(s.session_id for s in sessions), count
+
+
+def test_mid_word_substring_matches_indexed_sessions(tmp_path):
+    assert asyncio.run(_search(tmp_path, "adline")) == (["live"], 1)
+
+
+def test_term_index_adds_archived_sessions(tmp_path):
+    assert asyncio.run(_search(tmp_path, "deadl")) == (["archived", "live"], 2)
+
+
+def test_prefilter_flag_restricts_to_word_prefixes(tmp_path, monkeypatch):
+    monkeypatch.setattr(crud, "SEARCH_TERM_PREFILTER", True)
+    assert asyncio.run(_search(tmp_path, "adline")) == ([], 0)
+    assert asyncio.run(_search(tmp_path / "..", "deadl"))[1] == 2
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import segment_codec
+from segment_codec import decode, encode, encode_columns
+
+ENCODINGS = ["zlib"] + (["zstd"] if segment_codec.zstandard else [])
+
+
+def _token(text, start, speaker="Speaker 1", **extra):
+    token = {"text": text, "start_ms": start, "end_ms": start + 120, "confidence": 0.93,
+             "is_final": True, "speaker": speaker, "language": "zh"}
+    token.update(extra)
+    return token
+
+
+def _segments():
+    return [
+        {"speaker": "Speaker 1", "text": "你好世界", "start_time": 0, "end_time": 360,
+         "tokens": [_token("你好", 0), _token("世界", 240)], "language": "zh"},
+        # 片段文本与 token 拼接不一致、非整数时间戳、无 token
+        {"speaker": "Speaker 2", "text": "edited", "start_time": 400.5, "end_time": 900.25,
+         "tokens": [_token(" ok", 400, speaker="Speaker 2", is_final=False)], "language": None},
+        {"speaker": "Speaker 1", "text": "", "start_time": 950, "end_time": 950, "tokens": [], "language": "zh"},
+    ]
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_round_trip(encoding):
+    segments = _segments()
+    name, blob = encode(segments, encoding)
+    assert name == f"{encoding}-col1"
+    assert decode(name, blob, "[]") == segments
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_unknown_keys_survive_round_trip(encoding):
+    segments = _segments()
+    segments[0]["tokens"][1]["translation_status"] = "original"
+    segments[1]["tokens"][0]["source_language"] = {"code": "en", "p": 0.7}
+    segments[2]["annotation"] = ["bookmark"]
+
+    name, blob = encode(segments, encoding)
+    decoded = decode(name, blob, "[]")
+    assert decoded == segments
+    assert "translation_status" not in decoded[0]["tokens"][0]
+
+
+def test_json_encoding_and_legacy_rows():
+    segments = _segments()
+    values = encode_columns(segments, "json")
+    assert values["segments_encoding"] is None and values["segments_blob"] is None
+    assert decode(None, None, values["segments_json"]) == segments
+    assert decode(None, None, None) == []
+
+
+def test_blob_without_extra_column_still_decodes():
+    # extra 列上线前写入的 blob 没有该键
+    columns = segment_codec.to_columns(_segments())
+    assert "extra" not in columns["tokens"] and "extra" not in columns["segments"]
+    assert segment_codec.from_columns(json.loads(json.dumps(columns))) == _segments()
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_model_dump_times_are_delta_encoded(encoding):
+    from models import TranscriptionSegment
+
+    # 落库时的实际输入：模型字段为 float，整数毫秒值以 1200.0 的形式出现
+    segments = [TranscriptionSegment(**seg).model_dump() for seg in _segments()[:1] + _segments()[2:]]
+    assert type(segments[0]["tokens"][1]["start_ms"]) is float
+
+    columns = segment_codec.to_columns(segments)
+    for packed in (columns["segments"]["start"], columns["tokens"]["start"], columns["tokens"]["end"]):
+        assert "d" in packed and packed.get("f") == 1
+    assert columns["tokens"]["start"]["d"] == [0, 240]
+
+    name, blob = encode(segments, encoding)
+    decoded = decode(name, blob, "[]")
+    assert decoded == segments
+    assert type(decoded[0]["tokens"][1]["start_ms"]) is float
+    assert type(decoded[0]["start_time"]) is float
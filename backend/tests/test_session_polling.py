@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+
+from models import TranscriptionSegment, TranscriptionSession
+
+
+def _segment(speaker, text):
+    return TranscriptionSegment(speaker=speaker, text=text, start_time=0, end_time=0,
+                                tokens=[{"text": text, "start_ms": 0, "end_ms": 0,
+                                         "confidence": 1.0, "is_final": True}])
+
+
+@pytest.fixture
+def session():
+    import main
+
+    session = TranscriptionSession(session_id="polling", title="t", created_at=datetime.now())
+    main.active_sessions[session.session_id] = session
+    yield session
+    del main.active_sessions[session.session_id]
+
+
+def test_unchanged_version_returns_304(client, session):
+    session.segments.append(_segment("Speaker 1", "你好<end>"))
+    session.version = 1
+    response = client.get("/sessions/polling", params={"since": 0})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/sessions/polling", params={"since": 0}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # 游标不同，ETag 也不同
+    response = client.get("/sessions/polling", params={"since": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    session.version += 1
+    response = client.get("/sessions/polling", params={"since": 0}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_since_returns_only_new_segments_and_the_open_one(client, session):
+    session.segments.append(_segment("Speaker 1", "第一句<end>"))
+    session.version = 1
+    data = client.get("/sessions/polling", params={"since": 0}).json()
+    assert [seg["text"] for seg in data["segments"]] == ["第一句<end>"]
+    assert data["next_since"] == 1 and data["open_segment"] is None
+    assert "full_transcript" not in data
+
+    # 新的最终 token 落入未关闭片段：增量里没有新 segment，但 open_segment 带回最新内容
+    session.open_segment = _segment("Speaker 2", "正在说")
+    session.version += 1
+    data = client.get("/sessions/polling", params={"since": data["next_since"]}).json()
+    assert data["segments"] == []
+    assert data["open_segment"]["text"] == "正在说"
+    assert data["next_since"] == 1
+
+    # 片段关闭后出现在 segments 中
+    session.segments.append(session.open_segment)
+    session.open_segment = None
+    session.version += 1
+    data = client.get("/sessions/polling", params={"since": data["next_since"]}).json()
+    assert [seg["text"] for seg in data["segments"]] == ["正在说"]
+    assert data["open_segment"] is None and data["next_since"] == 2
+
+
+def test_full_mode_includes_the_open_segment(client, session):
+    session.full_transcript = "第一句<end>正在说"
+    session.segments.append(_segment("Speaker 1", "第一句<end>"))
+    session.open_segment = _segment("Speaker 2", "正在说")
+    data = client.get("/sessions/polling").json()
+    assert data["full_transcript"] == "第一句<end>正在说"
+    assert len(data["segments"]) == 1
+    assert data["open_segment"]["text"] == "正在说"
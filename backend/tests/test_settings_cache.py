@@ -0,0 +1,77 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import create_engine_for
+from migrations import run_migrations
+from settings_cache import SETTINGS_VERSION_KEY, SettingsCache, upsert_settings
+
+
+def _run(tmp_path, test):
+    async def main():
+        engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'settings.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+        maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            await test(maker)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def _write(maker, values):
+    async with maker() as session:
+        await upsert_settings(session, values)
+        await session.commit()
+
+
+def test_other_worker_sees_writes_after_version_check(tmp_path):
+    async def test(maker):
+        writer = SettingsCache(maker, check_interval=0.0)
+        # 另一个 worker：检查间隔内直接使用本地缓存
+        reader = SettingsCache(maker, check_interval=0.2)
+        await _write(maker, {"model": "a"})
+        assert await reader.get("model") == "a"
+
+        await _write(maker, {"model": "b"})
+        writer.invalidate()
+        assert await writer.get("model") == "b"
+        assert await reader.get("model") == "a"
+
+        await asyncio.sleep(0.25)
+        assert await reader.get("model") == "b"
+        # 版本行不出现在配置中
+        assert SETTINGS_VERSION_KEY not in await reader.all()
+
+    _run(tmp_path, test)
+
+
+def test_unchanged_version_skips_reload(tmp_path):
+    async def test(maker):
+        await _write(maker, {"model": "a"})
+        cache = SettingsCache(maker, check_interval=0.0)
+        first = await cache.all()
+        # 版本未变：沿用同一个字典，不重新加载整表
+        assert await cache.all() is first
+
+        await _write(maker, {"other": "x"})
+        reloaded = await cache.all()
+        assert reloaded is not first
+        assert reloaded == {"model": "a", "other": "x"}
+
+    _run(tmp_path, test)
+
+
+def test_batch_write_is_one_version_bump(tmp_path):
+    async def test(maker):
+        cache = SettingsCache(maker, check_interval=0.0)
+        await _write(maker, {"a": "1", "b": "2"})
+        await cache.all()
+        version = cache._version
+        await _write(maker, {"a": "3", "b": "4"})
+        assert await cache.all() == {"a": "3", "b": "4"}
+        assert cache._version != version
+
+    _run(tmp_path, test)
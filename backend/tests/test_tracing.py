@@ -0,0 +1,62 @@
+import json
+import uuid
+
+from tracing import SessionTrace
+
+
+def _trace():
+    """按固定时间戳（秒）打点：每 100 ms 一个音频分片，Soniox 帧滞后到达"""
+    trace = SessionTrace()
+    for i in range(5):
+        received = 10.0 + i * 0.1
+        trace.on_audio(3200, received)
+        trace.on_upstream_sent(received, received + 0.002)
+    # 首个分片后 0.45 s 到达的帧：已处理 300 ms 音频，其中 200 ms 已最终确定
+    trace.on_frame(10.45, 10.451, 10.454, audio_final_proc_ms=200, audio_total_proc_ms=300)
+    trace.on_frame(10.55, 10.551, 10.552, audio_final_proc_ms=400, audio_total_proc_ms=400)
+    return trace
+
+
+def test_latency_breakdown():
+    summary = _trace().summary()
+    breakdown = summary["breakdown"]
+    assert (summary["audio_chunks"], summary["audio_bytes"], summary["frames"]) == (5, 16000, 2)
+    assert summary["first_token_ms"] == 450.0
+    assert breakdown["uplink_gap"]["count"] == 4 and breakdown["uplink_gap"]["mean_ms"] == 100.0
+    assert breakdown["upstream_send"]["max_ms"] == 2.0
+    # 墙钟时长 450 / 550 ms，Soniox 已处理 300 / 400 ms
+    assert breakdown["soniox_lag"]["p50_ms"] == 150.0 and breakdown["soniox_lag"]["count"] == 2
+    assert breakdown["finalization_lag"]["max_ms"] == 100.0
+    assert breakdown["relay"]["max_ms"] == 1.0
+    assert breakdown["downlink_send"]["max_ms"] == 3.0
+    assert (summary["audio_final_proc_ms"], summary["audio_total_proc_ms"]) == (400, 400)
+
+
+def test_frames_without_processing_times_skip_soniox_lag():
+    trace = SessionTrace()
+    trace.on_frame(1.0, 1.0, 1.0, audio_final_proc_ms=0.0, audio_total_proc_ms=0.0)
+    summary = trace.summary()
+    assert summary["first_token_ms"] is None
+    assert summary["breakdown"]["soniox_lag"] == {"count": 0}
+    assert summary["breakdown"]["relay"]["count"] == 1
+
+
+def test_latency_endpoint_serves_live_and_saved_traces(client):
+    import main
+
+    session_id = str(uuid.uuid4())
+    main.active_traces[session_id] = _trace()
+    try:
+        data = client.get(f"/sessions/{session_id}/latency").json()
+        assert data["live"] is True and data["latency"]["frames"] == 2
+    finally:
+        del main.active_traces[session_id]
+
+    latency = json.loads(json.dumps(_trace().summary()))
+    record = {"session_id": session_id, "segments": [], "metadata": {"latency": latency}}
+    response = client.post("/import/sessions", content=json.dumps(record).encode())
+    assert response.json()["imported"] == 1
+    data = client.get(f"/sessions/{session_id}/latency").json()
+    assert data["live"] is False and data["latency"]["breakdown"] == latency["breakdown"]
+
+    assert client.get("/sessions/missing/latency").status_code == 404
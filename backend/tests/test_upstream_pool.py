@@ -0,0 +1,76 @@
+import asyncio
+
+from upstream_pool import UpstreamPool
+
+
+class FakeSocket:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class Opener:
+    """记录建连次数的替身 opener"""
+
+    def __init__(self):
+        self.sockets = []
+
+    async def __call__(self):
+        ws = FakeSocket()
+        self.sockets.append(ws)
+        return ws
+
+
+def test_pool_does_not_dial_before_first_session():
+    async def main():
+        opener = Opener()
+        pool = UpstreamPool(opener, size=2, idle_seconds=60, warm_seconds=60)
+        pool.start()
+        await asyncio.sleep(0.1)
+        assert opener.sockets == []
+        assert pool.stats()["warm"] is False
+
+        # 第一次会话取空，之后开始补充
+        assert pool.checkout() == (None, "empty")
+        await asyncio.sleep(0.1)
+        assert len(opener.sockets) == 2
+        ws, source = pool.checkout()
+        assert source == "pool" and ws in opener.sockets
+        await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_pool_cools_down_without_sessions():
+    async def main():
+        opener = Opener()
+        pool = UpstreamPool(opener, size=1, idle_seconds=60, warm_seconds=0.2)
+        pool.start()
+        pool.checkout()
+        await asyncio.sleep(0.1)
+        assert len(opener.sockets) == 1
+
+        await asyncio.sleep(0.3)
+        # 预热窗口结束：关闭空闲连接，不再补充
+        assert pool.stats()["idle"] == 0
+        assert pool.stats()["warm"] is False
+        await asyncio.sleep(0)
+        assert opener.sockets[0].closed
+        assert len(opener.sockets) == 1
+        await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_disabled_pool_never_dials():
+    async def main():
+        opener = Opener()
+        pool = UpstreamPool(opener, size=0)
+        pool.start()
+        assert pool.checkout() == (None, "disabled")
+        await asyncio.sleep(0.05)
+        assert opener.sockets == []
+
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import create_engine_for
+from write_queue import WriteQueue
+
+
+async def _setup(tmp_path, **options):
+    engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'wq.db'}")
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT UNIQUE)"))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    return engine, maker, WriteQueue(maker, **options)
+
+
+def _insert(value):
+    async def op(db):
+        await db.execute(text("INSERT INTO items (value) VALUES (:v)"), {"v": value})
+        return value
+    return op
+
+
+async def _values(maker):
+    async with maker() as db:
+        return sorted(row[0] for row in await db.execute(text("SELECT value FROM items")))
+
+
+def test_concurrent_writes_share_transactions(tmp_path):
+    async def main():
+        engine, maker, queue = await _setup(tmp_path, max_batch=64, max_delay=0.05)
+        await queue.start()
+        try:
+            results = await asyncio.gather(*(queue.submit(_insert(f"v{i:02d}")) for i in range(20)))
+        finally:
+            await queue.stop()
+        assert results == [f"v{i:02d}" for i in range(20)]
+        assert queue.ops == 20
+        assert queue.batches < 20
+        assert await _values(maker) == [f"v{i:02d}" for i in range(20)]
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_max_batch_bounds_each_transaction(tmp_path):
+    async def main():
+        engine, maker, queue = await _setup(tmp_path, max_batch=4, max_delay=0.05)
+        await queue.start()
+        try:
+            await asyncio.gather(*(queue.submit(_insert(f"v{i}")) for i in range(10)))
+        finally:
+            await queue.stop()
+        assert queue.batches >= 3
+        assert len(await _values(maker)) == 10
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_failing_write_does_not_roll_back_its_batch(tmp_path):
+    async def main():
+        engine, maker, queue = await _setup(tmp_path, max_batch=64, max_delay=0.05)
+        await queue.start()
+        try:
+            await queue.submit(_insert("taken"))
+            results = await asyncio.gather(
+                queue.submit(_insert("a")),
+                queue.submit(_insert("taken")),
+                queue.submit(_insert("b")),
+                return_exceptions=True,
+            )
+        finally:
+            await queue.stop()
+        assert results[0] == "a" and results[2] == "b"
+        assert isinstance(results[1], IntegrityError)
+        assert await _values(maker) == ["a", "b", "taken"]
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_stop_commits_already_queued_writes(tmp_path):
+    async def main():
+        engine, maker, queue = await _setup(tmp_path, max_batch=2, max_delay=0.05)
+        await queue.start()
+        pending = [asyncio.ensure_future(queue.submit(_insert(f"v{i}"))) for i in range(5)]
+        await asyncio.sleep(0)
+        await queue.stop()
+        assert [await p for p in pending] == [f"v{i}" for i in range(5)]
+        assert len(await _values(maker)) == 5
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_submit_without_worker_uses_own_transaction(tmp_path):
+    async def main():
+        engine, maker, queue = await _setup(tmp_path)
+        assert await queue.submit(_insert("direct")) == "direct"
+        with pytest.raises(IntegrityError):
+            await queue.submit(_insert("direct"))
+        assert await _values(maker) == ["direct"]
+        await engine.dispose()
+
+    asyncio.run(main())
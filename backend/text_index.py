@@ -0,0 +1,150 @@
+"""
+转录文本的语言标注与检索分词
+
+- segment_language：按 token 的 language 字段（需开启 enable_language_identification）
+  以字符数加权选出片段的主语言，在片段关闭时写入 TranscriptionSegment.language；
+- index_terms：按文字体系分词，CJK 连续字符切为二元组（单字成串时保留单字），
+  字母文字按词切分并统一小写；每个词项标注其首字符所在 token 的语言，
+  混合中英文的片段中，中文词项归入 zh、英文词项归入 en；
+- query_terms：对搜索词做同样的切分，供 session_terms 索引预筛候选会话。
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 句末控制标记，不参与语言判定与分词
+CONTROL_TOKENS = ("<end>", "<fin>")
+
+# CJK 统一表意文字、假名、韩文音节
+CJK_CHARS = (
+    "\u3040-\u30ff"  # 平假名 / 片假名
+    "\u3400-\u4dbf"  # CJK 扩展 A
+    "\u4e00-\u9fff"  # CJK 统一表意文字
+    "\uac00-\ud7af"  # 韩文音节
+    "\uf900-\ufaff"  # CJK 兼容表意文字
+)
+_RUN_RE = re.compile(rf"[{CJK_CHARS}]+|[^\s{CJK_CHARS}\W]+", re.UNICODE)
+_CJK_RE = re.compile(rf"[{CJK_CHARS}]")
+
+# 索引词项的最大长度（超长的字母串截断）
+MAX_TERM_LENGTH = 64
+
+
+def _token_get(token: Any, key: str, default=None):
+    if isinstance(token, dict):
+        return token.get(key, default)
+    return getattr(token, key, default)
+
+
+def language_weights(tokens: Iterable[Any], fallback: Optional[str] = None) -> Counter:
+    """各语言 token 的非空白字符数；token 无语言时计入 fallback"""
+    weights: Counter = Counter()
+    for token in tokens:
+        language = _token_get(token, "language") or fallback
+        text = _token_get(token, "text", "") or ""
+        if not language or text in CONTROL_TOKENS:
+            continue
+        weights[language] += sum(1 for ch in text if not ch.isspace())
+    return weights
+
+
+def segment_language(tokens: Iterable[Any]) -> Optional[str]:
+    """片段主语言：按各语言 token 的非空白字符数取最多者；无语言信息时返回 None"""
+    weights = language_weights(tokens)
+    if not weights:
+        return None
+    return weights.most_common(1)[0][0]
+
+
+def _cjk_terms(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def _split(text: str) -> List[Tuple[int, str, bool]]:
+    """切分为 (起始位置, 词项, 是否为 CJK) 列表"""
+    terms: List[Tuple[int, str, bool]] = []
+    for match in _RUN_RE.finditer(text):
+        run = match.group()
+        if _CJK_RE.match(run):
+            terms.extend((match.start() + i, term, True) for i, term in enumerate(_cjk_terms(run)))
+        else:
+            terms.append((match.start(), run.casefold()[:MAX_TERM_LENGTH], False))
+    return terms
+
+
+def index_terms(segment: Dict[str, Any]) -> Counter:
+    """
+    片段的检索词项
+
+    Returns:
+        Counter[(词项, 语言)] -> 出现次数；语言取词项首字符所在 token 的 language，
+        缺失时取片段语言，仍缺失时为 None
+    """
+    fallback = segment.get("language")
+    text_parts: List[str] = []
+    # 每个字符所属的语言（与拼接后的文本逐字符对齐）
+    char_languages: List[Optional[str]] = []
+    tokens = segment.get("tokens") or []
+    for token in tokens:
+        text = _token_get(token, "text", "") or ""
+        if text in CONTROL_TOKENS:
+            continue
+        language = _token_get(token, "language") or fallback
+        text_parts.append(text)
+        char_languages.extend([language] * len(text))
+    if not tokens:
+        text = segment.get("text", "")
+        text_parts.append(text)
+        char_languages.extend([fallback] * len(text))
+
+    counts: Counter = Counter()
+    for start, term, _ in _split("".join(text_parts)):
+        counts[(term, char_languages[start])] += 1
+    return counts
+
+
+def session_terms(segments: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    会话级语言与词项索引行
+
+    Returns:
+        (languages, terms)：languages 为每种语言出现的片段数与字符数（按 token 级语言统计，
+        混合语言的片段计入其中每种语言），terms 为去重后的 (term, language, count)
+    """
+    languages: Dict[str, Dict[str, int]] = {}
+    terms: Counter = Counter()
+    for seg in segments:
+        tokens = seg.get("tokens") or []
+        language = seg.get("language") or segment_language(tokens)
+        for lang, chars in language_weights(tokens, language).items():
+            entry = languages.setdefault(lang, {"segment_count": 0, "char_count": 0})
+            entry["segment_count"] += 1
+            entry["char_count"] += chars
+        terms.update(index_terms(dict(seg, language=language)))
+
+    language_rows = [{"language": lang, **counts} for lang, counts in languages.items()]
+    term_rows = [
+        {"term": term, "language": language, "count": count}
+        for (term, language), count in terms.items()
+    ]
+    return language_rows, term_rows
+
+
+def query_terms(search: str) -> Tuple[Set[str], Set[str]]:
+    """
+    搜索词的索引词项
+
+    Returns:
+        (exact, prefixes)：CJK 二元组需精确命中；字母词按词前缀匹配
+        （搜索 "transcri" 可命中 "transcription"）
+    """
+    exact: Set[str] = set()
+    prefixes: Set[str] = set()
+    for _, term, is_cjk in _split(search):
+        if is_cjk and len(term) == 1:
+            # 索引只对孤立单字保留单字词项，单字查询无法用索引预筛
+            continue
+        (exact if is_cjk else prefixes).add(term)
+    return exact, prefixes
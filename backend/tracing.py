@@ -0,0 +1,151 @@
+"""
+转录会话的端到端延迟追踪
+
+每个 /ws/transcribe 会话持有一个 SessionTrace，在以下时刻打点（perf_counter）：
+- 收到浏览器音频分片（上行）
+- 音频分片发送到 Soniox 完成（上游发送）
+- Soniox token 帧到达（同时记录帧中的 audio_final_proc_ms / audio_total_proc_ms）
+- token 帧发送给浏览器完成（下行）
+
+据此把用户感知的延迟拆分为：上行抖动、上游发送、Soniox 处理滞后、本服务转发、下行发送。
+"""
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# 每项指标保留的最近样本数（用于分位数）
+_MAX_SAMPLES = 2000
+
+
+class _Series:
+    """流式统计：计数 / 均值 / 最大值 + 最近样本的分位数"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=_MAX_SAMPLES)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max, 2),
+        }
+
+
+class SessionTrace:
+    """单个转录会话的延迟追踪"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_audio_at: Optional[float] = None
+        self.last_audio_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        # 上游连接来源（见 upstream_pool）与建连耗时
+        self.upstream_source: Optional[str] = None
+        self.connect_ms: Optional[float] = None
+        self.audio_chunks = 0
+        self.audio_bytes = 0
+        self.frames = 0
+        self.last_final_proc_ms = 0.0
+        self.last_total_proc_ms = 0.0
+        # 相邻音频分片到达间隔（上行抖动）
+        self.uplink_gap = _Series()
+        # 音频分片发送到 Soniox 的耗时
+        self.upstream_send = _Series()
+        # 已发送音频的墙钟时长 - Soniox 已处理音频时长（Soniox 处理滞后）
+        self.soniox_lag = _Series()
+        # Soniox 已处理音频中尚未最终确定的部分（total_proc - final_proc）
+        self.finalization_lag = _Series()
+        # 帧到达 -> 开始发送给浏览器（本服务内部处理）
+        self.relay = _Series()
+        # 发送给浏览器的耗时（下行背压）
+        self.downlink_send = _Series()
+
+    def on_upstream_connected(self, source: str, connect_seconds: float):
+        """上游连接就绪（已发送配置）"""
+        self.upstream_source = source
+        self.connect_ms = round(connect_seconds * 1000, 2)
+
+    def on_audio(self, size: int, received_at: float):
+        """收到浏览器音频分片"""
+        if self.first_audio_at is None:
+            self.first_audio_at = received_at
+        elif self.last_audio_at is not None:
+            self.uplink_gap.add((received_at - self.last_audio_at) * 1000)
+        self.last_audio_at = received_at
+        self.audio_chunks += 1
+        self.audio_bytes += size
+
+    def on_upstream_sent(self, received_at: float, sent_at: float):
+        """音频分片已发送到 Soniox"""
+        self.upstream_send.add((sent_at - received_at) * 1000)
+
+    def on_frame(
+        self,
+        arrived_at: float,
+        send_started_at: float,
+        sent_at: float,
+        audio_final_proc_ms: float,
+        audio_total_proc_ms: float,
+    ):
+        """Soniox token 帧已转发给浏览器"""
+        self.frames += 1
+        if self.first_token_at is None:
+            self.first_token_at = arrived_at
+        self.relay.add((send_started_at - arrived_at) * 1000)
+        self.downlink_send.add((sent_at - send_started_at) * 1000)
+
+        if audio_total_proc_ms:
+            self.last_final_proc_ms = audio_final_proc_ms or 0.0
+            self.last_total_proc_ms = audio_total_proc_ms
+            self.finalization_lag.add(max(0.0, audio_total_proc_ms - (audio_final_proc_ms or 0.0)))
+            if self.first_audio_at is not None:
+                # 实时推流下，首个分片以来的墙钟时长近似于已发送的音频时长
+                streamed_ms = (arrived_at - self.first_audio_at) * 1000
+                self.soniox_lag.add(max(0.0, streamed_ms - audio_total_proc_ms))
+
+    def summary(self) -> Dict[str, Any]:
+        """延迟分解摘要（毫秒），可直接 JSON 序列化"""
+        now = time.perf_counter()
+        first_token_ms = None
+        if self.first_token_at is not None and self.first_audio_at is not None:
+            first_token_ms = round((self.first_token_at - self.first_audio_at) * 1000, 2)
+        return {
+            "duration_ms": round((now - self.started_at) * 1000, 2),
+            "audio_chunks": self.audio_chunks,
+            "audio_bytes": self.audio_bytes,
+            "frames": self.frames,
+            "first_token_ms": first_token_ms,
+            "upstream_source": self.upstream_source,
+            "connect_ms": self.connect_ms,
+            "audio_final_proc_ms": self.last_final_proc_ms,
+            "audio_total_proc_ms": self.last_total_proc_ms,
+            "breakdown": {
+                "uplink_gap": self.uplink_gap.summary(),
+                "upstream_send": self.upstream_send.summary(),
+                "soniox_lag": self.soniox_lag.summary(),
+                "finalization_lag": self.finalization_lag.summary(),
+                "relay": self.relay.summary(),
+                "downlink_send": self.downlink_send.summary(),
+            },
+        }
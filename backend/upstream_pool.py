@@ -0,0 +1,216 @@
+"""
+Soniox 上游连接预热池
+
+/ws/transcribe 在收到浏览器配置后才建立上游连接（DNS、TCP、TLS、WebSocket 握手），
+首个词出现前要多等数百毫秒。Soniox 的鉴权与转录参数都在连接后的第一条配置消息中，
+握手本身与会话无关，因此可以预先建立若干“未配置”的连接：
+- 会话开始时从池中取出一条，立即发送配置（见 SonioxWebSocketService.connect）；
+- 后台任务把池补充到 SONIOX_POOL_SIZE，并关闭空闲超过 SONIOX_POOL_IDLE_SECONDS 的连接
+  （上游会关闭长时间未配置的连接，取出前就淘汰，避免取到已失效的连接）；
+- SONIOX_POOL_HOLDOUT 比例的会话即使池中有连接也直接新建，作为 A/B 对照组，
+  两组的首词延迟见 soniox_first_token_seconds{source="pool"|"holdout"}。
+
+池默认关闭（SONIOX_POOL_SIZE=0），启用后也按需预热：启动时不建连，第一次会话取连接时
+才开始补充；超过 SONIOX_POOL_WARM_SECONDS 没有新会话则停止补充并关闭空闲连接，
+直到下一次会话。未配置密钥或无人使用时不会反复建连。
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SONIOX_POOL_SIZE = int(os.getenv("SONIOX_POOL_SIZE", "0"))
+SONIOX_POOL_IDLE_SECONDS = float(os.getenv("SONIOX_POOL_IDLE_SECONDS", "15"))
+SONIOX_POOL_WARM_SECONDS = float(os.getenv("SONIOX_POOL_WARM_SECONDS", "600"))
+SONIOX_POOL_HOLDOUT = float(os.getenv("SONIOX_POOL_HOLDOUT", "0"))
+
+# 建连失败后的重试退避（秒）
+_MIN_BACKOFF = 1.0
+_MAX_BACKOFF = 30.0
+
+
+def _is_open(ws) -> bool:
+    return getattr(ws, "open", True) and not getattr(ws, "closed", False)
+
+
+class UpstreamPool:
+    """预先建立、尚未发送配置的上游 WebSocket 连接池"""
+
+    def __init__(
+        self,
+        opener: Callable[[], Awaitable[Any]],
+        size: int = SONIOX_POOL_SIZE,
+        idle_seconds: float = SONIOX_POOL_IDLE_SECONDS,
+        holdout: float = SONIOX_POOL_HOLDOUT,
+        warm_seconds: float = SONIOX_POOL_WARM_SECONDS,
+    ):
+        """
+        Args:
+            opener: 建立一条新上游连接的协程函数（不发送任何消息）
+            size: 池中保持的空闲连接数；0 表示不启用
+            idle_seconds: 空闲连接的最长保留时间
+            holdout: 直接新建连接的会话比例（A/B 对照组）
+            warm_seconds: 最近一次会话之后继续保持预热的时长
+        """
+        self.opener = opener
+        self.size = max(0, size)
+        self.idle_seconds = idle_seconds
+        self.holdout = holdout
+        self.warm_seconds = warm_seconds
+        # 最近一次取连接的时刻（monotonic）；None 表示尚无会话，池保持冷态
+        self._last_checkout: Optional[float] = None
+        # (连接, 建立时刻 monotonic)，右端最新
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._opening = 0
+        self._stats = {
+            "opened": 0,
+            "open_failures": 0,
+            "expired": 0,
+            "hits": 0,
+            "misses": 0,
+            "holdouts": 0,
+        }
+        self._open_seconds_total = 0.0
+
+    def start(self):
+        """启动补充任务；任务在第一次 checkout 之前不建连"""
+        if self.size and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._idle:
+            ws, _ = self._idle.pop()
+            await self._close(ws)
+
+    def checkout(self) -> Tuple[Optional[Any], str]:
+        """
+        取出一条可用连接
+
+        Returns:
+            (连接, 来源)；来源为 "pool"，或无连接时的 "holdout"（对照组）/ "empty"（池已取空）/ "disabled"
+        """
+        if not self.size:
+            return None, "disabled"
+        now = time.monotonic()
+        self._last_checkout = now
+        self._wakeup.set()
+        if self.holdout and random.random() < self.holdout:
+            self._stats["holdouts"] += 1
+            return None, "holdout"
+        ws = None
+        while self._idle:
+            candidate, opened_at = self._idle.pop()
+            if now - opened_at < self.idle_seconds and _is_open(candidate):
+                ws = candidate
+                break
+            self._stats["expired"] += 1
+            asyncio.create_task(self._close(candidate))
+        if ws is None:
+            self._stats["misses"] += 1
+            return None, "empty"
+        self._stats["hits"] += 1
+        return ws, "pool"
+
+    def stats(self) -> Dict[str, Any]:
+        opened = self._stats["opened"]
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "opening": self._opening,
+            "idle_seconds": self.idle_seconds,
+            "holdout": self.holdout,
+            "warm": self._is_warm(time.monotonic()),
+            **self._stats,
+            "mean_open_ms": round(self._open_seconds_total / opened * 1000, 2) if opened else None,
+        }
+
+    async def _run(self):
+        backoff = _MIN_BACKOFF
+        while True:
+            self._expire()
+            now = time.monotonic()
+            if not self._is_warm(now):
+                # 冷态：关闭剩余连接，等待下一次会话唤醒
+                self._cool_down()
+                backoff = _MIN_BACKOFF
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                while len(self._idle) < self.size:
+                    await self._open_one()
+                backoff = _MIN_BACKOFF
+                timeout = min(self._next_expiry(), self._last_checkout + self.warm_seconds - now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["open_failures"] += 1
+                logger.warning(f"Upstream pool connect failed, retrying in {backoff:.0f}s: {e}")
+                timeout = backoff
+                backoff = min(backoff * 2, _MAX_BACKOFF)
+            self._wakeup.clear()
+            # 不用 wait_for：唤醒与 stop() 的取消同时发生时，wait_for 会吞掉取消（Python 3.11）
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=max(0.05, timeout))
+            finally:
+                waiter.cancel()
+
+    async def _open_one(self):
+        self._opening += 1
+        started = time.perf_counter()
+        try:
+            ws = await self.opener()
+        finally:
+            self._opening -= 1
+        self._open_seconds_total += time.perf_counter() - started
+        self._stats["opened"] += 1
+        self._idle.append((ws, time.monotonic()))
+
+    def _is_warm(self, now: float) -> bool:
+        return self._last_checkout is not None and now - self._last_checkout < self.warm_seconds
+
+    def _cool_down(self):
+        """预热窗口结束：关闭所有空闲连接"""
+        while self._idle:
+            ws, _ = self._idle.pop()
+            asyncio.create_task(self._close(ws))
+
+    def _expire(self):
+        """关闭空闲超时或已断开的连接（左端最旧）"""
+        now = time.monotonic()
+        while self._idle:
+            ws, opened_at = self._idle[0]
+            if now - opened_at < self.idle_seconds and _is_open(ws):
+                break
+            self._idle.popleft()
+            self._stats["expired"] += 1
+            asyncio.create_task(self._close(ws))
+
+    def _next_expiry(self) -> float:
+        """距最旧连接过期的秒数，作为下一次检查的超时"""
+        if not self._idle:
+            return self.idle_seconds
+        return max(0.05, self._idle[0][1] + self.idle_seconds - time.monotonic())
+
+    @staticmethod
+    async def _close(ws):
+        try:
+            await ws.close()
+        except Exception:
+            pass
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 写操作：接收一个未提交的 AsyncSession，只做 add / update，不自行 commit
+WriteOp = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class WriteQueue:
+    """
+    单写者队列
+
+    SQLite 同一时刻只允许一个写事务。并发的会话落库与配置写入各自开启事务时，
+    会互相等待写锁并各自触发一次 fsync。该队列由唯一的后台任务串行执行写操作，
+    并把短时间窗口内到达的多个操作合并到同一个事务中提交。
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+    ):
+        self.session_maker = session_maker
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 统计信息
+        self.batches = 0
+        self.ops = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        """启动后台写任务"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台写任务（先执行完已排队的写操作）"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+
+    async def submit(self, op: WriteOp) -> Any:
+        """
+        提交写操作并等待其所在批次提交完成
+
+        Returns:
+            写操作的返回值（提交后仍可读取，会话工厂配置了 expire_on_commit=False）
+        """
+        if not self.running:
+            # 队列未启动（如脚本直接调用）时退化为独立事务
+            async with self.session_maker() as session:
+                result = await op(session)
+                await session.commit()
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+
+            # 在短暂窗口内继续收集后续写操作
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    if self._queue.empty():
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        nxt = self._queue.get_nowait()
+                except asyncio.TimeoutError:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                batch.append(nxt)
+
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                logger.error(f"Write queue batch failed: {str(e)}")
+
+            if stopping:
+                # 处理 stop() 之前已排队的剩余写操作
+                rest = []
+                while not self._queue.empty():
+                    nxt = self._queue.get_nowait()
+                    if nxt is not None:
+                        rest.append(nxt)
+                if rest:
+                    await self._commit_batch(rest)
+                return
+
+    async def _commit_batch(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        """在同一事务中执行整批写操作；失败时逐个重试以隔离出错的操作"""
+        self.batches += 1
+        self.ops += len(batch)
+        try:
+            async with self.session_maker() as session:
+                results = []
+                for op, _ in batch:
+                    results.append(await op(session))
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            logger.warning(f"Batched commit of {len(batch)} writes failed, retrying individually: {str(e)}")
+            for item in batch:
+                await self._commit_batch([item])
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -46,11 +46,29 @@ export function exportSession(sessionId, format = 'txt') {
   window.location.href = `/api/sessions/${sessionId}/export?format=${format}`
 }
 
+/**
+ * 逐块读取流式文本响应
+ */
+async function* readText(response) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+
+    const chunk = decoder.decode(value, { stream: true })
+    yield chunk
+  }
+}
+
 /**
  * 总结会话内容（流式）
+ *
+ * 生成在后端作为任务运行，连接中断时按已收到的字符数重新订阅，从断点继续
  */
-export async function* summarizeSession(sessionId, openaiConfig, prompt) {
-  const response = await fetch('/api/summarize', {
+export async function* summarizeSession(sessionId, openaiConfig, prompt, maxResumes = 3) {
+  let response = await fetch('/api/summarize', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -66,15 +84,69 @@ export async function* summarizeSession(sessionId, openaiConfig, prompt) {
     throw new Error(`HTTP error! status: ${response.status}`)
   }
 
-  const reader = response.body.getReader()
-  const decoder = new TextDecoder()
+  const jobId = response.headers.get('X-Job-Id')
+  // 已收到的字符数（按码点计，与后端 offset 一致）
+  let received = 0
 
+  let attempt = 0
   while (true) {
-    const { done, value } = await reader.read()
-    if (done) break
+    try {
+      for await (const chunk of readText(response)) {
+        received += Array.from(chunk).length
+        yield chunk
+      }
+      return
+    } catch (error) {
+      if (!jobId || attempt >= maxResumes) throw error
+    }
+
+    // 重新订阅，失败时退避重试
+    response = null
+    while (!response) {
+      attempt++
+      await new Promise((resolve) => setTimeout(resolve, 1000 * attempt))
+      try {
+        response = await fetch(`/api/summarize/${jobId}?offset=${received}`)
+      } catch (error) {
+        if (attempt >= maxResumes) throw error
+      }
+    }
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`)
+    }
+  }
+}
 
-    const chunk = decoder.decode(value, { stream: true })
-    yield chunk
+/**
+ * 并行生成总结、待办事项与主题（NDJSON 多路复用流）
+ *
+ * 逐个产出事件：{ type: 'jobs', jobs }、{ kind, delta }、{ kind, status }
+ */
+export async function* analyzeSession(sessionId, openaiConfig, kinds = ['summary', 'action_items', 'topics']) {
+  const response = await fetch('/api/analyze', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      session_id: sessionId,
+      kinds,
+      openai_config: openaiConfig,
+    }),
+  })
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+
+  let buffer = ''
+  for await (const chunk of readText(response)) {
+    buffer += chunk
+    const lines = buffer.split('\n')
+    buffer = lines.pop()
+    for (const line of lines) {
+      if (line.trim()) yield JSON.parse(line)
+    }
   }
 }
 
@@ -98,16 +170,7 @@ export async function* askQuestion(sessionId, question, openaiConfig) {
     throw new Error(`HTTP error! status: ${response.status}`)
   }
 
-  const reader = response.body.getReader()
-  const decoder = new TextDecoder()
-
-  while (true) {
-    const { done, value } = await reader.read()
-    if (done) break
-
-    const chunk = decoder.decode(value, { stream: true })
-    yield chunk
-  }
+  yield* readText(response)
 }
 
 export default api
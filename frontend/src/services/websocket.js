@@ -46,9 +46,17 @@ export class TranscriptionWebSocket {
             console.log('Transcription session ready:', data.session_id)
             this.callbacks.onConnected?.(data)
             resolve(data)
+          } else if (data.type === 'queued') {
+            // 服务端会话已满，排队等待
+            this.callbacks.onQueued?.(data)
           } else if (data.type === 'error') {
-            const msg = `${data.error_code ?? ''} ${data.error_message ?? ''}`.trim() || '后端报错'
-            this.callbacks.onError?.(new Error(msg))
+            const msg = data.retry_after
+              ? `服务器繁忙，请 ${data.retry_after} 秒后重试`
+              : `${data.error_code ?? ''} ${data.error_message ?? ''}`.trim() || '后端报错'
+            const err = new Error(msg)
+            this.callbacks.onError?.(err)
+            // 尚未就绪时（如被准入控制拒绝）结束连接等待
+            reject(err)
           } else if (data.type === 'transcription') {
             this.callbacks.onTranscription?.(data)
           } else if (data.type === 'session_completed') {